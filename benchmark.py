@@ -0,0 +1,273 @@
+"""
+Benchmarks of the Railway query methods on seeded generated networks, reporting latency percentiles and peak memory.
+
+run times every query method: the route distance lookups, the route enumerations and their generator variants, the
+route counts including all-pairs stop counts, the shortest route searches, has_route and k_shortest_routes. Methods
+that change the route map or set up tables, and query_batch and parallel_report, which answer these same queries in
+bulk, are not timed. Generators are run to exhaustion, so their time covers every route they yield.
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from collections import deque
+from collections.abc import Iterator
+
+from railway import Railway
+
+
+def random_network(size, seed=0, degree=3, max_distance=9):
+    """
+    Parameters
+    ----------
+    size : int
+        The number of stations
+
+    seed : int
+        The seed of the random number generator, so that the same arguments always give the same network
+
+    degree : int
+        The number of routes leaving each station
+
+    max_distance : int
+        The largest route distance; distances are drawn uniformly from 1 to this
+
+    Returns
+    -------
+    edges : list
+        The routes, as (origin, destination, distance) tuples with stations named S0, S1, ...
+    """
+    rng = random.Random(seed)
+    edges = []
+    for origin in range(size):
+        destinations = rng.sample([station for station in range(size) if station != origin], min(degree, size - 1))
+        edges.extend(('S{}'.format(origin), 'S{}'.format(destination), rng.randint(1, max_distance))
+                     for destination in destinations)
+    return edges
+
+
+def grid_network(size, seed=0, max_distance=9):
+    """
+    A square grid of about size stations, with routes in both directions between horizontal and vertical neighbours
+
+    Parameters and return value are as for random_network.
+    """
+    rng = random.Random(seed)
+    width = max(int(size ** 0.5), 1)
+    edges = []
+    for row in range(width):
+        for column in range(width):
+            station = 'S{}'.format(row * width + column)
+            if column + 1 < width:
+                neighbour = 'S{}'.format(row * width + column + 1)
+                edges.append((station, neighbour, rng.randint(1, max_distance)))
+                edges.append((neighbour, station, rng.randint(1, max_distance)))
+            if row + 1 < width:
+                neighbour = 'S{}'.format((row + 1) * width + column)
+                edges.append((station, neighbour, rng.randint(1, max_distance)))
+                edges.append((neighbour, station, rng.randint(1, max_distance)))
+    return edges
+
+
+def hub_network(size, seed=0, hubs=4, max_distance=9):
+    """
+    A few hub stations with routes between every pair of hubs, and every other station connected to and from one hub
+
+    Parameters and return value are as for random_network.
+    """
+    rng = random.Random(seed)
+    hubs = max(min(hubs, size), 1)
+    edges = [('S{}'.format(origin), 'S{}'.format(destination), rng.randint(1, max_distance))
+             for origin in range(hubs) for destination in range(hubs) if origin != destination]
+    for station in range(hubs, size):
+        hub = rng.randrange(hubs)
+        edges.append(('S{}'.format(hub), 'S{}'.format(station), rng.randint(1, max_distance)))
+        edges.append(('S{}'.format(station), 'S{}'.format(hub), rng.randint(1, max_distance)))
+    return edges
+
+
+def cycle_network(size, seed=0, chords=2, max_distance=9):
+    """
+    One long one-way loop through every station, with a few extra routes across it
+
+    Parameters and return value are as for random_network.
+    """
+    rng = random.Random(seed)
+    edges = [('S{}'.format(station), 'S{}'.format((station + 1) % size), rng.randint(1, max_distance))
+             for station in range(size)]
+    for _ in range(chords if size > 2 else 0):
+        origin, destination = rng.sample(range(size), 2)
+        edges.append(('S{}'.format(origin), 'S{}'.format(destination), rng.randint(1, max_distance)))
+    return edges
+
+
+GENERATORS = {'random': random_network, 'grid': grid_network, 'hub': hub_network, 'cycle': cycle_network}
+
+
+def percentile(values, fraction):
+    """
+    Returns the nearest-rank percentile of a non-empty list of values, e.g. fraction=0.99 for the 99th percentile
+    """
+    values = sorted(values)
+    return values[min(int(fraction * len(values)), len(values) - 1)]
+
+
+def benchmark_queries(railway, queries):
+    """
+    Parameters
+    ----------
+    railway : Railway
+        The railway to query
+
+    queries : dict
+        The queries to time for each method, in the form {method name: [argument tuples]}
+
+    Returns
+    -------
+    results : dict
+        For each method, the number of calls, the latency statistics in seconds and the peak memory in bytes allocated
+        by a single call. Latencies are measured first, without tracemalloc running, and memory afterwards. A method
+        that returns an iterator is timed until the iterator is exhausted.
+    """
+    results = {}
+    for name, arguments in queries.items():
+        method = getattr(railway, name)
+        latencies = []
+        for args in arguments:
+            start = time.perf_counter()
+            _exhaust(method(*args))
+            latencies.append(time.perf_counter() - start)
+
+        peak_memory = 0
+        tracemalloc.start()
+        try:
+            for args in arguments:
+                tracemalloc.reset_peak()
+                _exhaust(method(*args))
+                peak_memory = max(peak_memory, tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+
+        results[name] = {
+            'calls': len(latencies),
+            'mean': sum(latencies) / len(latencies) if latencies else None,
+            'p50': percentile(latencies, 0.5) if latencies else None,
+            'p90': percentile(latencies, 0.9) if latencies else None,
+            'p99': percentile(latencies, 0.99) if latencies else None,
+            'max': max(latencies) if latencies else None,
+            'peak_memory': peak_memory,
+        }
+    return results
+
+
+def _exhaust(result):
+    if isinstance(result, Iterator):
+        deque(result, maxlen=0)
+
+
+def run(generator='random', size=100, seed=0, repeat=20, stops=4, max_distance=20, k=3):
+    """
+    Parameters
+    ----------
+    generator : str
+        The name of the network generator in GENERATORS
+
+    size : int
+        The number of stations to generate
+
+    seed : int
+        The seed for both the network and the queries
+
+    repeat : int
+        The number of random queries to time for each method
+
+    stops : int
+        The number of stops given to the stop-based queries
+
+    max_distance : int
+        The maximum distance given to the distance-based queries
+
+    k : int
+        The number of routes asked of k_shortest_routes
+
+    Returns
+    -------
+    report : dict
+        The benchmark parameters, environment, network size and build time, and the query results of
+        benchmark_queries, ready to be serialised as JSON
+    """
+    edges = GENERATORS[generator](size, seed)
+    start = time.perf_counter()
+    railway = Railway([], cache_size=0)
+    railway.add_edges(edges)
+    build_time = time.perf_counter() - start
+
+    rng = random.Random(seed)
+    stations = list(railway.routes)
+    pairs = [tuple(rng.choice(stations) for _ in range(2)) for _ in range(repeat)]
+    legs = [origin for origin, _, _ in rng.sample(edges, min(repeat, len(edges)))]
+    journeys = []
+    for origin in legs:
+        journey = [origin]
+        for _ in range(3):
+            next_stops = list(railway.routes[journey[-1]])
+            if not next_stops:
+                break
+            journey.append(rng.choice(next_stops))
+        if len(journey) > 1:
+            journeys.append(tuple(journey))
+
+    # All-pairs counts and batched route distances cover the whole network or every journey in a single call
+    queries = {
+        'get_route_distance': journeys,
+        'get_route_distances': [(journeys,)],
+        'find_routes_by_stops': [pair + (stops,) for pair in pairs],
+        'find_routes_by_distance': [pair + (max_distance,) for pair in pairs],
+        'iter_routes_by_stops': [pair + (stops,) for pair in pairs],
+        'iter_routes_by_distance': [pair + (max_distance,) for pair in pairs],
+        'count_routes_by_stops': [pair + (stops,) for pair in pairs],
+        'count_routes_by_distance': [pair + (max_distance,) for pair in pairs],
+        'count_all_routes_by_stops': [(stops,)],
+        'shortest_route': pairs,
+        'shortest_path': pairs,
+        'has_route': pairs,
+        'k_shortest_routes': [pair + (k,) for pair in pairs],
+    }
+
+    return {
+        'parameters': {
+            'generator': generator, 'size': size, 'seed': seed, 'repeat': repeat, 'stops': stops,
+            'max_distance': max_distance, 'k': k,
+        },
+        'environment': {'python': platform.python_version(), 'platform': platform.platform()},
+        'network': {'stations': len(stations), 'routes': len(edges), 'build_time': build_time},
+        'queries': benchmark_queries(railway, queries),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the Railway query methods on a generated network')
+    parser.add_argument('--generator', choices=sorted(GENERATORS), default='random')
+    parser.add_argument('--size', type=int, default=100, help='the number of stations')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=20, help='the number of queries timed for each method')
+    parser.add_argument('--stops', type=int, default=4)
+    parser.add_argument('--max-distance', type=int, default=20)
+    parser.add_argument('--k', type=int, default=3, help='the number of routes asked of k_shortest_routes')
+    parser.add_argument('--output', help='the file to write the JSON report to, instead of standard output')
+    args = parser.parse_args(argv)
+
+    report = run(args.generator, args.size, args.seed, args.repeat, args.stops, args.max_distance, args.k)
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
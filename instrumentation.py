@@ -0,0 +1,257 @@
+"""
+Opt-in statistics for Railway queries: how long each call took and how much searching it did.
+
+Instrumentation is off unless Railway.stats is set, usually with the Railway.instrumented() context manager, and while
+it is off a query pays for one attribute check and a search for one context variable lookup. While it is on, each
+outermost query call gets a CallStats record, made current in a context variable so that the search routines it runs can
+add their counters to it without it being passed down to them.
+"""
+import sys
+import threading
+import time
+import types
+from collections import Counter, deque
+from contextvars import ContextVar
+
+# The record of the query call in progress in the current thread or task, or None
+current_call = ContextVar('current_call', default=None)
+
+COUNTERS = ('nodes_expanded', 'edges_relaxed', 'max_stack_depth', 'paths_materialised')
+
+
+class CallStats:
+    """
+    The statistics of one query call
+
+    Attributes
+    ----------
+    name : str
+        The name of the query method
+
+    args : tuple
+        The arguments of the call
+
+    elapsed : float
+        The wall-clock time of the call in seconds. For a query that returns a generator, such as iter_routes_by_stops,
+        this and the counters go on growing as the generator is consumed, but only include the time spent producing
+        routes, not the time the consumer spends between them.
+
+    nodes_expanded : int
+        The number of stations whose routes were explored
+
+    edges_relaxed : int
+        The number of routes followed from explored stations
+
+    max_stack_depth : int
+        The greatest number of stations on a route being explored by a depth-first search
+
+    paths_materialised : int
+        The number of routes built as lists of stations
+    """
+
+    def __init__(self, stats, name, args):
+        self.name = name
+        self.args = args
+        self.elapsed = 0.0
+        self.nodes_expanded = 0
+        self.edges_relaxed = 0
+        self.max_stack_depth = 0
+        self.paths_materialised = 0
+        self._stats = stats
+
+    def count(self, nodes_expanded=0, edges_relaxed=0, max_stack_depth=0, paths_materialised=0):
+        """
+        Adds to the counters of the call and of the totals of its query
+        """
+        self.nodes_expanded += nodes_expanded
+        self.edges_relaxed += edges_relaxed
+        self.max_stack_depth = max(self.max_stack_depth, max_stack_depth)
+        self.paths_materialised += paths_materialised
+        self._stats._add(self.name, 0, 0.0, 0.0, nodes_expanded, edges_relaxed, max_stack_depth, paths_materialised)
+
+    def as_dict(self):
+        result = {'query': self.name, 'args': [str(arg) for arg in self.args], 'elapsed': self.elapsed}
+        result.update((counter, getattr(self, counter)) for counter in COUNTERS)
+        return result
+
+
+class QueryStats:
+    """
+    The statistics of the query calls made while instrumentation was on
+
+    Attributes
+    ----------
+    calls : deque
+        The CallStats of the most recent calls, oldest first
+
+    totals : dict
+        For each query name, the number of calls, their total and greatest elapsed time, the sum of each counter over
+        the calls, except max_stack_depth which is the greatest over them
+
+    samples : Counter
+        If the sampling profiler ran, the number of times each stack was seen, as 'module:function;...' strings from the
+        outermost frame inwards
+
+    Methods
+    -------
+    measure(name, function, *args)
+        Calls a query function and records its statistics
+
+    sample(frame)
+        Records the stack of a frame, as the default sampling profiler hook
+
+    slowest(count=10)
+        Lists the slowest recorded calls
+
+    as_dict()
+        Returns the statistics in a form that can be serialised as JSON
+    """
+
+    def __init__(self, max_calls=10000):
+        """
+        Parameters
+        ----------
+        max_calls : int
+            The number of most recent calls to keep the CallStats of. The totals include every call.
+        """
+        self.calls = deque(maxlen=max_calls)
+        self.totals = {}
+        self.samples = Counter()
+        self._lock = threading.Lock()
+
+    def measure(self, name, function, *args, **kwargs):
+        """
+        Calls function(*args, **kwargs) with a new CallStats current, and records it
+
+        Parameters
+        ----------
+        name : str
+            The name to record the call under
+
+        function : callable
+            The query function
+
+        args, kwargs
+            The arguments to call it with. The first positional argument, the railway, is not recorded.
+
+        Returns
+        -------
+        result
+            The result of the function. If it is a generator, it is wrapped in one that makes the call current again
+            each time it is resumed, so that the work of producing each item is recorded against the call.
+        """
+        call = CallStats(self, name, args[1:])
+        token = current_call.set(call)
+        start = time.perf_counter()
+        try:
+            result = function(*args, **kwargs)
+        finally:
+            call.elapsed = time.perf_counter() - start
+            current_call.reset(token)
+            self.calls.append(call)
+            self._add(name, 1, call.elapsed, call.elapsed, 0, 0, 0, 0)
+
+        if isinstance(result, types.GeneratorType):
+            return self._measure_iteration(call, result)
+        return result
+
+    def _measure_iteration(self, call, generator):
+        try:
+            while True:
+                token = current_call.set(call)
+                start = time.perf_counter()
+                try:
+                    item = next(generator)
+                except StopIteration:
+                    return
+                finally:
+                    elapsed = time.perf_counter() - start
+                    call.elapsed += elapsed
+                    current_call.reset(token)
+                    self._add(call.name, 0, elapsed, call.elapsed, 0, 0, 0, 0)
+                yield item
+        finally:
+            # A generator closed before it is exhausted still reports the counters of its work so far
+            token = current_call.set(call)
+            try:
+                generator.close()
+            finally:
+                current_call.reset(token)
+
+    def _add(self, name, calls, elapsed, call_elapsed, nodes_expanded, edges_relaxed, max_stack_depth,
+             paths_materialised):
+        with self._lock:
+            totals = self.totals.get(name)
+            if totals is None:
+                totals = self.totals[name] = dict.fromkeys(('calls', 'elapsed', 'max_elapsed') + COUNTERS, 0)
+            totals['calls'] += calls
+            totals['elapsed'] += elapsed
+            totals['max_elapsed'] = max(totals['max_elapsed'], call_elapsed)
+            totals['nodes_expanded'] += nodes_expanded
+            totals['edges_relaxed'] += edges_relaxed
+            totals['max_stack_depth'] = max(totals['max_stack_depth'], max_stack_depth)
+            totals['paths_materialised'] += paths_materialised
+
+    def sample(self, frame):
+        stack = []
+        while frame is not None:
+            stack.append('{}:{}'.format(frame.f_globals.get('__name__', '?'), frame.f_code.co_name))
+            frame = frame.f_back
+        with self._lock:
+            self.samples[';'.join(reversed(stack))] += 1
+
+    def slowest(self, count=10):
+        """
+        Returns
+        -------
+        calls : list
+            The CallStats of the slowest recorded calls, slowest first
+        """
+        return sorted(self.calls, key=lambda call: call.elapsed, reverse=True)[:count]
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'totals': {name: dict(totals) for name, totals in self.totals.items()},
+                'slowest': [call.as_dict() for call in self.slowest()],
+                'samples': dict(self.samples.most_common()),
+            }
+
+
+class SamplingProfiler:
+    """
+    Samples the stack of one thread at a regular interval from a background thread, passing each sampled frame to a
+    hook, e.g. QueryStats.sample
+    """
+
+    def __init__(self, hook, interval=0.001, thread_id=None):
+        """
+        Parameters
+        ----------
+        hook : callable
+            Called with the innermost frame of the sampled thread at each sample
+
+        interval : float
+            The time between samples in seconds
+
+        thread_id : int
+            The identifier of the thread to sample, defaulting to the thread creating the profiler
+        """
+        self.hook = hook
+        self.interval = interval
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.hook(frame)
@@ -1,7 +1,25 @@
+import argparse
+import csv
+import json
+import os
+import sys
+from itertools import islice
+
 from railway import Railway
+from server import error_response, to_json
 
 route = 'AB5, BC4, CD8, DC8, DE6, AD5, CE2, EB3, AE7'
 
+# The query run for each type of batch query, and the one run instead when only counts are wanted
+QUERY_TYPES = {
+    'distance': ('get_route_distance', 'get_route_distance'),
+    'stops': ('find_routes_by_stops', 'count_routes_by_stops'),
+    'by-distance': ('find_routes_by_distance', 'count_routes_by_distance'),
+    'shortest': ('shortest_path', 'shortest_route'),
+}
+QUERY_FILE_FORMATS = {'.jsonl': 'jsonl', '.csv': 'csv'}
+
+
 def print_menu():
     print('')
     print('Please make a selection from the options below.')
@@ -14,83 +32,289 @@ def print_menu():
     print('M: Display this menu')
     print('X: Exit the Kiwiland railway system')
 
-while True:
-    print('Welcome to the Kiwiland railway system!')
-    print('Our latest railway map is: {}'.format(route))
-    change_graph = input('Is this correct? Y/N: ')
-    if change_graph.upper() == 'Y':
-        break
-    else:
-        route = input('Please enter the latest railway map: ')
 
-rail = Railway(route)
-print_menu()
+def interactive(route):
+    while True:
+        print('Welcome to the Kiwiland railway system!')
+        print('Our latest railway map is: {}'.format(route))
+        change_graph = input('Is this correct? Y/N: ')
+        if change_graph.upper() == 'Y':
+            break
+        else:
+            route = input('Please enter the latest railway map: ')
 
-while True:
-    print('')
-    menu_selection = input('Your selection: ').upper()
-    if menu_selection == '1':
-        print('Output #1: {}'.format(rail.get_route_distance('A', 'B', 'C') or 'NO SUCH ROUTE'))
-        print('Output #2: {}'.format(rail.get_route_distance('A', 'D') or 'NO SUCH ROUTE'))
-        print('Output #3: {}'.format(rail.get_route_distance('A', 'D', 'C') or 'NO SUCH ROUTE'))
-        print('Output #4: {}'.format(rail.get_route_distance('A', 'E', 'B', 'C', 'D') or 'NO SUCH ROUTE'))
-        print('Output #5: {}'.format(rail.get_route_distance('A', 'E', 'D') or 'NO SUCH ROUTE'))
-        print('Output #6: {}'.format(len(rail.find_routes_by_stops('C', 'C', 3))))
-        print('Output #7: {}'.format(len(rail.find_routes_by_stops('A', 'C', 4, Railway.FindModes.exact))))
-        print('Output #8: {}'.format(rail.shortest_route('A', 'C')))
-        print('Output #9: {}'.format(rail.shortest_route('B', 'B')))
-        print('Output #10: {}'.format(len(rail.find_routes_by_distance('C', 'C', 30))))
-    elif menu_selection == '2':
-        origin = input('Please enter the origin station: ')
-        next_stop = input('Please enter the destination station: ')
-        stops = [next_stop]
-        while True:
-            next_stop = input('Please enter the next destination station, or ! to stop: ')
-            if next_stop == '!':
-                break
+    rail = Railway(route)
+    print_menu()
+
+    while True:
+        print('')
+        menu_selection = input('Your selection: ').upper()
+        if menu_selection == '1':
+            distances, valid = rail.get_route_distances([['A', 'B', 'C'], ['A', 'D'], ['A', 'D', 'C'],
+                                                          ['A', 'E', 'B', 'C', 'D'], ['A', 'E', 'D']])
+            for number, (distance, exists) in enumerate(zip(distances, valid), 1):
+                print('Output #{}: {}'.format(number, distance if exists else 'NO SUCH ROUTE'))
+            print('Output #6: {}'.format(rail.count_routes_by_stops('C', 'C', 3)))
+            print('Output #7: {}'.format(rail.count_routes_by_stops('A', 'C', 4, Railway.FindModes.exact)))
+            print('Output #8: {}'.format(rail.shortest_route('A', 'C')))
+            print('Output #9: {}'.format(rail.shortest_route('B', 'B')))
+            try:
+                print('Output #10: {}'.format(rail.count_routes_by_distance('C', 'C', 30)))
+            except ValueError as e:
+                print('Output #10: {}'.format(e))
+        elif menu_selection == '2':
+            origin = input('Please enter the origin station: ')
+            next_stop = input('Please enter the destination station: ')
+            stops = [next_stop]
+            while True:
+                next_stop = input('Please enter the next destination station, or ! to stop: ')
+                if next_stop == '!':
+                    break
+                else:
+                    stops.append(next_stop)
+            distance = rail.get_route_distance(origin, *stops)
+            if distance is None:
+                print('NO SUCH ROUTE')
             else:
-                stops.append(next_stop)
-        distance = rail.get_route_distance(origin, *stops)
-        if not distance:
-            print('NO SUCH ROUTE')
-        else:
-            print('The distance along route {}-{} is: {}'.format(origin, '-'.join(stops), distance))
-    elif menu_selection == '3':
-        origin = input('Please enter the origin station: ')
-        destination = input('Please enter the destination station: ')
-        stops = input('Please enter the maximum total number of stops: ')
-        routes = rail.find_routes_by_stops(origin, destination, int(stops))
-        if not routes or len(routes) == 0:
-            print('NO SUCH ROUTE')
-        else:
-            print('There are {} routes: {}'.format(len(routes), ['-'.join(route[0]) + ' ({})'.format(route[1]) for route in routes]))
-    elif menu_selection == '4':
-        origin = input('Please enter the origin station: ')
-        destination = input('Please enter the destination station: ')
-        stops = input('Please enter the exact total number of stops: ')
-        routes = rail.find_routes_by_stops(origin, destination, int(stops), Railway.FindModes.exact)
-        if not routes or len(routes) == 0:
-            print('NO SUCH ROUTE')
+                print('The distance along route {}-{} is: {}'.format(origin, '-'.join(stops), distance))
+        elif menu_selection == '3':
+            origin = input('Please enter the origin station: ')
+            destination = input('Please enter the destination station: ')
+            stops = input('Please enter the maximum total number of stops: ')
+            routes = rail.find_routes_by_stops(origin, destination, int(stops))
+            if not routes or len(routes) == 0:
+                print('NO SUCH ROUTE')
+            else:
+                print('There are {} routes: {}'.format(len(routes), ['-'.join(route[0]) + ' ({})'.format(route[1]) for route in routes]))
+        elif menu_selection == '4':
+            origin = input('Please enter the origin station: ')
+            destination = input('Please enter the destination station: ')
+            stops = input('Please enter the exact total number of stops: ')
+            routes = rail.find_routes_by_stops(origin, destination, int(stops), Railway.FindModes.exact)
+            if not routes or len(routes) == 0:
+                print('NO SUCH ROUTE')
+            else:
+                print('There are {} routes: {}'.format(len(routes), ['-'.join(route[0]) + ' ({})'.format(route[1]) for route in routes]))
+        elif menu_selection == '5':
+            origin = input('Please enter the origin station: ')
+            destination = input('Please enter the destination station: ')
+            shortest_route = rail.shortest_route(origin, destination)
+            if shortest_route == float('inf'):
+                print('NO SUCH ROUTE')
+            else:
+                print('The shortest route between {} and {} is {}'.format(origin, destination, shortest_route))
+        elif menu_selection == '6':
+            origin = input('Please enter the origin station: ')
+            destination = input('Please enter the destination station: ')
+            distance = input('Please enter the maximum total distance: ')
+            routes = rail.find_routes_by_distance(origin, destination, int(distance))
+            print('There are {} routes: {}'.format(len(routes), ['-'.join(route[:-1]) + ' ({})'.format(route[-1]) for route in routes]))
+        elif menu_selection == 'M':
+            print_menu()
+        elif menu_selection == 'X':
+            print('Goodbye!')
+            break
         else:
-            print('There are {} routes: {}'.format(len(routes), ['-'.join(route[0]) + ' ({})'.format(route[1]) for route in routes]))
-    elif menu_selection == '5':
-        origin = input('Please enter the origin station: ')
-        destination = input('Please enter the destination station: ')
-        shortest_route = rail.shortest_route(origin, destination)
-        if shortest_route == float('inf'):
-            print('NO SUCH ROUTE')
+            print('Invalid selection. Please try again.')
+
+
+def read_queries(stream, format):
+    """
+    Parameters
+    ----------
+    stream : file
+        An open text stream of queries, one per line.
+        JSONL lines are objects such as {"id": "q1", "type": "stops", "args": ["C", "C", 3, "max"]}, where the id is
+        optional and defaults to the line number.
+        CSV rows are a type followed by its arguments, e.g. stops,C,C,3,max, and are identified by line number.
+        The types are distance (the stations along the route), stops (origin, destination, stops and an optional max or
+        exact mode), by-distance (origin, destination and maximum distance) and shortest (origin and destination).
+
+    format : str
+        One of 'jsonl' or 'csv'
+
+    Returns
+    -------
+    queries : generator
+        Yields an (id, type, args) tuple for each query, with the numbers and modes among the args converted, or an
+        (id, exception) tuple for each line that could not be read
+    """
+    if format == 'jsonl':
+        lines = ((number, line) for number, line in enumerate(stream, 1) if line.strip())
+    else:
+        lines = ((number, row) for number, row in enumerate(csv.reader(stream), 1) if row)
+
+    for number, line in lines:
+        query_id = number
+        try:
+            if format == 'jsonl':
+                query = json.loads(line)
+                if not isinstance(query, dict):
+                    raise ValueError('Query must be a JSON object')
+                query_id = query.get('id', number)
+                query_type, args = query.get('type'), query.get('args', [])
+                if not isinstance(args, list):
+                    raise ValueError('Query arguments must be a list')
+            else:
+                query_type, args = line[0].strip(), [value.strip() for value in line[1:]]
+
+            if query_type not in QUERY_TYPES:
+                raise ValueError('Query type must be one of {}'.format(', '.join(QUERY_TYPES)))
+            if query_type in ('stops', 'by-distance') and len(args) > 2:
+                try:
+                    args[2] = int(args[2])
+                except (TypeError, ValueError):
+                    raise ValueError('Query argument `{}` is not a number'.format(args[2]))
+            if query_type == 'stops' and len(args) > 3:
+                try:
+                    args[3] = Railway.FindModes[args[3]]
+                except (KeyError, TypeError):
+                    raise ValueError('Mode must be one of {}'.format(', '.join(mode.name for mode in Railway.FindModes)))
+            args = tuple(args)
+            try:
+                hash(args)
+            except TypeError:
+                raise ValueError('Query arguments must be station names and numbers')
+        except Exception as e:
+            yield query_id, e
+            continue
+
+        yield query_id, query_type, args
+
+
+def run_batch(railway, queries, output, count_only=False, chunk_size=10000):
+    """
+    Answers queries a chunk at a time, writing each answer as a line of JSON as soon as its chunk is done
+
+    Parameters
+    ----------
+    railway : Railway
+        The railway to query
+
+    queries : iterable
+        The queries, as yielded by read_queries
+
+    output : file
+        The open text stream to write answers to, as {"id": ..., "result": ...} or
+        {"id": ..., "error": {"type": ..., "message": ...}} lines
+
+    count_only : bool
+        If True, stops and by-distance queries count routes instead of listing them, and shortest queries give only the
+        distance
+
+    chunk_size : int
+        The number of queries read and answered together. Within a chunk, queries are answered grouped by origin with
+        Railway.query_batch, so that queries from the same origin share searches and cached results. While the railway
+        is instrumented they are answered one at a time instead, so that each gets its own statistics.
+
+    Returns
+    -------
+    count : int
+        The number of queries answered, including those that raised an exception
+    """
+    queries = iter(queries)
+    count = 0
+    while True:
+        chunk = list(islice(queries, chunk_size))
+        if not chunk:
+            return count
+        count += len(chunk)
+
+        answerable = sorted((query for query in chunk if len(query) == 3),
+                            key=lambda query: str(query[2][0]) if query[2] else '')
+        queries_to_answer = [(QUERY_TYPES[query_type][count_only],) + args for _, query_type, args in answerable]
+        if railway.stats is None:
+            results = railway.query_batch(queries_to_answer)
         else:
-            print('The shortest route between {} and {} is {}'.format(origin, destination, shortest_route))
-    elif menu_selection == '6':
-        origin = input('Please enter the origin station: ')
-        destination = input('Please enter the destination station: ')
-        distance = input('Please enter the maximum total distance: ')
-        routes = rail.find_routes_by_distance(origin, destination, int(distance))
-        print('There are {} routes: {}'.format(len(routes), ['-'.join(route[:-1]) + ' ({})'.format(route[-1]) for route in routes]))
-    elif menu_selection == 'M':
-        print_menu()
-    elif menu_selection == 'X':
-        print('Goodbye!')
-        break
+            results = [answer_query(railway, query) for query in queries_to_answer]
+        for query_id, exception in (query for query in chunk if len(query) == 2):
+            output.write(json.dumps(error_response(query_id, exception)) + '\n')
+        for (query_id, _, _), result in zip(answerable, results):
+            if isinstance(result, Exception):
+                response = error_response(query_id, result)
+            else:
+                response = {'id': query_id, 'result': to_json(result)}
+            output.write(json.dumps(response) + '\n')
+        output.flush()
+
+
+def answer_query(railway, query):
+    """
+    Returns the result of a single (name, *args) query, or the exception it raised, as query_batch would
+    """
+    try:
+        return getattr(railway, query[0])(*query[1:])
+    except Exception as e:
+        return e
+
+
+def write_stats(stats, path):
+    """
+    Writes query statistics as JSON to a file, or to standard error if the path is -
+    """
+    if path == '-':
+        json.dump(stats.as_dict(), sys.stderr, indent=2)
+        sys.stderr.write('\n')
     else:
-        print('Invalid selection. Please try again.')
+        with open(path, 'w') as stats_file:
+            json.dump(stats.as_dict(), stats_file, indent=2)
+
+
+def load_railway(args):
+    if args.snapshot:
+        return Railway.load_snapshot(args.snapshot)
+    if args.edge_list:
+        return Railway.from_edge_list(args.edge_list)
+    return Railway(args.routes)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='The Kiwiland railway system. Runs the interactive console unless a query file is given.'
+    )
+    network = parser.add_mutually_exclusive_group()
+    network.add_argument('--routes', default=route, help='the route map as a comma-separated string, e.g. "AB5, BC4"')
+    network.add_argument('--edge-list', help='a CSV, TSV or JSON edge list to load the route map from')
+    network.add_argument('--snapshot', help='a snapshot file to load the route map from')
+    parser.add_argument('--queries', help='a JSONL or CSV file of queries to answer without prompting, or - for stdin')
+    parser.add_argument('--format', choices=sorted(QUERY_FILE_FORMATS.values()),
+                        help='the format of the query file, if not given by its extension')
+    parser.add_argument('--output', help='the file to write answers to, instead of standard output')
+    parser.add_argument('--count-only', action='store_true',
+                        help='count routes instead of listing them, and give shortest distances without the route')
+    parser.add_argument('--chunk-size', type=int, default=10000, help='the number of queries answered together')
+    parser.add_argument('--stats', help='a file to write the timings and search statistics of each query to as JSON, '
+                                        'or - for standard error')
+    parser.add_argument('--profile-interval', type=float,
+                        help='with --stats, also sample the stack this often in seconds and report the stacks seen')
+    args = parser.parse_args(argv)
+
+    if args.queries is None:
+        if args.edge_list or args.snapshot:
+            parser.error('the interactive console only accepts --routes; use --queries to query other route maps')
+        interactive(args.routes)
+        return
+
+    query_format = args.format or QUERY_FILE_FORMATS.get(os.path.splitext(args.queries)[1].lower())
+    if query_format is None:
+        parser.error('Query file format not supplied and not recognised from the file name')
+
+    railway = load_railway(args)
+    query_stream = sys.stdin if args.queries == '-' else open(args.queries, newline='')
+    output = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        if args.stats:
+            with railway.instrumented(args.profile_interval) as stats:
+                run_batch(railway, read_queries(query_stream, query_format), output, args.count_only, args.chunk_size)
+            write_stats(stats, args.stats)
+        else:
+            run_batch(railway, read_queries(query_stream, query_format), output, args.count_only, args.chunk_size)
+    finally:
+        if query_stream is not sys.stdin:
+            query_stream.close()
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+"""
+Sparse integer matrices, stored as a list of {column: value} dicts with one dict per row and zero entries omitted.
+Values are Python ints, so counts never overflow; a modulus can be supplied to keep them small instead.
+
+Powers are found by squaring dense NumPy arrays when NumPy is installed and every entry is sure to fit in 64 bits.
+Otherwise each row is raised to the power one multiplication at a time, which keeps sparse rows cheap, unless the
+exponent is so large compared with the size of the matrix that repeated squaring of the sparse rows takes less work.
+"""
+import math
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def identity(size):
+    """
+    Parameters
+    ----------
+    size : int
+        The number of rows and columns
+
+    Returns
+    -------
+    matrix : list
+        The identity matrix
+    """
+    return [{i: 1} for i in range(size)]
+
+
+def multiply(a, b, modulus=None):
+    """
+    Parameters
+    ----------
+    a, b : list
+        The matrices to multiply, with as many columns in a as rows in b
+
+    modulus : int
+        If supplied, every entry of the product is reduced modulo this number
+
+    Returns
+    -------
+    product : list
+        The matrix product a b
+    """
+    product = []
+    for row in a:
+        product_row = {}
+        for k, value in row.items():
+            for j, other_value in b[k].items():
+                product_row[j] = product_row.get(j, 0) + value * other_value
+        if modulus is not None:
+            product_row = {j: value % modulus for j, value in product_row.items() if value % modulus}
+        product.append(product_row)
+    return product
+
+
+def add(a, b, modulus=None):
+    """
+    Parameters
+    ----------
+    a, b : list
+        The matrices to add, of the same size
+
+    modulus : int
+        If supplied, every entry of the sum is reduced modulo this number
+
+    Returns
+    -------
+    total : list
+        The matrix sum a + b
+    """
+    total = []
+    for row, other_row in zip(a, b):
+        total_row = dict(row)
+        for j, value in other_row.items():
+            total_row[j] = total_row.get(j, 0) + value
+        if modulus is not None:
+            total_row = {j: value % modulus for j, value in total_row.items() if value % modulus}
+        total.append(total_row)
+    return total
+
+
+def power(matrix, exponent, modulus=None):
+    """
+    Parameters
+    ----------
+    matrix : list
+        A square matrix
+
+    exponent : int
+        The non-negative power to raise the matrix to
+
+    modulus : int
+        If supplied, every entry of the result is reduced modulo this number
+
+    Returns
+    -------
+    result : list
+        The matrix raised to the exponent
+    """
+    if _fits_in_int64(matrix, exponent, modulus):
+        return _dense_power(matrix, exponent, modulus, cumulative=False)
+    if not _squaring_is_faster(matrix, exponent):
+        return _row_powers(matrix, exponent, modulus, cumulative=False)
+
+    result = identity(len(matrix))
+    for bit in bin(exponent)[2:]:
+        result = multiply(result, result, modulus)
+        if bit == '1':
+            result = multiply(result, matrix, modulus)
+    return result
+
+
+def power_sum(matrix, exponent, modulus=None):
+    """
+    Parameters
+    ----------
+    matrix : list
+        A square matrix A
+
+    exponent : int
+        The non-negative power k to sum up to
+
+    modulus : int
+        If supplied, every entry of the result is reduced modulo this number
+
+    Returns
+    -------
+    result : list
+        The sum A + A^2 + ... + A^k. Repeated squaring finds it by doubling with S(2n) = S(n) + A^n S(n).
+    """
+    if _fits_in_int64(matrix, exponent, modulus):
+        return _dense_power(matrix, exponent, modulus, cumulative=True)
+    if not _squaring_is_faster(matrix, exponent):
+        return _row_powers(matrix, exponent, modulus, cumulative=True)
+
+    powered = identity(len(matrix))
+    total = [{} for _ in matrix]
+    for bit in bin(exponent)[2:]:
+        total = add(total, multiply(powered, total, modulus), modulus)
+        powered = multiply(powered, powered, modulus)
+        if bit == '1':
+            powered = multiply(powered, matrix, modulus)
+            total = add(total, powered, modulus)
+    return total
+
+
+def _squaring_is_faster(matrix, exponent):
+    """
+    Compares the work of repeated squaring, which soon makes the rows dense, with that of multiplying each row by the
+    matrix exponent times, which touches each non-zero entry of the matrix once per row and multiplication
+    """
+    size = len(matrix)
+    entries = sum(len(row) for row in matrix)
+    return exponent * entries > 2 * size * size * exponent.bit_length()
+
+
+def _row_powers(matrix, exponent, modulus, cumulative):
+    """
+    Returns the power of the matrix, or the sum of its powers if cumulative, by multiplying each row of the identity
+    matrix by the matrix exponent times
+    """
+    result = []
+    for i in range(len(matrix)):
+        row = {i: 1}
+        total = {}
+        for _ in range(exponent):
+            row = multiply([row], matrix, modulus)[0]
+            if cumulative:
+                for j, value in row.items():
+                    total[j] = total.get(j, 0) + value
+            if not row:
+                break
+        if cumulative and modulus is not None:
+            total = {j: value % modulus for j, value in total.items() if value % modulus}
+        result.append(total if cumulative else row)
+    return result
+
+
+def _fits_in_int64(matrix, exponent, modulus):
+    """
+    Checks whether NumPy is installed and can find the power of the matrix, or the sum of its powers, in 64-bit
+    integers. No entry of a power can be larger than the largest row sum of absolute values raised to that power, and
+    with a modulus no entry of a product can be larger than the size times the square of the modulus.
+    """
+    if numpy is None or not matrix or exponent < 1:
+        return False
+    if modulus is not None:
+        return len(matrix) * modulus * modulus < 2 ** 63
+    largest = max(max(sum(abs(value) for value in row.values()) for row in matrix), 1)
+    return exponent * math.log2(largest) + math.log2(exponent) < 62
+
+
+def _dense_power(matrix, exponent, modulus, cumulative):
+    """
+    Returns the power of the matrix, or the sum of its powers if cumulative, by repeated squaring of a dense array of
+    64-bit integers
+    """
+    size = len(matrix)
+    dense = numpy.zeros((size, size), dtype=numpy.int64)
+    for i, row in enumerate(matrix):
+        for j, value in row.items():
+            dense[i, j] = value % modulus if modulus is not None else value
+
+    def reduce(values):
+        return values % modulus if modulus is not None else values
+
+    powered = numpy.identity(size, dtype=numpy.int64)
+    total = numpy.zeros((size, size), dtype=numpy.int64)
+    for bit in bin(exponent)[2:]:
+        if cumulative:
+            total = reduce(total + reduce(powered @ total))
+        powered = reduce(powered @ powered)
+        if bit == '1':
+            powered = reduce(powered @ dense)
+            if cumulative:
+                total = reduce(total + powered)
+
+    result = total if cumulative else powered
+    return [{int(j): int(row[j]) for j in numpy.flatnonzero(row)} for row in result]
@@ -0,0 +1,485 @@
+import csv
+import json
+import os
+from array import array
+from collections.abc import Mapping
+
+EDGE_LIST_FORMATS = {'.csv': 'csv', '.tsv': 'tsv', '.json': 'json'}
+
+
+class Network:
+    """
+    An immutable, integer-indexed representation of a route map
+
+    Stations are interned to dense integer ids in the order they are first seen, and the routes leaving each station are
+    stored in compressed sparse row (CSR) form: the routes leaving station i are found at positions
+    offsets[i] to offsets[i + 1] of targets and weights.
+
+    Apart from the indexes built on first use by reaches, reverse and distance_table, which any thread may build, a
+    network never changes once built, so it can be shared between threads without locking.
+
+    Attributes
+    ----------
+    stations : tuple
+        The station names, indexed by station id
+
+    index : dict
+        The station id of each station name
+
+    offsets : array
+        The position in targets and weights of the first route leaving each station, followed by the total route count
+
+    targets : array
+        The destination station id of each route
+
+    weights : array
+        The distance of each route
+
+    The three arrays may also be read-only memoryviews of 64-bit integers, e.g. of a memory-mapped snapshot file.
+
+    routes : Mapping
+        A read-only view of the route map in the form {origin: {destination: distance}}
+
+    version : int
+        The number of times the route map has been changed, counting each call to from_edges that built on an
+        existing network
+
+    Methods
+    -------
+    from_edges(edges, network=None)
+        Builds a network from (origin, destination, distance) tuples, optionally on top of an existing network
+
+    without_edges(edges)
+        Builds a copy of the network with some routes removed
+
+    next_stops(station)
+        Lists the (destination id, distance) pairs of the routes leaving a station id
+
+    distance(origin, destination)
+        Finds the distance of the direct route between two station ids
+
+    distance_table()
+        Builds a lookup table of the distance of every route
+
+    reaches(origin, destination)
+        Checks whether there is any route, of one or more stops, between two station ids
+
+    reverse()
+        Builds the network with every route reversed
+
+    zero_distance_components()
+        Groups the stations joined by routes of zero distance
+    """
+
+    def __init__(self, stations=(), offsets=None, targets=None, weights=None, version=0):
+        """
+        Parameters
+        ----------
+        stations : tuple
+            The station names, indexed by station id
+
+        offsets, targets, weights : array
+            The CSR arrays describing the routes, see the class documentation
+
+        version : int
+            The version of the route map
+        """
+        self.stations = tuple(stations)
+        self.index = {station: i for i, station in enumerate(self.stations)}
+        self.offsets = offsets if offsets is not None else array('q', [0] * (len(self.stations) + 1))
+        self.targets = targets if targets is not None else array('q')
+        self.weights = weights if weights is not None else array('q')
+        self.routes = _RoutesView(self)
+        self.version = version
+        self._components = None
+        self._reachable = None
+        self._reverse = None
+        self._distance_table = None
+        self._zero_distance_components = None
+
+    def __len__(self):
+        return len(self.stations)
+
+    def __reduce__(self):
+        # Only the station names and CSR arrays are pickled; the index and view are rebuilt on unpickling. Memoryviews
+        # cannot be pickled, so arrays loaded from a snapshot are copied.
+        offsets, targets, weights = (values if isinstance(values, array) else array('q', values)
+                                     for values in (self.offsets, self.targets, self.weights))
+        return self.__class__, (self.stations, offsets, targets, weights, self.version)
+
+    @classmethod
+    def from_edges(cls, edges, network=None):
+        """
+        Parameters
+        ----------
+        edges : iterable
+            The routes to add, provided as (origin, destination, distance) tuples of station names
+
+        network : Network
+            An existing network to build on. Its routes are kept unless replaced by one of the new edges.
+
+        Returns
+        -------
+        network : Network
+            A new network containing the routes of both. Stations and routes keep the order in which they were first
+            added, and replacing a route does not change its position.
+        """
+        stations = list(network.stations) if network is not None else []
+        index = dict(network.index) if network is not None else {}
+        next_stops = [dict(network.next_stops(i)) for i in range(len(stations))] if network is not None else []
+
+        for origin, destination, distance in edges:
+            if origin not in index:
+                index[origin] = len(stations)
+                stations.append(origin)
+                next_stops.append({})
+            if destination not in index:
+                index[destination] = len(stations)
+                stations.append(destination)
+                next_stops.append({})
+            next_stops[index[origin]][index[destination]] = distance
+
+        return cls._from_next_stops(stations, next_stops, network.version + 1 if network is not None else 0)
+
+    def without_edges(self, edges):
+        """
+        Parameters
+        ----------
+        edges : iterable
+            The routes to remove, provided as (origin, destination) tuples of station names
+
+        Returns
+        -------
+        network : Network
+            A new network without the routes. All stations are kept, even if they are no longer connected.
+
+        Raises
+        ------
+        KeyError
+            If one of the routes is not in the network
+        """
+        next_stops = [dict(self.next_stops(i)) for i in range(len(self))]
+        for origin, destination in edges:
+            try:
+                del next_stops[self.index[origin]][self.index[destination]]
+            except KeyError:
+                raise KeyError('Route not found')
+
+        return self._from_next_stops(self.stations, next_stops, self.version + 1)
+
+    @classmethod
+    def _from_next_stops(cls, stations, next_stops, version):
+        offsets = array('q', [0])
+        targets = array('q')
+        weights = array('q')
+        for station_next_stops in next_stops:
+            targets.extend(station_next_stops.keys())
+            weights.extend(station_next_stops.values())
+            offsets.append(len(targets))
+
+        return cls(stations, offsets, targets, weights, version)
+
+    def next_stops(self, station):
+        """
+        Parameters
+        ----------
+        station : int
+            The station id
+
+        Returns
+        -------
+        next_stops : zip
+            The (destination id, distance) pairs of the routes leaving the station
+        """
+        start, end = self.offsets[station], self.offsets[station + 1]
+        return zip(self.targets[start:end], self.weights[start:end])
+
+    def distance(self, origin, destination):
+        """
+        Parameters
+        ----------
+        origin : int
+            The origin station id
+
+        destination : int
+            The destination station id
+
+        Returns
+        -------
+        distance : int
+            The distance of the direct route between the stations, or None if there is no such route
+        """
+        targets = self.targets
+        for i in range(self.offsets[origin], self.offsets[origin + 1]):
+            if targets[i] == destination:
+                return self.weights[i]
+        return None
+
+    def distance_table(self):
+        """
+        Returns
+        -------
+        distances : dict
+            The distance of every route, keyed by origin id * len(network) + destination id, for constant-time lookup
+            of many routes. It is built on the first call and kept for later calls.
+        """
+        if self._distance_table is None:
+            size, offsets, targets, weights = len(self), self.offsets, self.targets, self.weights
+            self._distance_table = {
+                origin * size + targets[i]: weights[i]
+                for origin in range(size) for i in range(offsets[origin], offsets[origin + 1])
+            }
+        return self._distance_table
+
+    def reverse(self):
+        """
+        Returns
+        -------
+        network : Network
+            A network with the same stations and station ids, in which each route runs from its destination to its
+            origin. It is built on the first call and kept for later calls.
+        """
+        if self._reverse is None:
+            offsets, targets, weights = self.offsets, self.targets, self.weights
+            reverse_offsets = array('q', [0]) * (len(self) + 1)
+            for destination in targets:
+                reverse_offsets[destination + 1] += 1
+            for station in range(len(self)):
+                reverse_offsets[station + 1] += reverse_offsets[station]
+
+            positions = array('q', reverse_offsets)
+            reverse_targets = array('q', [0]) * len(targets)
+            reverse_weights = array('q', [0]) * len(targets)
+            for origin in range(len(self)):
+                for position in range(offsets[origin], offsets[origin + 1]):
+                    destination = targets[position]
+                    reverse_targets[positions[destination]] = origin
+                    reverse_weights[positions[destination]] = weights[position]
+                    positions[destination] += 1
+
+            self._reverse = self.__class__(self.stations, reverse_offsets, reverse_targets, reverse_weights, self.version)
+        return self._reverse
+
+    def reaches(self, origin, destination):
+        """
+        Parameters
+        ----------
+        origin : int
+            The origin station id
+
+        destination : int
+            The destination station id
+
+        Returns
+        -------
+        reaches : bool
+            True if there is a route of at least one stop from the origin to the destination, so a station only reaches
+            itself if it is on a loop.
+            The first call builds an index of the strongly connected components of the network and the components each
+            one reaches, after which every call is a lookup. The index holds one bit per pair of components.
+        """
+        if self._reachable is None:
+            self._build_reachability()
+        return (self._reachable[self._components[origin]] >> self._components[destination]) & 1 == 1
+
+    def zero_distance_components(self):
+        """
+        Returns
+        -------
+        components : list
+            The strongly connected components of the routes of zero distance, as (station ids, cyclic) pairs in which
+            cyclic is True if the stations are on a loop of zero distance. Every station is in one component, and each
+            component is listed after every component its routes of zero distance lead to.
+            The components are found on the first call, with the same index as reaches.
+        """
+        if self._zero_distance_components is None:
+            zero_distance = self._from_next_stops(
+                self.stations,
+                [{stop: distance for stop, distance in self.next_stops(i) if distance == 0} for i in range(len(self))],
+                self.version
+            )
+            if len(zero_distance):
+                zero_distance._build_reachability()
+            members = {}
+            for station in range(len(self)):
+                members.setdefault(zero_distance._components[station], []).append(station)
+            self._zero_distance_components = [
+                (tuple(component_members), zero_distance.reaches(component_members[0], component_members[0]))
+                for _, component_members in sorted(members.items())
+            ]
+        return self._zero_distance_components
+
+    def _build_reachability(self):
+        """
+        Finds the strongly connected components with an iterative version of Tarjan's algorithm, which numbers each
+        component only after every component it reaches, then builds the set of components reachable from each one as
+        a bitset in that order
+        """
+        offsets, targets = self.offsets, self.targets
+        size = len(self)
+        components = array('q', [-1]) * size
+        order = [-1] * size
+        lowest = [0] * size
+        on_stack = [False] * size
+        stack = []
+        count = 0
+        component_count = 0
+
+        for root in range(size):
+            if order[root] != -1:
+                continue
+            order[root] = lowest[root] = count
+            count += 1
+            stack.append(root)
+            on_stack[root] = True
+            work = [(root, offsets[root])]
+            while work:
+                station, position = work[-1]
+                if position < offsets[station + 1]:
+                    work[-1] = (station, position + 1)
+                    next_stop = targets[position]
+                    if order[next_stop] == -1:
+                        order[next_stop] = lowest[next_stop] = count
+                        count += 1
+                        stack.append(next_stop)
+                        on_stack[next_stop] = True
+                        work.append((next_stop, offsets[next_stop]))
+                    elif on_stack[next_stop]:
+                        lowest[station] = min(lowest[station], order[next_stop])
+                    continue
+
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowest[parent] = min(lowest[parent], lowest[station])
+                if lowest[station] == order[station]:
+                    while True:
+                        member = stack.pop()
+                        on_stack[member] = False
+                        components[member] = component_count
+                        if member == station:
+                            break
+                    component_count += 1
+
+        members = [[] for _ in range(component_count)]
+        for station in range(size):
+            members[components[station]].append(station)
+
+        reachable = []
+        for component, component_members in enumerate(members):
+            bits = 0
+            for station in component_members:
+                for position in range(offsets[station], offsets[station + 1]):
+                    next_component = components[targets[position]]
+                    if next_component == component:
+                        bits |= 1 << component
+                    else:
+                        bits |= reachable[next_component] | 1 << next_component
+            reachable.append(bits)
+
+        self._components = components
+        self._reachable = reachable
+
+
+def read_edges(source, format=None):
+    """
+    Reads a route map from an edge list with one route per row or element
+
+    Parameters
+    ----------
+    source : str, os.PathLike or file
+        The path of the edge list, or an open text stream
+
+    format : str
+        One of 'csv', 'tsv' or 'json'. If not supplied, it is taken from the file extension of the source.
+        CSV and TSV rows are origin, destination, distance, with an optional header row.
+        JSON must be a list of [origin, destination, distance] lists or of
+        {"origin": ..., "destination": ..., "distance": ...} objects.
+
+    Returns
+    -------
+    edges : list
+        The routes, as (origin, destination, distance) tuples. Station names may be any non-empty string.
+
+    Raises
+    ------
+    ValueError
+        If the format cannot be determined, or if a route is malformatted
+    """
+    if format is None:
+        name = source if isinstance(source, (str, os.PathLike)) else getattr(source, 'name', '')
+        format = EDGE_LIST_FORMATS.get(os.path.splitext(str(name))[1].lower())
+        if format is None:
+            raise ValueError('Edge list format not supplied and not recognised from the file name')
+
+    if format not in EDGE_LIST_FORMATS.values():
+        raise ValueError('Edge list format must be one of {}'.format(', '.join(EDGE_LIST_FORMATS.values())))
+
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, newline='') as stream:
+            return read_edges(stream, format)
+
+    if format == 'json':
+        rows = [(row['origin'], row['destination'], row['distance']) if isinstance(row, dict) else row
+                for row in json.load(source)]
+    else:
+        rows = [row for row in csv.reader(source, delimiter='\t' if format == 'tsv' else ',') if row]
+        if rows and not rows[0][-1].strip().lstrip('-').isdigit():
+            rows = rows[1:]
+
+    try:
+        edges = [(str(origin).strip(), str(destination).strip(), int(distance))
+                 for origin, destination, distance in rows]
+    except (TypeError, ValueError):
+        raise ValueError('Malformatted route: each route must be an origin, destination and integer distance')
+
+    if any(not origin or not destination for origin, destination, _ in edges):
+        raise ValueError('Station name must not be empty')
+
+    return edges
+
+
+class _RoutesView(Mapping):
+    """
+    A read-only {origin: {destination: distance}} view of a network, for compatibility with code written against the
+    original dict-of-dicts route map
+    """
+
+    def __init__(self, network):
+        self._network = network
+
+    def __getitem__(self, station):
+        return _NextStopsView(self._network, self._network.index[station])
+
+    def __iter__(self):
+        return iter(self._network.stations)
+
+    def __len__(self):
+        return len(self._network.stations)
+
+    def __contains__(self, station):
+        return station in self._network.index
+
+
+class _NextStopsView(Mapping):
+    """
+    A read-only {destination: distance} view of the routes leaving one station of a network
+    """
+
+    def __init__(self, network, station):
+        self._network = network
+        self._station = station
+
+    def __getitem__(self, station):
+        destination = self._network.index.get(station)
+        distance = self._network.distance(self._station, destination) if destination is not None else None
+        if distance is None:
+            raise KeyError(station)
+        return distance
+
+    def __iter__(self):
+        stations = self._network.stations
+        return (stations[destination] for destination, _ in self._network.next_stops(self._station))
+
+    def __len__(self):
+        return self._network.offsets[self._station + 1] - self._network.offsets[self._station]
@@ -1,6 +1,106 @@
+import os
+import threading
+from array import array
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 from enum import Enum
+from functools import wraps
+from heapq import heappop, heappush
+from itertools import islice
 from re import match
 
+import matrix
+from instrumentation import QueryStats, SamplingProfiler, current_call
+from network import Network, read_edges
+from snapshot import read_snapshot, write_snapshot
+
+
+def _memoized(method):
+    """
+    Caches the results of a Railway query method in the railway's LRU cache, keyed by the method name, its arguments and
+    the version of the route map, so that results are reused until the route map changes
+    """
+    @wraps(method)
+    def memoized_method(self, *args, **kwargs):
+        network = self._network
+        key = (method.__name__, args, tuple(sorted(kwargs.items())), network.version)
+        try:
+            return self._cache_get(key)
+        except (KeyError, TypeError):
+            pass
+
+        result = method(self, *args, **kwargs)
+        # If the route map changed while the method ran, the result may belong to the new version rather than this one
+        if self._network is network:
+            try:
+                self._cache_put(key, result)
+            except TypeError:
+                pass
+        return result
+
+    return memoized_method
+
+
+def _instrumented(method):
+    """
+    Records the statistics of calls to a Railway query method while the railway's stats are set. Calls made by another
+    instrumented call are not recorded separately, so their work counts towards the outermost call.
+    """
+    @wraps(method)
+    def instrumented_method(self, *args, **kwargs):
+        if self.stats is None or current_call.get() is not None:
+            return method(self, *args, **kwargs)
+        return self.stats.measure(method.__name__, method, self, *args, **kwargs)
+
+    return instrumented_method
+
+
+def _count_search(network, expanded, repeat=1):
+    """
+    Adds the station ids a search expanded, and the routes leaving them, to the counters of the query call in progress
+    """
+    call = current_call.get()
+    if call is not None:
+        offsets = network.offsets
+        expanded = list(expanded)
+        relaxed = sum(offsets[station + 1] - offsets[station] for station in expanded)
+        call.count(repeat * len(expanded), repeat * relaxed)
+
+
+def _finite_count(count):
+    """
+    Returns a route count, which is infinite if the routes can go round a loop of zero distance
+
+    Raises
+    ------
+    ValueError
+        If the count is infinite
+    """
+    if count == float('inf'):
+        raise ValueError('There are infinitely many routes, as they can go round a loop of zero distance')
+    return count
+
+
+# Everything the queries against one version of a route map read. A Railway publishes a new one as a whole whenever the
+# route map changes, and never changes one once published, so a query that takes it once sees a consistent route map
+# and tables without locking, and old versions are freed once the last query using them finishes.
+_RailwayState = namedtuple('_RailwayState', 'network shortest_routes landmarks')
+
+
+# The railway each parallel_report worker process answers queries against, set once by _start_report_worker
+_report_railway = None
+
+
+def _start_report_worker(network):
+    global _report_railway
+    _report_railway = Railway([], cache_size=0)
+    _report_railway._set_network(network, {})
+
+
+def _run_report_task(queries):
+    return _report_railway.query_batch(queries)
+
 
 class Railway:
     """
@@ -8,14 +108,24 @@ class Railway:
 
     Attributes
     ----------
-    routes : dict
-        An adjacency matrix describing a directed weighted graph of the route map.
+    routes : Mapping
+        A read-only adjacency matrix describing a directed weighted graph of the route map.
         The outer key is the origin station, the inner key is the destination station, and the innermost value is the
         distance between the two stations.
+        This is a view of the compact, integer-indexed network that all queries run on, which is owned by the instance.
+
+    version : int
+        The version of the route map, which increases each time it is changed
 
     FindModes : enum
         An enum of the allowed modes for the method find_routes_by_stops.
 
+    SearchModes : enum
+        An enum of the allowed modes for the methods shortest_route and shortest_path.
+
+    stats : QueryStats
+        The statistics being recorded for queries, or None while instrumentation is off
+
     Methods
     -------
     validate_and_parse_route(route)
@@ -24,29 +134,127 @@ class Railway:
     add_routes(route_list)
         Adds a list of routes to the route map
 
+    add_edges(edges)
+        Adds a collection of (origin, destination, distance) routes to the route map
+
+    update_route(origin, destination, distance)
+        Changes the distance of a route in the route map
+
+    remove_route(origin, destination)
+        Removes a route from the route map
+
+    load_routes(source, format=None)
+        Adds the routes in a CSV, TSV or JSON edge list to the route map
+
+    from_edge_list(source, format=None, precompute=False)
+        Creates a Railway from a CSV, TSV or JSON edge list
+
     get_route_distance(origin, *destinations)
         Calculates the distance of a given route
 
+    get_route_distances(itineraries, offsets=None)
+        Calculates the distances of many routes at once
+
+    station_ids(stations)
+        Finds the integer ids of stations, for use with get_route_distances
+
     find_routes_by_stops(origin, destination, stops, mode=FindModes.max)
         Finds all the routes between two stations with a given number of stops
 
     find_routes_by_distance(origin, destination, max_distance)
         Finds all the routes between two stations with a given maximum distance between them
 
-    shortest_route(origin, destination)
+    iter_routes_by_stops(origin, destination, stops, mode=FindModes.max)
+        Lazily yields the routes between two stations with a given number of stops
+
+    iter_routes_by_distance(origin, destination, max_distance)
+        Lazily yields the routes between two stations with a given maximum distance between them
+
+    count_routes_by_stops(origin, destination, stops, mode=FindModes.max)
+        Counts the routes between two stations with a given number of stops, without listing them
+
+    count_routes_by_distance(origin, destination, max_distance)
+        Counts the routes between two stations with a given maximum distance between them, without listing them
+
+    count_all_routes_by_stops(stops, mode=FindModes.exact, modulus=None)
+        Counts the routes between every pair of stations with a given number of stops
+
+    shortest_route(origin, destination, mode=SearchModes.dijkstra)
         Finds the shortest route between two stations
+
+    shortest_path(origin, destination, mode=SearchModes.dijkstra)
+        Finds the shortest route between two stations, including all stops
+
+    has_route(origin, destination)
+        Checks whether there is any route between two stations
+
+    k_shortest_routes(origin, destination, k, simple=True)
+        Lazily yields the k shortest routes between two stations, shortest first
+
+    precompute_shortest_routes()
+        Builds the all-pairs shortest route table used to answer shortest route queries
+
+    save_snapshot(path)
+        Saves the route map and its precomputed tables to a binary snapshot file
+
+    load_snapshot(path, mmap=True, cache_size=1024)
+        Creates a Railway from a binary snapshot file, memory-mapping it by default
+
+    query_batch(queries)
+        Answers a collection of queries, sharing work between queries from the same origin or to the same destination
+
+    parallel_report(pairs, query, *args, workers=None)
+        Answers the same query for many pairs of stations across a pool of worker processes
+
+    instrumented(sample_interval=None, sample_hook=None, max_calls=10000)
+        A context manager that records the statistics of the queries made within it
+
+    snapshot()
+        Returns a Railway fixed at the current version of the route map
+
+    Notes
+    -----
+    Queries may run in any number of threads while another thread changes the route map. Each version of the route map
+    and its precomputed tables is immutable: a change builds the next version, copying only what it alters, and
+    publishes it in a single assignment, so a query never takes a lock and runs entirely against the version current
+    when it started. Changes are serialised by a lock.
     """
-    routes = {}
     FindModes = Enum('FindModes', 'max exact')
+    SearchModes = Enum('SearchModes', 'dijkstra bidirectional landmarks')
+    BATCH_QUERIES = (
+        'get_route_distance', 'find_routes_by_stops', 'find_routes_by_distance', 'count_routes_by_stops',
+        'count_routes_by_distance', 'shortest_route', 'shortest_path'
+    )
 
-    def __init__(self, routes):
+    def __init__(self, routes, precompute=False, cache_size=1024, landmarks=0):
         """
         Parameters
         ----------
         routes : list or str
             The route graph, provided as a list, e.g. ['AB1', 'BC2', 'AC3'],
             or as a string, e.g. 'AB1, BC2, AC3'
+
+        precompute : bool
+            If True, the all-pairs shortest route table is built on construction and kept up to date as routes are
+            added, changed or removed, so that shortest route queries are answered by lookup
+
+        cache_size : int
+            The number of distance, count and shortest route query results to remember until the route map changes.
+            Least recently used results are forgotten first, and a size of 0 disables the cache.
+
+        landmarks : int
+            The number of landmark stations to precompute distances to and from whenever the route map changes, for
+            shortest route queries in SearchModes.landmarks mode
         """
+        self.precompute = precompute
+        self.cache_size = cache_size
+        self.landmarks = landmarks
+        self._state = _RailwayState(Network(), None, None)
+        self._write_lock = threading.RLock()
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.stats = None
+
         if isinstance(routes, str):
             route_list = [route.strip() for route in routes.split(',')]
         elif isinstance(routes, list):
@@ -100,15 +308,177 @@ class Railway:
         route_list : list
             The routes, provided as a list of strings, e.g. ['AB1', 'BC2', 'AC3']
         """
-        for route in route_list:
-            origin, destination, distance = self.validate_and_parse_route(route)
+        self.add_edges(self.validate_and_parse_route(route) for route in route_list)
+
+    def add_edges(self, edges):
+        """
+        Parameters
+        ----------
+        edges : iterable
+            The routes, provided as (origin, destination, distance) tuples, e.g. [('Auckland', 'Hamilton', 126)].
+            Station names are not restricted to single letters.
+        """
+        edges = {(origin, destination): distance for origin, destination, distance in edges}
+        with self._write_lock:
+            self._set_network(Network.from_edges(
+                ((origin, destination, distance) for (origin, destination), distance in edges.items()), self._network
+            ), edges)
+
+    def update_route(self, origin, destination, distance):
+        """
+        Parameters
+        ----------
+        origin : str
+            The origin station, provided as a string, e.g. 'A'
+
+        destination : str
+            The destination station, provided as a string, e.g. 'B'
+
+        distance : int
+            The new distance between the stations
+
+        Raises
+        ------
+        KeyError
+            If the route is not in the route map
+        """
+        with self._write_lock:
+            if destination not in self.routes.get(origin, ()):
+                raise KeyError('Route not found')
+
+            self.add_edges([(origin, destination, int(distance))])
+
+    def remove_route(self, origin, destination):
+        """
+        Parameters
+        ----------
+        origin : str
+            The origin station, provided as a string, e.g. 'A'
+
+        destination : str
+            The destination station, provided as a string, e.g. 'B'
+
+        Raises
+        ------
+        KeyError
+            If the route is not in the route map
+        """
+        with self._write_lock:
+            self._set_network(self._network.without_edges([(origin, destination)]), {(origin, destination): None})
+
+    def _set_network(self, network, changes):
+        """
+        Publishes a new version of the route map with its tables brought up to date, and forgets cached results
+
+        Parameters
+        ----------
+        network : Network
+            The new route map
+
+        changes : dict
+            The new distance of each route that may have changed, keyed by (origin, destination), or None if the route
+            was removed
+        """
+        with self._write_lock:
+            previous_network, previous_shortest_routes, _ = self._state
+            landmarks = self._choose_landmarks(network, self.landmarks) if self.landmarks else None
+
+            if not self.precompute:
+                shortest_routes = None
+            elif previous_shortest_routes is None:
+                shortest_routes = [self._search_from(network, origin) for origin in range(len(network))]
+            else:
+                shortest_routes = self._update_shortest_routes(previous_network, network, previous_shortest_routes, [
+                    (network.index[origin], network.index[destination], previous_network.distance(
+                        previous_network.index[origin], previous_network.index[destination]
+                    ) if origin in previous_network.index and destination in previous_network.index else None, distance)
+                    for (origin, destination), distance in changes.items()
+                ])
+
+            self._state = _RailwayState(network, shortest_routes, landmarks)
+            # A new cache rather than a cleared one, since snapshots share the old one and their version numbers could
+            # coincide with this railway's from now on
+            self._cache = OrderedDict()
+
+    def load_routes(self, source, format=None):
+        """
+        Parameters
+        ----------
+        source : str, os.PathLike or file
+            The path of a CSV, TSV or JSON edge list, or an open text stream, as accepted by network.read_edges
+
+        format : str
+            One of 'csv', 'tsv' or 'json'. If not supplied, it is taken from the file extension of the source.
+
+        Raises
+        ------
+        ValueError
+            If the format cannot be determined, or if a route is malformatted
+        """
+        self.add_edges(read_edges(source, format))
+
+    @classmethod
+    def from_edge_list(cls, source, format=None, precompute=False):
+        """
+        Parameters
+        ----------
+        source : str, os.PathLike or file
+            The path of a CSV, TSV or JSON edge list, or an open text stream, as accepted by network.read_edges
+
+        format : str
+            One of 'csv', 'tsv' or 'json'. If not supplied, it is taken from the file extension of the source.
+
+        precompute : bool
+            As for the constructor
+
+        Returns
+        -------
+        railway : Railway
+            A railway with the routes of the edge list
+
+        Raises
+        ------
+        ValueError
+            If the format cannot be determined, or if a route is malformatted
+        """
+        railway = cls([], precompute=precompute)
+        railway.load_routes(source, format)
+        return railway
+
+    @property
+    def routes(self):
+        return self._network.routes
+
+    @property
+    def version(self):
+        return self._network.version
 
-            if origin not in self.routes:
-                self.routes[origin] = dict()
-            if destination not in self.routes:
-                self.routes[destination] = dict()
-            self.routes[origin][destination] = distance
+    @property
+    def _network(self):
+        return self._state.network
 
+    def snapshot(self):
+        """
+        Returns
+        -------
+        railway : Railway
+            A railway that answers queries against the current version of the route map, however this one changes
+            afterwards. Nothing is copied: it shares the immutable route map and tables of this one, and their cached
+            results until either changes. If its own route map is changed it diverges from this one without affecting
+            it. Its queries are not instrumented unless its own stats are set.
+        """
+        return self._view(self._state)
+
+    def _view(self, state):
+        railway = self.__class__.__new__(self.__class__)
+        railway.__dict__.update(self.__dict__)
+        railway._state = state
+        railway._write_lock = threading.RLock()
+        railway.stats = None
+        return railway
+
+    @_instrumented
+    @_memoized
     def get_route_distance(self, origin, *destinations):
         """
         Parameters
@@ -132,27 +502,114 @@ class Railway:
         KeyError
             If the origin station is not in the route matrix
         """
-        destination = destinations[0]
-
-        if not origin or not destination:
+        if not origin or not destinations or not all(destinations):
             raise ValueError('Argument not supplied')
 
-        if origin not in self.routes:
+        network = self._network
+        if origin not in network.index:
             raise KeyError('Origin station not found')
 
-        if destination not in self.routes[origin]:
-            return None
-        else:
-            distance = self.routes[origin][destination]
-
-        if len(destinations) > 1:
-            next_stop_distance = self.get_route_distance(destination, *destinations[1:])
-            if not next_stop_distance:
+        total = 0
+        station = network.index[origin]
+        for destination in destinations:
+            next_station = network.index.get(destination)
+            distance = network.distance(station, next_station) if next_station is not None else None
+            if distance is None:
                 return None
-            return distance + next_stop_distance
-        else:
-            return distance
+            total += distance
+            station = next_station
+
+        return total
+
+    def station_ids(self, stations):
+        """
+        Parameters
+        ----------
+        stations : iterable
+            Station names, e.g. ['A', 'B', 'C']
 
+        Returns
+        -------
+        ids : array
+            The integer id of each station in the current route map, or -1 for a station that is not in it, as accepted
+            by get_route_distances. Ids stay the same when routes are added, changed or removed.
+        """
+        index = self._network.index
+        return array('q', (index.get(station, -1) for station in stations))
+
+    @_instrumented
+    def get_route_distances(self, itineraries, offsets=None):
+        """
+        Calculates the distances of many routes at once
+
+        Parameters
+        ----------
+        itineraries : iterable
+            Either a sequence of routes, each a sequence of station names or ids, e.g. [['A', 'B', 'C'], ['A', 'D']],
+            or, if offsets is supplied, the stations of every route one after another in a single flat sequence, e.g.
+            the ids array('q', [0, 1, 2, 0, 3]) from station_ids
+
+        offsets : sequence
+            The position in itineraries of the first station of each route, followed by the total number of stations,
+            e.g. [0, 3, 5]
+
+        Returns
+        -------
+        distances : array
+            The total distance along each route as a 64-bit integer, or 0 if the route does not exist
+
+        valid : bytearray
+            1 for each route that exists and 0 for each that does not, including routes of fewer than two stations and
+            routes through unknown stations. Both results support the buffer protocol, so they can be wrapped by array
+            libraries without copying.
+        """
+        network = self._network
+        size = len(network)
+        index = network.index
+        weights = network.distance_table()
+
+        if offsets is None:
+            itineraries = list(itineraries)
+            offsets = array('q', [0])
+            stations = []
+            for itinerary in itineraries:
+                stations.extend(itinerary)
+                offsets.append(len(stations))
+        else:
+            stations = itineraries
+        count = len(offsets) - 1
+
+        distances = array('q', [0]) * count
+        valid = bytearray(count)
+        for i in range(count):
+            start, end = offsets[i], offsets[i + 1]
+            if end - start < 2:
+                continue
+
+            total = 0
+            station = stations[start]
+            if not isinstance(station, int):
+                station = index.get(station, -1)
+            if not 0 <= station < size:
+                continue
+            for position in range(start + 1, end):
+                next_station = stations[position]
+                if not isinstance(next_station, int):
+                    next_station = index.get(next_station, -1)
+                if not 0 <= next_station < size:
+                    break
+                distance = weights.get(station * size + next_station)
+                if distance is None:
+                    break
+                total += distance
+                station = next_station
+            else:
+                distances[i] = total
+                valid[i] = 1
+
+        return distances, valid
+
+    @_instrumented
     def find_routes_by_stops(self, origin, destination, stops, mode=FindModes.max):
         """
         Parameters
@@ -194,32 +651,13 @@ class Railway:
             except:
                 raise ValueError('Argument `stops` is not a number')
 
-        if origin not in self.routes:
+        network = self._network
+        if origin not in network.index:
             raise KeyError('Origin station not found')
 
-        routes = []
-
-        if (mode == self.FindModes.max and stops >= 1) or (mode == self.FindModes.exact and stops == 1):
-            if destination in self.routes[origin]:
-                path = ([origin, destination], self.routes[origin][destination])
-                routes.append(path)
-                return routes
-            if mode == self.FindModes.exact:
-                return []
-
-        if stops != 1 and len(self.routes[origin]) == 0:
-            return []
-
-        for next_stop in self.routes[origin]:
-            subroutes = self.find_routes_by_stops(next_stop, destination, stops-1, mode)
-            if len(subroutes) > 0:
-                for subroute in subroutes:
-                    path, subroute = subroute
-                    path.insert(0, origin)
-                    route = (path, self.routes[origin][next_stop] + subroute)
-                    routes.append(route)
-        return routes
+        return list(self._iter_routes_by_stops(network, origin, destination, stops, mode))
 
+    @_instrumented
     def find_routes_by_distance(self, origin, destination, max_distance):
         """
         Parameters
@@ -231,7 +669,7 @@ class Railway:
             The destination station, provided as a string, e.g. 'B'
 
         max_distance : int
-            The maximum distance to find paths, reduced in recursive calls.
+            The maximum distance to find paths.
             Note that this is a strict less-than comparison - routes with distance equal to this limit will not return.
 
         Returns
@@ -257,27 +695,14 @@ class Railway:
             except:
                 raise ValueError('Argument `max_distance` is not a number')
 
-        if origin not in self.routes:
+        network = self._network
+        if origin not in network.index:
             raise KeyError('Origin station not found')
 
-        routes = []
-        for stop in self.routes[origin]:
-            distance = self.routes[origin][stop]
-            if stop == destination and distance < max_distance:
-                routes.append([origin, stop, distance])
-            if max_distance - distance > 0:
-                subroutes = self.find_routes_by_distance(stop, destination, max_distance - distance)
-                if len(subroutes) > 0:
-                    for subroute in subroutes:
-                        if not subroute:
-                            continue
-                        route = [origin]
-                        route.extend(subroute)
-                        route[-1] += distance
-                        routes.append(route)
-        return routes
-
-    def shortest_route(self, origin, destination):
+        return list(self._iter_routes_by_distance(network, origin, destination, max_distance))
+
+    @_instrumented
+    def iter_routes_by_stops(self, origin, destination, stops, mode=FindModes.max):
         """
         Parameters
         ----------
@@ -287,15 +712,226 @@ class Railway:
         destination : str
             The destination station, provided as a string, e.g. 'B'
 
+        stops : int
+            The number of stops desired between stations
+
+        mode : FindMode
+            The mode by which to consider stops, as for find_routes_by_stops.
+
         Returns
         -------
-        shortest_distance : int
-            The minimum distance between the two specified stations
+        routes : generator
+            Yields the routes find_routes_by_stops would return, in the same order, one at a time.
+            Only the route currently being explored is held in memory.
 
         Raises
         ------
         ValueError
-            If one of the stations is not supplied as an argument
+            If one of the stations is not supplied as an argument, or if stops is not an int
+
+        KeyError
+            If the origin station is not in the route matrix
+        """
+        if not origin or not destination:
+            raise ValueError('Argument not supplied')
+
+        if not isinstance(stops, int):
+            try:
+                stops = int(stops)
+            except:
+                raise ValueError('Argument `stops` is not a number')
+
+        network = self._network
+        if origin not in network.index:
+            raise KeyError('Origin station not found')
+
+        return self._iter_routes_by_stops(network, origin, destination, stops, mode)
+
+    def _iter_routes_by_stops(self, network, origin, destination, stops, mode):
+        if destination not in network.index:
+            return
+        stations, offsets, targets, weights = network.stations, network.offsets, network.targets, network.weights
+        destination = network.index[destination]
+        if not network.reaches(network.index[origin], destination):
+            return
+
+        # No route from a station can reach the destination in fewer stops than the shortest one, so stations are only
+        # explored if that leaves enough stops
+        stops_to_destination = self._search_stops_from(network.reverse(), destination, stops)
+        if stops_to_destination[network.index[origin]] is None:
+            return
+        exact = mode == self.FindModes.exact
+        path = []
+        distances = []
+        stack = []
+        call = current_call.get()
+        expanded = relaxed = depth = yielded = 0
+
+        # Each entry on the stack holds the position of the next unexplored route leaving the station at the same
+        # depth of the path, the end of that station's routes, and the stops remaining after taking one of them
+        station, distance, remaining_stops = network.index[origin], 0, stops
+        try:
+            while True:
+                if remaining_stops >= 1:
+                    start, end = offsets[station], offsets[station + 1]
+                    direct_distance = None
+                    if not exact or remaining_stops == 1:
+                        direct_distance = network.distance(station, destination)
+                    if direct_distance is not None:
+                        yielded += 1
+                        yield [stations[stop] for stop in path] + [stations[station], stations[destination]], \
+                            distance + direct_distance
+                    elif (not exact or remaining_stops > 1) and stops_to_destination[station] is not None \
+                            and stops_to_destination[station] <= remaining_stops:
+                        path.append(station)
+                        distances.append(distance)
+                        stack.append([start, end, remaining_stops - 1])
+                        expanded += 1
+                        relaxed += end - start
+                        if len(stack) > depth:
+                            depth = len(stack)
+
+                while stack:
+                    entry = stack[-1]
+                    position, end, remaining_stops = entry
+                    if position < end:
+                        entry[0] += 1
+                        station = targets[position]
+                        distance = distances[-1] + weights[position]
+                        break
+                    stack.pop()
+                    path.pop()
+                    distances.pop()
+                else:
+                    return
+        finally:
+            if call is not None:
+                call.count(expanded, relaxed, depth, yielded)
+
+    @_instrumented
+    def iter_routes_by_distance(self, origin, destination, max_distance):
+        """
+        Parameters
+        ----------
+        origin : str
+            The origin station, provided as a string, e.g. 'A'
+
+        destination : str
+            The destination station, provided as a string, e.g. 'B'
+
+        max_distance : int
+            The maximum distance to find paths.
+            Note that this is a strict less-than comparison - routes with distance equal to this limit will not return.
+
+        Returns
+        -------
+        routes : generator
+            Yields the routes find_routes_by_distance would return, in the same order, one at a time.
+            Only the route currently being explored is held in memory.
+
+        Raises
+        ------
+        ValueError
+            If one of the stations is not supplied as an argument, or if the max_distance is not an int
+
+        KeyError
+            If the origin station is not in the route matrix
+        """
+        if not origin or not destination:
+            raise ValueError('Argument not supplied')
+
+        if not isinstance(max_distance, int):
+            try:
+                max_distance = int(max_distance)
+            except:
+                raise ValueError('Argument `max_distance` is not a number')
+
+        network = self._network
+        if origin not in network.index:
+            raise KeyError('Origin station not found')
+
+        return self._iter_routes_by_distance(network, origin, destination, max_distance)
+
+    def _iter_routes_by_distance(self, network, origin, destination, max_distance):
+        if destination not in network.index:
+            return
+        stations, offsets, targets, weights = network.stations, network.offsets, network.targets, network.weights
+        destination = network.index[destination]
+        origin = network.index[origin]
+        if not network.reaches(origin, destination):
+            return
+
+        # No route from a station can reach the destination in less than the shortest distance, so stations are only
+        # explored if that leaves the route under max_distance
+        distances_to_destination, _ = self._search_from(network.reverse(), destination, max_distance)
+        if distances_to_destination[origin] is None:
+            return
+        path = [origin]
+        distances = [0]
+        call = current_call.get()
+        expanded, relaxed, depth, yielded = 1, offsets[origin + 1] - offsets[origin], 1, 0
+
+        # Each entry on the stack holds the position of the next unexplored route leaving the station at the same
+        # depth of the path, and the end of that station's routes
+        stack = [[offsets[origin], offsets[origin + 1]]]
+        try:
+            while stack:
+                entry = stack[-1]
+                position, end = entry
+                if position == end:
+                    stack.pop()
+                    path.pop()
+                    distances.pop()
+                    continue
+                entry[0] += 1
+
+                station = targets[position]
+                distance = distances[-1] + weights[position]
+                if distance < max_distance:
+                    if station == destination:
+                        yielded += 1
+                        yield [stations[stop] for stop in path] + [stations[station], distance]
+                    distance_to_destination = distances_to_destination[station]
+                    if distance_to_destination is not None and distance + distance_to_destination < max_distance:
+                        path.append(station)
+                        distances.append(distance)
+                        stack.append([offsets[station], offsets[station + 1]])
+                        expanded += 1
+                        relaxed += offsets[station + 1] - offsets[station]
+                        if len(stack) > depth:
+                            depth = len(stack)
+        finally:
+            if call is not None:
+                call.count(expanded, relaxed, depth, yielded)
+
+    @_instrumented
+    @_memoized
+    def count_routes_by_stops(self, origin, destination, stops, mode=FindModes.max):
+        """
+        Parameters
+        ----------
+        origin : str
+            The origin station, provided as a string, e.g. 'A'
+
+        destination : str
+            The destination station, provided as a string, e.g. 'B'
+
+        stops : int
+            The number of stops desired between stations
+
+        mode : FindMode
+            The mode by which to consider stops, as for find_routes_by_stops.
+
+        Returns
+        -------
+        count : int
+            The number of routes find_routes_by_stops would return for the same arguments.
+            Counts are built up one stop at a time for every station, so no route is ever materialised.
+
+        Raises
+        ------
+        ValueError
+            If one of the stations is not supplied as an argument, or if stops is not an int
 
         KeyError
             If the origin station is not in the route matrix
@@ -303,23 +939,1232 @@ class Railway:
         if not origin or not destination:
             raise ValueError('Argument not supplied')
 
-        if origin not in self.routes:
+        if not isinstance(stops, int):
+            try:
+                stops = int(stops)
+            except:
+                raise ValueError('Argument `stops` is not a number')
+
+        network = self._network
+        if origin not in network.index:
             raise KeyError('Origin station not found')
 
-        shortest_distance = float('inf')
-        nodes_to_visit = []
+        if destination not in network.index or not network.reaches(network.index[origin], network.index[destination]):
+            return 0
+
+        counts = self._count_routes_by_stops(network, network.index[destination], [stops], mode)
+        return counts[stops][network.index[origin]]
 
-        if destination in self.routes[origin]:
-            shortest_distance = self.routes[origin][destination]
+    def _count_routes_by_stops(self, network, destination, stop_limits, mode):
+        """
+        Returns the number of routes to the destination station id from every station id, for each of the given
+        numbers of stops, as a dict of lists indexed by station id
+        """
+        offsets, targets = network.offsets, network.targets
+        has_direct_route = [network.distance(station, destination) is not None for station in range(len(network))]
+        stop_limits = set(stop_limits)
+
+        # Stations that cannot reach the destination always have a count of 0, so only the others are updated
+        stations = [station for station in range(len(network)) if network.reaches(station, destination)]
+
+        # counts[station] is the number of routes from station to the destination using the stops considered so far
+        counts = [0] * len(network)
+        counts_by_stops = {stops: counts for stops in stop_limits if stops < 1}
+        for remaining_stops in range(1, max(stop_limits) + 1):
+            next_counts = [0] * len(network)
+            for station in stations:
+                if has_direct_route[station] and (mode == self.FindModes.max or remaining_stops == 1):
+                    next_counts[station] = 1
+                elif mode == self.FindModes.exact and remaining_stops == 1:
+                    next_counts[station] = 0
+                else:
+                    next_counts[station] = sum(counts[targets[i]] for i in range(offsets[station], offsets[station + 1]))
+            counts = next_counts
+            if remaining_stops in stop_limits:
+                counts_by_stops[remaining_stops] = counts
+
+        if current_call.get() is not None:
+            _count_search(network, stations, max(stop_limits))
+        return counts_by_stops
+
+    @_instrumented
+    @_memoized
+    def count_routes_by_distance(self, origin, destination, max_distance):
+        """
+        Parameters
+        ----------
+        origin : str
+            The origin station, provided as a string, e.g. 'A'
 
-        nodes_to_visit.extend([(origin, stop, 0) for stop in self.routes[origin]])
-        while len(nodes_to_visit) > 0:
-            o, d, distance_to_origin = nodes_to_visit.pop()
-            distance = self.routes[o][d] + distance_to_origin
-            if distance < shortest_distance:
-                for stop in self.routes[d]:
-                    nodes_to_visit.extend([(d, stop, distance) for stop in self.routes[d]])
-                if d == destination:
-                    shortest_distance = min(shortest_distance, distance)
+        destination : str
+            The destination station, provided as a string, e.g. 'B'
 
-        return shortest_distance
+        max_distance : int
+            The maximum distance to find paths.
+            Note that this is a strict less-than comparison - routes with distance equal to this limit will not count.
+
+        Returns
+        -------
+        count : int
+            The number of routes find_routes_by_distance would return for the same arguments.
+            Counts are built up one unit of distance at a time for every station, so no route is ever materialised.
+
+        Raises
+        ------
+        ValueError
+            If one of the stations is not supplied as an argument, if the max_distance is not an int, if the route
+            map contains a negative distance, or if there are infinitely many routes because they can go round a loop
+            of zero distance
+
+        KeyError
+            If the origin station is not in the route matrix
+        """
+        if not origin or not destination:
+            raise ValueError('Argument not supplied')
+
+        if not isinstance(max_distance, int):
+            try:
+                max_distance = int(max_distance)
+            except:
+                raise ValueError('Argument `max_distance` is not a number')
+
+        network = self._network
+        if origin not in network.index:
+            raise KeyError('Origin station not found')
+
+        if max_distance <= 0:
+            return 0
+
+        if destination not in network.index or not network.reaches(network.index[origin], network.index[destination]):
+            return 0
+
+        counts = self._count_routes_by_distance(network, network.index[destination], max_distance)
+        return _finite_count(counts[max_distance][network.index[origin]])
+
+    @staticmethod
+    def _count_routes_by_distance(network, destination, max_distance):
+        """
+        Returns the number of routes to the destination station id from every station id, for every maximum distance up
+        to the one given, as a list indexed by maximum distance of lists indexed by station id
+        """
+        if any(distance < 0 for distance in network.weights):
+            raise ValueError('Route distances must not be negative to count routes by distance')
+        # Stations that cannot reach the destination always have a count of 0, so only the others are updated. Routes of
+        # zero distance are counted from the row being filled, so each station is updated after the stations those
+        # routes lead to, and the stations on a loop of zero distance together, as they have either no routes or
+        # infinitely many.
+        components = [([(station, list(network.next_stops(station))) for station in stations], cyclic)
+                      for stations, cyclic in network.zero_distance_components()
+                      if network.reaches(stations[0], destination)]
+
+        # counts[limit][station] is the number of routes from station to the destination shorter than limit
+        counts = [[0] * len(network)]
+        for limit in range(1, max_distance + 1):
+            row = [0] * len(network)
+            counts.append(row)
+            for next_stops, cyclic in components:
+                totals = []
+                for station, edges in next_stops:
+                    total = 0
+                    for stop, distance in edges:
+                        if distance < limit:
+                            total += counts[limit - distance][stop]
+                            if stop == destination:
+                                total += 1
+                    totals.append(total)
+                if cyclic and any(totals):
+                    totals = [float('inf')] * len(totals)
+                for (station, _), total in zip(next_stops, totals):
+                    row[station] = total
+
+        if current_call.get() is not None:
+            _count_search(network, (station for next_stops, _ in components for station, _ in next_stops),
+                          max_distance)
+        return counts
+
+    @staticmethod
+    def _count_routes_from_by_stops(network, origin, stops):
+        """
+        Returns the number of routes with exactly each number of stops up to the one given from the origin station id to
+        every station id, as a list indexed by number of stops of lists indexed by station id
+        """
+        offsets, targets = network.offsets, network.targets
+        # Stations the origin cannot reach always have a count of 0, so only the others are updated
+        stations = [origin] + [station for station in range(len(network))
+                               if station != origin and network.reaches(origin, station)]
+
+        counts = [[0] * len(network)]
+        counts[0][origin] = 1
+        for _ in range(stops):
+            previous_counts = counts[-1]
+            row = [0] * len(network)
+            for station in stations:
+                count = previous_counts[station]
+                if count:
+                    for i in range(offsets[station], offsets[station + 1]):
+                        row[targets[i]] += count
+            counts.append(row)
+
+        if current_call.get() is not None:
+            _count_search(network, (station for row in counts[:-1] for station in stations if row[station]))
+        return counts
+
+    @staticmethod
+    def _count_routes_from_by_distance(network, origin, max_distance):
+        """
+        Returns the number of routes of exactly each distance below the one given from the origin station id to every
+        station id, as a list indexed by distance of lists indexed by station id
+        """
+        if any(distance < 0 for distance in network.weights):
+            raise ValueError('Route distances must not be negative to count routes by distance')
+        offsets, targets, weights = network.offsets, network.targets, network.weights
+        # Routes of zero distance add to the row being read, so each station is read after the stations with such routes
+        # to it, and the stations on a loop of zero distance together, as they have either no routes or infinitely many
+        components = [(stations, cyclic) for stations, cyclic in reversed(network.zero_distance_components())
+                      if network.reaches(origin, stations[0])]
+
+        # Routes are counted once they have left the origin, so that a route back to it has at least one stop
+        counts = [[0] * len(network) for _ in range(max(max_distance, 1))]
+        for i in range(offsets[origin], offsets[origin + 1]):
+            if weights[i] < max_distance:
+                counts[weights[i]][targets[i]] += 1
+        for distance in range(max_distance):
+            row = counts[distance]
+            for stations, cyclic in components:
+                if cyclic and any(row[station] for station in stations):
+                    for station in stations:
+                        row[station] = float('inf')
+                for station in stations:
+                    count = row[station]
+                    if count:
+                        for i in range(offsets[station], offsets[station + 1]):
+                            if distance + weights[i] < max_distance:
+                                counts[distance + weights[i]][targets[i]] += count
+
+        if current_call.get() is not None:
+            _count_search(network, [origin] + [station for row in counts for stations, _ in components
+                                               for station in stations if row[station]])
+        return counts
+
+    @_instrumented
+    def count_all_routes_by_stops(self, stops, mode=FindModes.exact, modulus=None):
+        """
+        Parameters
+        ----------
+        stops : int
+            The number of stops desired between stations
+
+        mode : FindMode
+            The mode by which to consider stops.
+            If the mode is FindModes.exact, the count for each pair of stations is the one count_routes_by_stops gives.
+            If the mode is FindModes.max, the count is of every route with between 1 and stops stops, i.e. the sum of
+            the exact counts. Unlike find_routes_by_stops, routes that pass through the destination are counted again
+            each time they return to it.
+
+        modulus : int
+            If supplied, counts are reported modulo this number, which keeps intermediate values small for very large
+            stop counts
+
+        Returns
+        -------
+        counts : dict
+            The number of routes in the form {origin: {destination: count}}, omitting pairs with no routes.
+            Counts are the entries of powers of the adjacency matrix, as found by matrix.power and matrix.power_sum.
+            The counts are cached, and each call returns a new dict that the caller is free to change.
+
+        Raises
+        ------
+        ValueError
+            If stops is not an int
+        """
+        if not isinstance(stops, int):
+            try:
+                stops = int(stops)
+            except:
+                raise ValueError('Argument `stops` is not a number')
+
+        return {origin: dict(row) for origin, row in self._count_all_routes_by_stops(stops, mode, modulus)}
+
+    @_memoized
+    def _count_all_routes_by_stops(self, stops, mode, modulus):
+        """
+        Returns the counts of count_all_routes_by_stops as a tuple of (origin, ((destination, count), ...)) pairs, so
+        that the cached result cannot be changed through a result returned to a caller
+        """
+        network = self._network
+        stations = network.stations
+        if stops < 1:
+            return tuple((station, ()) for station in stations)
+
+        adjacency = [{destination: 1 for destination, _ in network.next_stops(station)}
+                     for station in range(len(network))]
+        if mode == self.FindModes.exact:
+            counts = matrix.power(adjacency, stops, modulus)
+        else:
+            counts = matrix.power_sum(adjacency, stops, modulus)
+
+        return tuple((stations[origin], tuple((stations[destination], count) for destination, count in row.items()
+                                              if count))
+                     for origin, row in enumerate(counts))
+
+    @_instrumented
+    @_memoized
+    def shortest_route(self, origin, destination, mode=SearchModes.dijkstra):
+        """
+        Parameters
+        ----------
+        origin : str
+            The origin station, provided as a string, e.g. 'A'
+
+        destination : str
+            The destination station, provided as a string, e.g. 'B'
+
+        mode : SearchMode
+            The search used when there is no precomputed shortest route table.
+            If the mode is SearchModes.dijkstra, a search from the origin finds the distance to every closer station.
+            If the mode is SearchModes.bidirectional, searches from the origin and back from the destination meet in the
+            middle.
+            If the mode is SearchModes.landmarks, the bidirectional searches are also steered towards each other with
+            lower bounds from the precomputed landmark distances (ALT), so only stations near the shortest route tend
+            to be searched. Without landmarks this is the same as SearchModes.bidirectional.
+            Round trips, where the origin and destination are the same station, are always found by SearchModes.dijkstra.
+
+        Returns
+        -------
+        shortest_distance : int
+            The minimum distance between the two specified stations
+
+        Raises
+        ------
+        ValueError
+            If one of the stations is not supplied as an argument
+
+        KeyError
+            If the origin station is not in the route matrix
+        """
+        if not origin or not destination:
+            raise ValueError('Argument not supplied')
+
+        state = self._state
+        network = state.network
+        if origin not in network.index:
+            raise KeyError('Origin station not found')
+
+        if not self._reaches(network, origin, destination):
+            return float('inf')
+        if state.shortest_routes is None and mode != self.SearchModes.dijkstra and origin != destination:
+            _, distance = self._search_between(state, network.index[origin], network.index[destination], mode)
+            return distance
+        search = self._shortest_routes_from(state, network.index[origin])
+        return self._shortest_distance(network, search, destination)
+
+    @_instrumented
+    def shortest_path(self, origin, destination, mode=SearchModes.dijkstra):
+        """
+        Parameters
+        ----------
+        origin : str
+            The origin station, provided as a string, e.g. 'A'
+
+        destination : str
+            The destination station, provided as a string, e.g. 'B'
+
+        mode : SearchMode
+            The search used when there is no precomputed shortest route table, as for shortest_route
+
+        Returns
+        -------
+        route : tuple
+            The shortest route, including all stops and distance, e.g. (['A', 'B', 'C'], 9),
+            or None if the route does not exist.
+            If the origin and destination are the same station, the shortest non-trivial round trip is returned.
+
+        Raises
+        ------
+        ValueError
+            If one of the stations is not supplied as an argument
+
+        KeyError
+            If the origin station is not in the route matrix
+        """
+        if not origin or not destination:
+            raise ValueError('Argument not supplied')
+
+        state = self._state
+        network = state.network
+        if origin not in network.index:
+            raise KeyError('Origin station not found')
+
+        if not self._reaches(network, origin, destination):
+            return None
+        if state.shortest_routes is None and mode != self.SearchModes.dijkstra and origin != destination:
+            path, distance = self._search_between(state, network.index[origin], network.index[destination], mode)
+            return [network.stations[stop] for stop in path], distance
+        origin = network.index[origin]
+        search = self._shortest_routes_from(state, origin)
+        return self._shortest_path(network, search, origin, destination)
+
+    @_instrumented
+    def has_route(self, origin, destination):
+        """
+        Parameters
+        ----------
+        origin : str
+            The origin station, provided as a string, e.g. 'A'
+
+        destination : str
+            The destination station, provided as a string, e.g. 'B'
+
+        Returns
+        -------
+        has_route : bool
+            True if there is any route from the origin to the destination, answered from the network's reachability
+            index without searching. A station only has a route to itself if it is on a loop.
+
+        Raises
+        ------
+        ValueError
+            If one of the stations is not supplied as an argument
+
+        KeyError
+            If the origin station is not in the route matrix
+        """
+        if not origin or not destination:
+            raise ValueError('Argument not supplied')
+
+        network = self._network
+        if origin not in network.index:
+            raise KeyError('Origin station not found')
+
+        return self._reaches(network, origin, destination)
+
+    @staticmethod
+    def _reaches(network, origin, destination):
+        return destination in network.index and network.reaches(network.index[origin], network.index[destination])
+
+    @_instrumented
+    def k_shortest_routes(self, origin, destination, k, simple=True):
+        """
+        Parameters
+        ----------
+        origin : str
+            The origin station, provided as a string, e.g. 'A'
+
+        destination : str
+            The destination station, provided as a string, e.g. 'B'
+
+        k : int
+            The number of routes to find
+
+        simple : bool
+            If True, routes never visit a station twice, except that a round trip ends where it started; they are
+            found with Yen's algorithm.
+            If False, routes may pass through stations, including the destination, any number of times; they are found
+            with a best-first search that visits each station at most k times.
+
+        Returns
+        -------
+        routes : generator
+            Yields up to k routes, including all stops and distance, e.g. (['A', 'B', 'C'], 9), in increasing order of
+            distance. Each route is only searched for when the previous one has been taken.
+            Both algorithms steer their searches with the shortest distances to the destination, which are found once
+            and shared by every search.
+
+        Raises
+        ------
+        ValueError
+            If one of the stations is not supplied as an argument, or if k is not an int
+
+        KeyError
+            If the origin station is not in the route matrix
+        """
+        if not origin or not destination:
+            raise ValueError('Argument not supplied')
+
+        if not isinstance(k, int):
+            try:
+                k = int(k)
+            except:
+                raise ValueError('Argument `k` is not a number')
+
+        network = self._network
+        if origin not in network.index:
+            raise KeyError('Origin station not found')
+
+        if k < 1 or not self._reaches(network, origin, destination):
+            return iter(())
+
+        origin, destination = network.index[origin], network.index[destination]
+        to_destination, _ = self._search_from(network.reverse(), destination)
+        to_destination[destination] = 0
+        if simple:
+            routes = self._iter_simple_routes(network, origin, destination, to_destination)
+        else:
+            routes = self._iter_walks(network, origin, destination, to_destination, k)
+        return (([network.stations[stop] for stop in path], distance) for path, distance in islice(routes, k))
+
+    def _iter_simple_routes(self, network, origin, destination, to_destination):
+        """
+        Yen's algorithm: each route after the first is the shortest of the candidates made by following a found route
+        to some spur station and then leaving it by a route not taken by any found route with the same beginning
+        """
+        found = [self._spur_search(network, origin, destination, set(), set(), to_destination)]
+        candidates = []
+        seen = {tuple(found[0][0])}
+
+        while True:
+            path, distance = found[-1]
+            call = current_call.get()
+            if call is not None:
+                call.count(paths_materialised=1)
+            yield path, distance
+
+            root_distance = 0
+            for i in range(len(path) - 1):
+                spur, root = path[i], path[:i + 1]
+                removed_routes = {(other[i], other[i + 1]) for other, _ in found if other[:i + 1] == root}
+                spur_route = self._spur_search(
+                    network, spur, destination, set(root[:-1]) - {destination}, removed_routes, to_destination
+                )
+                if spur_route is not None:
+                    candidate = root[:-1] + spur_route[0]
+                    if tuple(candidate) not in seen:
+                        seen.add(tuple(candidate))
+                        heappush(candidates, (root_distance + spur_route[1], candidate))
+                root_distance += network.distance(path[i], path[i + 1])
+
+            if not candidates:
+                return
+            distance, path = heappop(candidates)
+            found.append((path, distance))
+
+    @staticmethod
+    def _spur_search(network, origin, destination, removed_stations, removed_routes, to_destination):
+        """
+        A* search for the shortest route of at least one stop from origin to destination that avoids some stations
+        and routes and does not pass back through the origin, using the distances to the destination as the heuristic
+
+        Returns
+        -------
+        route : tuple
+            The station ids along the route and its distance, or None if there is no such route
+        """
+        offsets, targets, weights = network.offsets, network.targets, network.weights
+        previous = {}
+        queue = [(to_destination[origin], 0, origin, None)]
+        while queue:
+            _, distance, station, previous_station = heappop(queue)
+            if station == destination and previous_station is not None:
+                path = [station]
+                while previous_station is not None:
+                    path.append(previous_station)
+                    previous_station = previous[previous_station] if previous_station != origin else None
+                path.reverse()
+                if current_call.get() is not None:
+                    _count_search(network, previous)
+                return path, distance
+            if station in previous:
+                continue
+            previous[station] = previous_station
+
+            for i in range(offsets[station], offsets[station + 1]):
+                next_stop = targets[i]
+                if to_destination[next_stop] is None or next_stop in removed_stations \
+                        or (station, next_stop) in removed_routes:
+                    continue
+                if next_stop in previous and not (next_stop == destination == origin):
+                    continue
+                next_distance = distance + weights[i]
+                heappush(queue, (next_distance + to_destination[next_stop], next_distance, next_stop, station))
+
+        if current_call.get() is not None:
+            _count_search(network, previous)
+        return None
+
+    @staticmethod
+    def _iter_walks(network, origin, destination, to_destination, k):
+        """
+        Best-first search over partial routes ordered by distance plus the distance still to go, which yields routes to
+        the destination in order of distance. The k shortest routes only ever continue from the k shortest routes to
+        any station, so each station is expanded at most k times.
+        """
+        offsets, targets, weights = network.offsets, network.targets, network.weights
+        expansions = [0] * len(network)
+        call = current_call.get()
+        expanded, relaxed, yielded = 0, 0, 0
+        # Routes are linked lists of (station, rest of route) so that extending one does not copy it
+        queue = [(to_destination[origin], 0, 0, (origin, None))]
+        order = 1
+        try:
+            while queue:
+                _, distance, _, route = heappop(queue)
+                station = route[0]
+                if station == destination and route[1] is not None:
+                    path = []
+                    node = route
+                    while node is not None:
+                        path.append(node[0])
+                        node = node[1]
+                    path.reverse()
+                    yielded += 1
+                    yield path, distance
+                if expansions[station] >= k + (station == origin == destination):
+                    continue
+                expansions[station] += 1
+                expanded += 1
+                relaxed += offsets[station + 1] - offsets[station]
+
+                for i in range(offsets[station], offsets[station + 1]):
+                    next_stop = targets[i]
+                    if to_destination[next_stop] is not None:
+                        next_distance = distance + weights[i]
+                        heappush(queue, (next_distance + to_destination[next_stop], next_distance, order,
+                                         (next_stop, route)))
+                        order += 1
+        finally:
+            if call is not None:
+                call.count(expanded, relaxed, paths_materialised=yielded)
+
+    def precompute_shortest_routes(self):
+        """
+        Runs a single-source search from every station and keeps the results, so that subsequent calls to
+        shortest_route and shortest_path are answered by lookup instead of by search.
+        """
+        with self._write_lock:
+            state = self._state
+            network = state.network
+            self._state = state._replace(
+                shortest_routes=[self._search_from(network, origin) for origin in range(len(network))]
+            )
+
+    def save_snapshot(self, path):
+        """
+        Saves the route map, the shortest route table if it is precomputed and the landmark distances if landmarks are
+        used, in the binary format described in the snapshot module
+
+        Parameters
+        ----------
+        path : str or os.PathLike
+            The file to write
+        """
+        write_snapshot(path, *self._state)
+
+    @classmethod
+    def load_snapshot(cls, path, mmap=True, cache_size=1024):
+        """
+        Parameters
+        ----------
+        path : str or os.PathLike
+            A file written by save_snapshot
+
+        mmap : bool
+            If True, the file is memory-mapped and used in place, so loading does not parse or copy the routes or
+            tables, and processes loading the same file share it in the page cache. If False, the file is read into
+            memory.
+
+        cache_size : int
+            As for the constructor
+
+        Returns
+        -------
+        railway : Railway
+            A railway with the saved route map and tables. It precomputes shortest routes if the snapshot includes the
+            table and uses as many landmarks as the snapshot includes.
+
+        Raises
+        ------
+        ValueError
+            If the file is not a snapshot or was written in an unsupported format version
+        """
+        network, shortest_routes, landmarks = read_snapshot(path, mmap)
+        railway = cls([], precompute=shortest_routes is not None, cache_size=cache_size,
+                      landmarks=len(landmarks[0]) if landmarks is not None else 0)
+        railway._state = _RailwayState(network, shortest_routes, landmarks)
+        return railway
+
+    def _update_shortest_routes(self, previous_network, network, table, changes):
+        """
+        Builds the precomputed shortest route table for network from the one for previous_network, searching or
+        comparing only the entries the changed routes can affect.
+
+        The previous table is left unchanged for queries still running against it. The new one shares its rows, and each
+        row is copied before it is first changed, so only the rows the changes affect are copied, and all of them only
+        when stations are added.
+
+        Sources whose shortest route tree used a route that became longer or was removed are first searched again, on
+        the route map with only those changes applied. Routes that became shorter or were added are then applied one at
+        a time: a pair (s, t) can only improve through a new route u -> v if both s -> v and u -> t improve through it,
+        so only those sources and targets are compared.
+
+        Parameters
+        ----------
+        table : list
+            The shortest route table for previous_network, which may also be a tuple of read-only rows loaded from a
+            snapshot
+
+        changes : list
+            The (origin id, destination id, previous distance, new distance) of each changed route, with None standing
+            in for a route that is absent
+
+        Returns
+        -------
+        table : list
+            The shortest route table for network
+        """
+        table = list(table)
+        # The sources whose rows belong to the new table alone and may be changed in place
+        copied = set()
+        lengthened = [(u, v, after) for u, v, before, after in changes
+                      if before is not None and (after is None or after > before)]
+        if lengthened:
+            stations = network.stations
+            lengthened_network = Network.from_edges(
+                [(stations[u], stations[v], after) for u, v, after in lengthened if after is not None], previous_network
+            ).without_edges([(stations[u], stations[v]) for u, v, after in lengthened if after is None])
+            for source, (_, previous) in enumerate(table):
+                if any(previous[v] == u for u, v, _ in lengthened):
+                    table[source] = self._search_from(lengthened_network, source)
+                    copied.add(source)
+
+        added = len(network) - len(table)
+        if added:
+            table = [(list(distances) + [None] * added, list(previous) + [None] * added)
+                     for distances, previous in table]
+            table.extend(([None] * len(network), [None] * len(network)) for _ in range(added))
+            copied.update(range(len(network)))
+
+        for u, v, before, after in changes:
+            if after is None or (before is not None and after >= before):
+                continue
+
+            # Distances are measured along routes of at least one stop, except that a station is its own start and end
+            from_v = [0 if t == v else distance for t, distance in enumerate(table[v][0])]
+            from_v_previous = list(table[v][1])
+            targets = [t for t, distance in enumerate(from_v) if distance is not None and (
+                table[u][0][t] is None or after + distance < table[u][0][t]
+            )]
+            sources = []
+            for s, (distances, _) in enumerate(table):
+                to_u = 0 if s == u else distances[u]
+                if to_u is not None and (distances[v] is None or to_u + after < distances[v]):
+                    sources.append((s, to_u))
+
+            for s, to_u in sources:
+                if s not in copied:
+                    table[s] = tuple(list(row) for row in table[s])
+                    copied.add(s)
+                distances, previous = table[s]
+                for t in targets:
+                    distance = to_u + after + from_v[t]
+                    if distances[t] is None or distance < distances[t]:
+                        distances[t] = distance
+                        previous[t] = u if t == v else from_v_previous[t]
+
+        return table
+
+    def _shortest_routes_from(self, state, origin):
+        """
+        Returns the distances and previous stations of the shortest routes from the origin station id, from the
+        precomputed table if there is one and by search otherwise
+        """
+        if state.shortest_routes is not None:
+            return state.shortest_routes[origin]
+        return self._search_from(state.network, origin)
+
+    @staticmethod
+    def _shortest_distance(network, search, destination):
+        distances, _ = search
+        destination = network.index.get(destination)
+        if destination is None or distances[destination] is None:
+            return float('inf')
+        return distances[destination]
+
+    @staticmethod
+    def _shortest_path(network, search, origin, destination):
+        distances, previous = search
+        destination = network.index.get(destination)
+        if destination is None or distances[destination] is None:
+            return None
+
+        path = [destination]
+        stop = previous[destination]
+        while stop != origin:
+            path.append(stop)
+            stop = previous[stop]
+        path.append(origin)
+        path.reverse()
+
+        return [network.stations[stop] for stop in path], distances[destination]
+
+    @staticmethod
+    def _search_from(network, origin, limit=None):
+        """
+        Dijkstra's algorithm over the route map, seeded with the stations adjacent to the origin rather than with the
+        origin itself, so that the distance recorded for the origin is that of the shortest round trip back to it.
+
+        Parameters
+        ----------
+        network : Network
+            The network to search
+
+        origin : int
+            The origin station id
+
+        limit : int
+            If supplied, the search stops once every station closer than this distance has been found
+
+        Returns
+        -------
+        distances : list
+            The shortest distance from the origin to each station id, or None if the station is not reachable (within
+            the limit)
+
+        previous : list
+            The station id preceding each station id on its shortest route from the origin
+        """
+        offsets, targets, weights = network.offsets, network.targets, network.weights
+        distances = [None] * len(network)
+        previous = [None] * len(network)
+        queue = [(weights[i], targets[i], origin) for i in range(offsets[origin], offsets[origin + 1])]
+        queue.sort()
+
+        while queue:
+            distance, stop, previous_stop = heappop(queue)
+            if limit is not None and distance >= limit:
+                break
+            if distances[stop] is not None:
+                continue
+            distances[stop] = distance
+            previous[stop] = previous_stop
+            for i in range(offsets[stop], offsets[stop + 1]):
+                next_stop = targets[i]
+                if distances[next_stop] is None:
+                    heappush(queue, (distance + weights[i], next_stop, stop))
+
+        if current_call.get() is not None:
+            _count_search(network, (stop for stop, distance in enumerate(distances) if distance is not None))
+        return distances, previous
+
+    def _search_between(self, state, origin, destination, mode):
+        """
+        Bidirectional Dijkstra between two different station ids that are known to be connected, optionally with
+        landmark (ALT) potentials.
+
+        Both searches run on reduced distances using the average of the forward and reverse landmark lower bounds as a
+        potential, which keeps every reduced distance non-negative. The searches stop once the smallest keys of the two
+        queues add up to at least the best route found where they meet. Keys are doubled so that halving the potential
+        never leaves the integers.
+
+        Returns
+        -------
+        path : list
+            The station ids along the shortest route
+
+        distance : int
+            The distance of the shortest route
+        """
+        network = state.network
+        if mode == self.SearchModes.landmarks and state.landmarks is not None:
+            _, from_landmarks, to_landmarks = state.landmarks
+            potentials = {}
+
+            def potential(station):
+                # Twice the average potential: a lower bound on the distance on to the destination, minus one on the
+                # distance from the origin
+                if station not in potentials:
+                    to_destination = from_origin = 0
+                    for from_landmark, to_landmark in zip(from_landmarks, to_landmarks):
+                        if from_landmark[destination] is not None and from_landmark[station] is not None:
+                            to_destination = max(to_destination, from_landmark[destination] - from_landmark[station])
+                        if to_landmark[station] is not None and to_landmark[destination] is not None:
+                            to_destination = max(to_destination, to_landmark[station] - to_landmark[destination])
+                        if from_landmark[station] is not None and from_landmark[origin] is not None:
+                            from_origin = max(from_origin, from_landmark[station] - from_landmark[origin])
+                        if to_landmark[origin] is not None and to_landmark[station] is not None:
+                            from_origin = max(from_origin, to_landmark[origin] - to_landmark[station])
+                    potentials[station] = to_destination - from_origin
+                return potentials[station]
+        else:
+            def potential(station):
+                return 0
+
+        searches = []
+        for search_network, start, sign in ((network, origin, 1), (network.reverse(), destination, -1)):
+            searches.append({
+                'network': search_network, 'sign': sign, 'distances': {start: 0}, 'previous': {start: None},
+                'settled': set(), 'queue': [(sign * potential(start), start)],
+            })
+        forward, backward = searches
+
+        best_distance = None
+        best_route = None
+        while forward['queue'] and backward['queue']:
+            if best_distance is not None and forward['queue'][0][0] + backward['queue'][0][0] >= 2 * best_distance:
+                break
+
+            search, other = (forward, backward) if len(forward['queue']) <= len(backward['queue']) \
+                else (backward, forward)
+            _, station = heappop(search['queue'])
+            if station in search['settled']:
+                continue
+            search['settled'].add(station)
+
+            search_network, sign, distances = search['network'], search['sign'], search['distances']
+            offsets, targets, weights = search_network.offsets, search_network.targets, search_network.weights
+            for i in range(offsets[station], offsets[station + 1]):
+                next_stop = targets[i]
+                if search is forward and next_stop != destination and not network.reaches(next_stop, destination) \
+                        or search is backward and next_stop != origin and not network.reaches(origin, next_stop):
+                    continue
+                distance = distances[station] + weights[i]
+                if next_stop not in distances or distance < distances[next_stop]:
+                    distances[next_stop] = distance
+                    search['previous'][next_stop] = station
+                    heappush(search['queue'], (2 * distance + sign * potential(next_stop), next_stop))
+                if next_stop in other['distances']:
+                    total = distance + other['distances'][next_stop]
+                    if best_distance is None or total < best_distance:
+                        best_distance = total
+                        best_route = (station, next_stop) if search is forward else (next_stop, station)
+
+        if current_call.get() is not None:
+            _count_search(network, forward['settled'])
+            _count_search(network.reverse(), backward['settled'])
+
+        # The best route runs from the origin to best_route[0] in the forward tree, along one route, then on to the
+        # destination in the backward tree
+        path = []
+        stop = best_route[0]
+        while stop is not None:
+            path.append(stop)
+            stop = forward['previous'][stop]
+        path.reverse()
+        stop = best_route[1]
+        while stop is not None:
+            path.append(stop)
+            stop = backward['previous'][stop]
+
+        return path, best_distance
+
+    def _choose_landmarks(self, network, count):
+        """
+        Picks landmark stations by repeatedly taking the station furthest from those already chosen, and finds the
+        shortest distances from and to each of them
+
+        Returns
+        -------
+        landmarks : tuple
+            The landmark station ids, and lists indexed by landmark of the distances from the landmark to each station
+            id and from each station id to the landmark, with None for stations that are not connected
+        """
+        reverse = network.reverse()
+        landmarks, from_landmarks, to_landmarks = [], [], []
+        closest = [None] * len(network)
+        candidate = 0
+        while len(landmarks) < min(count, len(network)):
+            from_landmark, _ = self._search_from(network, candidate)
+            to_landmark, _ = self._search_from(reverse, candidate)
+            from_landmark[candidate] = to_landmark[candidate] = 0
+            landmarks.append(candidate)
+            from_landmarks.append(from_landmark)
+            to_landmarks.append(to_landmark)
+
+            for station in range(len(network)):
+                distances = [distance for distance in (from_landmark[station], to_landmark[station])
+                             if distance is not None]
+                distance = min(distances) if distances else float('inf')
+                if closest[station] is None or distance < closest[station]:
+                    closest[station] = distance
+            candidate = max((station for station in range(len(network)) if station not in landmarks),
+                            key=lambda station: closest[station], default=None)
+            if candidate is None:
+                break
+
+        return landmarks, from_landmarks, to_landmarks
+
+    @staticmethod
+    def _search_stops_from(network, origin, limit):
+        """
+        Breadth-first search over the route map, seeded like _search_from, so that the number of stops recorded for the
+        origin is that of the shortest round trip back to it
+
+        Parameters
+        ----------
+        network : Network
+            The network to search
+
+        origin : int
+            The origin station id
+
+        limit : int
+            The search stops once every station within this many stops has been found
+
+        Returns
+        -------
+        stops : list
+            The fewest stops from the origin to each station id, or None if the station is not reachable within the limit
+        """
+        offsets, targets = network.offsets, network.targets
+        stops = [None] * len(network)
+        frontier = [origin]
+        for stop_count in range(1, limit + 1):
+            next_frontier = []
+            for station in frontier:
+                for i in range(offsets[station], offsets[station + 1]):
+                    next_stop = targets[i]
+                    if stops[next_stop] is None:
+                        stops[next_stop] = stop_count
+                        next_frontier.append(next_stop)
+            if not next_frontier:
+                break
+            frontier = next_frontier
+
+        if current_call.get() is not None:
+            _count_search(network, [origin] + [station for station, count in enumerate(stops) if count is not None
+                                               and count < limit and station != origin])
+        return stops
+
+    @_instrumented
+    def query_batch(self, queries):
+        """
+        Parameters
+        ----------
+        queries : iterable
+            The queries, each provided as a tuple of the name of one of the methods in BATCH_QUERIES followed by its
+            arguments, e.g. [('shortest_route', 'A', 'C'), ('get_route_distance', 'A', 'B', 'C')]
+
+        Returns
+        -------
+        results : list
+            The result of each query, in the order given.
+            Repeated queries are answered once, shortest route queries from the same origin share one search, and count
+            queries to the same destination share one table. Count queries by distance, or by an exact number of stops,
+            share one table per origin instead when they have fewer origins than destinations.
+            If a query raises an exception, the exception is returned in its place rather than raised.
+            Every query is answered against the version of the route map current when the batch started.
+        """
+        state = self._state
+        network = state.network
+        # Queries that are not batched are answered by a railway fixed at the same version
+        railway = None
+        queries = [tuple(query) for query in queries]
+        # Repeated queries are found by hashing them, so a query with an unhashable argument gets its own error
+        unhashable = {}
+        for position, query in enumerate(queries):
+            try:
+                hash(query)
+            except TypeError:
+                unhashable[position] = ValueError('Query arguments must be station names, numbers and modes')
+        results = {}
+        searches = {}
+        stop_counts = []
+        distance_counts = []
+
+        for query in dict.fromkeys(query for position, query in enumerate(queries) if position not in unhashable):
+            name, args = query[0], query[1:]
+            try:
+                results[query] = self._cache_get((name, args, (), network.version))
+                continue
+            except KeyError:
+                pass
+
+            if name in ('shortest_route', 'shortest_path') and len(args) == 2 and args[0] in network.index and args[1]:
+                searches.setdefault(args[0], []).append(query)
+            elif name == 'count_routes_by_stops' and len(args) in (3, 4) and args[0] in network.index \
+                    and args[1] in network.index and isinstance(args[2], int) \
+                    and isinstance(args[3] if len(args) == 4 else self.FindModes.max, self.FindModes):
+                stop_counts.append((query, args[3] if len(args) == 4 else self.FindModes.max))
+            elif name == 'count_routes_by_distance' and len(args) == 3 and args[0] in network.index \
+                    and args[1] in network.index and isinstance(args[2], int) and args[2] > 0:
+                distance_counts.append(query)
+            elif name in self.BATCH_QUERIES:
+                if railway is None:
+                    railway = self._view(state)
+                try:
+                    results[query] = getattr(railway, name)(*args)
+                except Exception as e:
+                    results[query] = e
+            else:
+                results[query] = ValueError('Unsupported query `{}`'.format(name))
+
+        for origin, origin_queries in searches.items():
+            search = self._shortest_routes_from(state, network.index[origin])
+            for query in origin_queries:
+                name, _, destination = query
+                if name == 'shortest_route':
+                    results[query] = self._shortest_distance(network, search, destination)
+                    self._cache_put((name, query[1:], (), network.version), results[query])
+                else:
+                    results[query] = self._shortest_path(network, search, network.index[origin], destination)
+
+        # Count queries share one table per destination, or per origin if they have fewer origins than destinations and
+        # the count can be built up from the origin. In max mode the routes depend on the destination, so it cannot.
+        index = network.index
+        exact_stop_counts = [query for query, mode in stop_counts if mode == self.FindModes.exact]
+        forward = len({query[1] for query in exact_stop_counts}) < len({query[2] for query in exact_stop_counts})
+        groups = {}
+        for query, mode in stop_counts:
+            from_origin = forward and mode == self.FindModes.exact
+            groups.setdefault((query[1] if from_origin else query[2], mode, from_origin), []).append(query)
+
+        for (station, mode, from_origin), station_queries in groups.items():
+            stop_limits = [query[3] for query in station_queries]
+            if from_origin:
+                counts = self._count_routes_from_by_stops(network, index[station], max(stop_limits))
+            else:
+                counts = self._count_routes_by_stops(network, index[station], stop_limits, mode)
+            for query in station_queries:
+                if from_origin:
+                    results[query] = counts[query[3]][index[query[2]]] if query[3] > 0 else 0
+                else:
+                    results[query] = counts[query[3]][index[query[1]]]
+                self._cache_put((query[0], query[1:], (), network.version), results[query])
+
+        forward = len({query[1] for query in distance_counts}) < len({query[2] for query in distance_counts})
+        groups = {}
+        for query in distance_counts:
+            groups.setdefault(query[1] if forward else query[2], []).append(query)
+
+        for station, station_queries in groups.items():
+            max_distance = max(query[3] for query in station_queries)
+            try:
+                if forward:
+                    counts = self._count_routes_from_by_distance(network, index[station], max_distance)
+                else:
+                    counts = self._count_routes_by_distance(network, index[station], max_distance)
+            except ValueError as e:
+                for query in station_queries:
+                    results[query] = e
+                continue
+            for query in station_queries:
+                try:
+                    if forward:
+                        results[query] = _finite_count(sum(row[index[query[2]]] for row in counts[:query[3]]))
+                    else:
+                        results[query] = _finite_count(counts[query[3]][index[query[1]]])
+                except ValueError as e:
+                    results[query] = e
+                    continue
+                self._cache_put((query[0], query[1:], (), network.version), results[query])
+
+        return [unhashable[position] if position in unhashable else results[query]
+                for position, query in enumerate(queries)]
+
+    def _cache_get(self, key):
+        """
+        Returns the cached result for a key, marking it as recently used
+
+        Raises
+        ------
+        KeyError
+            If there is no cached result for the key
+
+        TypeError
+            If the key is not hashable
+        """
+        cache = self._cache
+        with self._cache_lock:
+            result = cache[key]
+            cache.move_to_end(key)
+        return result
+
+    def _cache_put(self, key, result):
+        """
+        Caches the result for a key, forgetting the least recently used result if the cache is full
+        """
+        if self.cache_size <= 0:
+            return
+        cache = self._cache
+        with self._cache_lock:
+            cache[key] = result
+            cache.move_to_end(key)
+            while len(cache) > self.cache_size:
+                cache.popitem(last=False)
+
+    def parallel_report(self, pairs, query, *args, workers=None):
+        """
+        Parameters
+        ----------
+        pairs : iterable
+            The (origin, destination) station pairs to report on, e.g. [('A', 'B'), ('A', 'C')]
+
+        query : str
+            The name of one of the methods in BATCH_QUERIES that takes an origin and destination, e.g. 'shortest_route'
+
+        args
+            Any further arguments to the query, e.g. the max_distance of find_routes_by_distance
+
+        workers : int
+            The number of worker processes, defaulting to the number of CPUs
+
+        Returns
+        -------
+        results : dict
+            The result of the query for each pair, in the form {(origin, destination): result}. As for query_batch, if a
+            query raises an exception, the exception is returned in its place.
+
+        Notes
+        -----
+        The route map is sent to each worker once, when it starts, as the compact network arrays. Pairs are then
+        partitioned by origin, so each task answers whole origins with query_batch and shortest route queries from an
+        origin share one search.
+        """
+        pairs = list(dict.fromkeys(tuple(pair) for pair in pairs))
+        workers = workers or os.cpu_count() or 1
+
+        queries_by_origin = {}
+        for origin, destination in pairs:
+            queries_by_origin.setdefault(origin, []).append((query, origin, destination) + args)
+
+        # Several tasks per worker keeps the workers evenly loaded when origins differ in cost
+        origins = list(queries_by_origin)
+        task_count = min(len(origins), workers * 4)
+        tasks = [[query for origin in origins[i::task_count] for query in queries_by_origin[origin]]
+                 for i in range(task_count)]
+
+        results = {}
+        with ProcessPoolExecutor(workers, initializer=_start_report_worker, initargs=(self._network,)) as executor:
+            for task, task_results in zip(tasks, executor.map(_run_report_task, tasks)):
+                for task_query, result in zip(task, task_results):
+                    results[task_query[1], task_query[2]] = result
+
+        return {pair: results[pair] for pair in pairs}
+
+    @contextmanager
+    def instrumented(self, sample_interval=None, sample_hook=None, max_calls=10000):
+        """
+        Records the statistics of the queries made on this railway within the with block, e.g.
+            with railway.instrumented() as stats:
+                railway.find_routes_by_stops('C', 'C', 3)
+            print(stats.as_dict())
+
+        Parameters
+        ----------
+        sample_interval : float
+            If supplied, the stack of the calling thread is also sampled this often, in seconds, for as long as the
+            block runs
+
+        sample_hook : callable
+            Called with the sampled frame at each sample, defaulting to QueryStats.sample
+
+        max_calls : int
+            The number of most recent calls to keep the statistics of, as for QueryStats
+
+        Returns
+        -------
+        stats : QueryStats
+            The statistics, which go on being recorded until the block ends. The stats attribute is restored to its
+            previous value afterwards.
+        """
+        stats = QueryStats(max_calls)
+        previous_stats, self.stats = self.stats, stats
+        profiler = None
+        if sample_interval:
+            profiler = SamplingProfiler(sample_hook or stats.sample, sample_interval)
+            profiler.start()
+        try:
+            yield stats
+        finally:
+            if profiler is not None:
+                profiler.stop()
+            self.stats = previous_stats
@@ -0,0 +1,310 @@
+"""
+An asyncio query server for a Railway, speaking line-delimited JSON over TCP or a Unix socket.
+
+Each request is a single line holding a JSON object naming one of the QUERIES and its positional arguments, e.g.
+    {"id": 1, "query": "find_routes_by_stops", "args": ["C", "C", 3, "max"]}
+with modes given by name. Each is answered by a single line holding either the result or the exception it raised, e.g.
+    {"id": 1, "result": [[["C", "D", "C"], 16], [["C", "E", "B", "C"], 9]]}
+    {"id": 2, "error": {"type": "KeyError", "message": "Origin station not found"}}
+Tuples are sent as lists, and an infinite shortest route distance as null.
+
+Requests on a connection are pipelined: a client may send many requests without waiting, and each response is sent as
+soon as it is ready, so responses may arrive in a different order from their requests and are matched by id. Once
+max_pending requests on a connection are unanswered, the server stops reading from it until one is answered.
+"""
+import argparse
+import asyncio
+import json
+import os
+from array import array
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import suppress
+
+from railway import Railway
+
+QUERIES = Railway.BATCH_QUERIES + (
+    'get_route_distances', 'count_all_routes_by_stops', 'has_route', 'k_shortest_routes'
+)
+
+# Enumerations, counts and k shortest routes can take seconds, so they run in the executor instead of holding up the
+# event loop
+EXECUTOR_QUERIES = (
+    'find_routes_by_stops', 'find_routes_by_distance', 'count_routes_by_stops', 'count_routes_by_distance',
+    'count_all_routes_by_stops', 'k_shortest_routes'
+)
+
+# The position and enum of the optional mode argument of each query that has one
+MODE_ARGUMENTS = {
+    'find_routes_by_stops': (3, Railway.FindModes),
+    'count_routes_by_stops': (3, Railway.FindModes),
+    'count_all_routes_by_stops': (1, Railway.FindModes),
+    'shortest_route': (2, Railway.SearchModes),
+    'shortest_path': (2, Railway.SearchModes),
+}
+
+LINE_LIMIT = 2 ** 20
+
+# The railway each worker process answers EXECUTOR_QUERIES against, set once by _start_worker
+_worker_railway = None
+
+
+def _start_worker(network):
+    global _worker_railway
+    _worker_railway = Railway([], cache_size=0)
+    _worker_railway._set_network(network, {})
+
+
+def _run_query(name, args, railway=None):
+    # Answers one of the EXECUTOR_QUERIES in a worker process, or against the railway of the executor thread. Routes
+    # from k_shortest_routes are listed here, as they are only searched for as they are taken.
+    if railway is None:
+        railway = _worker_railway
+    if name == 'k_shortest_routes':
+        return list(railway.k_shortest_routes(*args))
+    return getattr(railway, name)(*args)
+
+
+class QueryServer:
+    """
+    Serves the queries of a railway to any number of concurrent clients
+
+    Attributes
+    ----------
+    railway : Railway
+        The railway to query
+
+    workers : int
+        The number of worker processes that EXECUTOR_QUERIES run in, defaulting to the number of CPUs. If 0, they run
+        in a single thread of this process instead.
+
+    max_pending : int
+        The number of unanswered requests allowed on each connection before the server stops reading from it
+
+    Methods
+    -------
+    start(host='127.0.0.1', port=8765, path=None)
+        Starts listening for connections
+
+    answer(name, args)
+        Answers a single query
+
+    close()
+        Stops the worker processes or thread
+    """
+
+    def __init__(self, railway, workers=None, max_pending=64):
+        """
+        Parameters
+        ----------
+        railway : Railway
+            The railway to query. Its route map should not be changed while the server is running.
+
+        workers : int
+            As for the attribute
+
+        max_pending : int
+            As for the attribute
+        """
+        self.railway = railway
+        self.workers = workers if workers is not None else os.cpu_count() or 1
+        self.max_pending = max_pending
+        self._executor = None
+        self._executor_railway = None
+
+    async def start(self, host='127.0.0.1', port=8765, path=None):
+        """
+        Parameters
+        ----------
+        host : str
+            The address to listen on
+
+        port : int
+            The TCP port to listen on, or 0 for any free port
+
+        path : str
+            If supplied, the server listens on a Unix socket at this path instead of on TCP
+
+        Returns
+        -------
+        server : asyncio.Server
+            The listening server
+        """
+        if self._executor is None:
+            if self.workers:
+                self._executor = ProcessPoolExecutor(
+                    self.workers, initializer=_start_worker, initargs=(self.railway._network,)
+                )
+            else:
+                # The thread gets its own railway on the same network, so that it never touches the cache of this one
+                self._executor = ThreadPoolExecutor(1)
+                self._executor_railway = Railway([], cache_size=0)
+                self._executor_railway._set_network(self.railway._network, {})
+
+        if path is not None:
+            return await asyncio.start_unix_server(self._handle_connection, path, limit=LINE_LIMIT)
+        return await asyncio.start_server(self._handle_connection, host, port, limit=LINE_LIMIT)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    async def answer(self, name, args):
+        """
+        Parameters
+        ----------
+        name : str
+            The name of one of the QUERIES
+
+        args : list
+            The positional arguments of the query, with any mode given by name, e.g. ['A', 'C', 4, 'exact']
+
+        Returns
+        -------
+        result
+            The result of the query, converted to the types JSON can represent
+
+        Raises
+        ------
+        ValueError
+            If the query is not supported, or its mode is not recognised
+
+        Any exception raised by the query itself
+        """
+        if name not in QUERIES:
+            raise ValueError('Unsupported query `{}`'.format(name))
+        if not isinstance(args, list):
+            raise ValueError('Query arguments must be a list')
+
+        if name in MODE_ARGUMENTS and len(args) > MODE_ARGUMENTS[name][0]:
+            position, modes = MODE_ARGUMENTS[name]
+            try:
+                args[position] = modes[args[position]]
+            except (KeyError, TypeError):
+                raise ValueError('Mode must be one of {}'.format(', '.join(mode.name for mode in modes)))
+
+        if name in EXECUTOR_QUERIES:
+            result = await asyncio.get_running_loop().run_in_executor(
+                self._executor, _run_query, name, args, self._executor_railway
+            )
+        else:
+            result = getattr(self.railway, name)(*args)
+
+        return to_json(result)
+
+    async def _handle_connection(self, reader, writer):
+        pending = asyncio.Semaphore(self.max_pending)
+        write_lock = asyncio.Lock()
+        tasks = set()
+        try:
+            while True:
+                await pending.acquire()
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    await self._send(writer, write_lock, error_response(None, ValueError('Request line too long')))
+                    break
+                except ConnectionError:
+                    break
+                if not line:
+                    break
+                if not line.strip():
+                    pending.release()
+                    continue
+
+                task = asyncio.ensure_future(self._respond(line, writer, write_lock, pending))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            writer.close()
+
+    async def _respond(self, line, writer, write_lock, pending):
+        request_id = None
+        try:
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError('Request must be a JSON object')
+                request_id = request.get('id')
+                result = await self.answer(request.get('query'), request.get('args', []))
+                response = {'id': request_id, 'result': result}
+            except Exception as e:
+                response = error_response(request_id, e)
+            await self._send(writer, write_lock, response)
+        finally:
+            pending.release()
+
+    @staticmethod
+    async def _send(writer, write_lock, response):
+        # Only one response is written and drained at a time, so that a slow client holds up only its own connection
+        async with write_lock:
+            with suppress(ConnectionError):
+                writer.write(json.dumps(response).encode('utf-8') + b'\n')
+                await writer.drain()
+
+
+def error_response(request_id, exception):
+    """
+    Returns the response reporting that a request raised an exception, as sent by the server
+    """
+    message = exception.args[0] if len(exception.args) == 1 else ', '.join(map(str, exception.args))
+    return {'id': request_id, 'error': {'type': type(exception).__name__, 'message': str(message)}}
+
+
+def to_json(result):
+    """
+    Returns a query result converted to the types JSON can represent, as sent by the server
+    """
+    if isinstance(result, (list, tuple, array, bytearray)):
+        return [to_json(item) for item in result]
+    if result == float('inf'):
+        return None
+    return result
+
+
+async def serve(railway, host='127.0.0.1', port=8765, path=None, workers=None, max_pending=64):
+    """
+    Serves the queries of a railway until cancelled, with the arguments described by QueryServer
+    """
+    query_server = QueryServer(railway, workers, max_pending)
+    try:
+        server = await query_server.start(host, port, path)
+        async with server:
+            await server.serve_forever()
+    finally:
+        query_server.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Serve Railway queries as line-delimited JSON over TCP or a Unix socket'
+    )
+    network = parser.add_mutually_exclusive_group()
+    network.add_argument('--routes', default='AB5, BC4, CD8, DC8, DE6, AD5, CE2, EB3, AE7',
+                         help='the route map as a comma-separated string, e.g. "AB5, BC4"')
+    network.add_argument('--edge-list', help='a CSV, TSV or JSON edge list to load the route map from')
+    network.add_argument('--snapshot', help='a snapshot file to load the route map from')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', help='the path of a Unix socket to listen on instead of TCP')
+    parser.add_argument('--workers', type=int, help='the number of worker processes for route enumeration and counts')
+    parser.add_argument('--max-pending', type=int, default=64,
+                        help='the number of unanswered requests allowed on each connection')
+    args = parser.parse_args(argv)
+
+    if args.snapshot:
+        railway = Railway.load_snapshot(args.snapshot)
+    elif args.edge_list:
+        railway = Railway.from_edge_list(args.edge_list)
+    else:
+        railway = Railway(args.routes)
+
+    with suppress(KeyboardInterrupt):
+        asyncio.run(serve(railway, args.host, args.port, args.unix, args.workers, args.max_pending))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,209 @@
+"""
+A versioned binary snapshot format for networks and their precomputed tables, which can be loaded by memory-mapping the
+file so that its arrays are used in place rather than parsed or copied.
+
+Every integer is a signed 64-bit value in the byte order recorded in the header. The file is laid out as:
+
+    header        MAGIC, then FORMAT_VERSION, flags, network version, station count n, route count m, landmark count l
+                  and the byte length of the station names
+    name offsets  n + 1 positions in the station names of the start of each name, followed by the total length
+    names         the UTF-8 station names, one after another
+    offsets       the n + 1 CSR offsets of the network
+    targets       the m CSR targets of the network
+    weights       the m CSR weights of the network
+    shortest      if the SHORTEST_ROUTES flag is set, n * n distances then n * n previous station ids, row by row
+    landmarks     if the LANDMARKS flag is set, l landmark ids, then l * n distances from and l * n distances to them
+
+Every section starts on a multiple of 8 bytes, and NONE stands in for a missing distance or station id.
+"""
+import mmap as _mmap
+import struct
+import sys
+from array import array
+from collections.abc import Sequence
+
+from network import Network
+
+MAGIC = b'KIWIRAIL'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<8sIIqqqqq')
+LITTLE_ENDIAN = 1
+SHORTEST_ROUTES = 2
+LANDMARKS = 4
+NONE = -2 ** 63
+
+
+def write_snapshot(path, network, shortest_routes=None, landmarks=None):
+    """
+    Parameters
+    ----------
+    path : str or os.PathLike
+        The file to write
+
+    network : Network
+        The network to save
+
+    shortest_routes : list
+        If supplied, the (distances, previous) lists of the shortest routes from each station id, as kept by Railway
+
+    landmarks : tuple
+        If supplied, the landmark station ids and the lists of distances from and to each landmark, as kept by Railway
+    """
+    size = len(network)
+    names = [station.encode('utf-8') for station in network.stations]
+    name_offsets = array('q', [0])
+    for name in names:
+        name_offsets.append(name_offsets[-1] + len(name))
+
+    flags = LITTLE_ENDIAN if sys.byteorder == 'little' else 0
+    flags |= SHORTEST_ROUTES if shortest_routes is not None else 0
+    flags |= LANDMARKS if landmarks is not None else 0
+    landmark_count = len(landmarks[0]) if landmarks is not None else 0
+
+    with open(path, 'wb') as stream:
+        stream.write(HEADER.pack(MAGIC, FORMAT_VERSION, flags, network.version, size, len(network.targets),
+                                 landmark_count, name_offsets[-1]))
+        _write_section(stream, name_offsets.tobytes())
+        _write_section(stream, b''.join(names))
+        for values in (network.offsets, network.targets, network.weights):
+            _write_section(stream, array('q', values).tobytes())
+
+        if shortest_routes is not None:
+            for column in (0, 1):
+                _write_section(stream, b''.join(_encode(row[column]) for row in shortest_routes))
+
+        if landmarks is not None:
+            landmark_ids, from_landmarks, to_landmarks = landmarks
+            _write_section(stream, array('q', landmark_ids).tobytes())
+            _write_section(stream, b''.join(_encode(row) for row in from_landmarks))
+            _write_section(stream, b''.join(_encode(row) for row in to_landmarks))
+
+
+def read_snapshot(path, mmap=True):
+    """
+    Parameters
+    ----------
+    path : str or os.PathLike
+        The file to read
+
+    mmap : bool
+        If True, the file is memory-mapped and the arrays of the network and tables are views of the mapping, so that
+        processes loading the same file share one copy of it in the page cache. If False, the file is read into memory.
+        Either way the arrays are copied only if the file was written on a machine of the other byte order.
+
+    Returns
+    -------
+    network : Network
+        The saved network
+
+    shortest_routes : tuple
+        The shortest route table in the form kept by Railway, or None if none was saved. The table and its rows are
+        read-only.
+
+    landmarks : tuple
+        The landmark station ids and distances in the form kept by Railway, or None if none were saved. The rows of
+        distances are read-only.
+
+    Raises
+    ------
+    ValueError
+        If the file is not a snapshot, was written in an unsupported format version, or is truncated
+    """
+    with open(path, 'rb') as stream:
+        if mmap:
+            try:
+                data = _mmap.mmap(stream.fileno(), 0, access=_mmap.ACCESS_READ)
+            except ValueError:
+                raise ValueError('Not a railway snapshot')
+        else:
+            data = stream.read()
+
+    if len(data) < HEADER.size:
+        raise ValueError('Not a railway snapshot')
+    magic, format_version, flags, version, size, route_count, landmark_count, name_length = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError('Not a railway snapshot')
+    if format_version != FORMAT_VERSION:
+        raise ValueError('Unsupported snapshot format version {}'.format(format_version))
+
+    reader = _SectionReader(memoryview(data), HEADER.size, (flags & LITTLE_ENDIAN) != (sys.byteorder == 'little'))
+    name_offsets = reader.integers(size + 1)
+    names = reader.bytes(name_length)
+    stations = [str(names[name_offsets[i]:name_offsets[i + 1]], 'utf-8') for i in range(size)]
+    network = Network(stations, reader.integers(size + 1), reader.integers(route_count), reader.integers(route_count),
+                      version)
+
+    shortest_routes = None
+    if flags & SHORTEST_ROUTES:
+        distances, previous = reader.integers(size * size), reader.integers(size * size)
+        shortest_routes = tuple(
+            (_NullableRow(distances[i * size:(i + 1) * size]), _NullableRow(previous[i * size:(i + 1) * size]))
+            for i in range(size)
+        )
+
+    landmarks = None
+    if flags & LANDMARKS:
+        landmark_ids = list(reader.integers(landmark_count))
+        from_landmarks, to_landmarks = reader.integers(landmark_count * size), reader.integers(landmark_count * size)
+        landmarks = (
+            landmark_ids,
+            [_NullableRow(from_landmarks[i * size:(i + 1) * size]) for i in range(landmark_count)],
+            [_NullableRow(to_landmarks[i * size:(i + 1) * size]) for i in range(landmark_count)],
+        )
+
+    return network, shortest_routes, landmarks
+
+
+def _write_section(stream, data):
+    stream.write(data)
+    stream.write(b'\0' * (-len(data) % 8))
+
+
+def _encode(row):
+    return array('q', (NONE if value is None else value for value in row)).tobytes()
+
+
+class _SectionReader:
+    """
+    Reads consecutive 8-byte aligned sections from a buffer
+    """
+
+    def __init__(self, buffer, position, swap):
+        self._buffer = buffer
+        self._position = position
+        self._swap = swap
+
+    def bytes(self, length):
+        end = self._position + length
+        if end > len(self._buffer):
+            raise ValueError('Truncated railway snapshot')
+        section = self._buffer[self._position:end]
+        self._position = end + -length % 8
+        return section
+
+    def integers(self, count):
+        section = self.bytes(count * 8)
+        if not self._swap:
+            return section.cast('q')
+        values = array('q', section.tobytes())
+        values.byteswap()
+        return values
+
+
+class _NullableRow(Sequence):
+    """
+    A read-only view of a row of a saved table, with NONE read back as None
+    """
+
+    def __init__(self, values):
+        self._values = values
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [None if value == NONE else value for value in self._values[i]]
+        value = self._values[i]
+        return None if value == NONE else value
+
+    def __len__(self):
+        return len(self._values)
+
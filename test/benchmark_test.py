@@ -0,0 +1,33 @@
+import json
+import unittest
+
+import benchmark
+
+
+class BenchmarkTest(unittest.TestCase):
+    def test_generators(self):
+        for name, generator in benchmark.GENERATORS.items():
+            edges = generator(16, seed=3)
+            self.assertEqual(edges, generator(16, seed=3), name)
+            self.assertTrue(all(1 <= distance <= 9 for _, _, distance in edges), name)
+            self.assertTrue(all(origin != destination for origin, destination, _ in edges), name)
+            self.assertEqual(len({station for edge in edges for station in edge[:2]}), 16, name)
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(benchmark.percentile(values, 0.5), 51)
+        self.assertEqual(benchmark.percentile(values, 0.99), 100)
+        self.assertEqual(benchmark.percentile([7], 0.9), 7)
+
+    def test_run(self):
+        report = benchmark.run('grid', size=9, seed=1, repeat=3)
+        self.assertEqual(report['network']['stations'], 9)
+        self.assertEqual(report['queries']['shortest_route']['calls'], 3)
+        self.assertIn('p99', report['queries']['find_routes_by_distance'])
+        self.assertGreater(report['queries']['count_routes_by_distance']['peak_memory'], 0)
+        self.assertEqual(report['queries']['count_all_routes_by_stops']['calls'], 1)
+        # Generators are run to the end, so they allocate the routes they yield
+        self.assertGreater(report['queries']['k_shortest_routes']['peak_memory'], 0)
+        for name in ('iter_routes_by_stops', 'iter_routes_by_distance', 'has_route', 'get_route_distances'):
+            self.assertIn(name, report['queries'])
+        json.dumps(report)
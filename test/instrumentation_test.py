@@ -0,0 +1,114 @@
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import unittest
+from contextlib import redirect_stderr
+
+from instrumentation import QueryStats, current_call
+from main import main
+from railway import Railway
+
+
+class InstrumentationTest(unittest.TestCase):
+    def setUp(self):
+        self.rail = Railway('AB5, BC4, CD8, DC8, DE6, AD5, CE2, EB3, AE7')
+
+    def test_off_by_default(self):
+        self.assertIsNone(self.rail.stats)
+        self.rail.find_routes_by_stops('C', 'C', 3)
+        self.assertIsNone(current_call.get())
+
+    def test_counters(self):
+        with self.rail.instrumented() as stats:
+            self.assertIs(self.rail.stats, stats)
+            routes = self.rail.find_routes_by_stops('C', 'C', 3)
+            self.rail.shortest_route('A', 'C')
+            self.rail.count_routes_by_distance('C', 'C', 30)
+            self.assertRaises(KeyError, self.rail.shortest_route, 'F', 'C')
+        self.assertIsNone(self.rail.stats)
+
+        self.assertEqual([call.name for call in stats.calls],
+                         ['find_routes_by_stops', 'shortest_route', 'count_routes_by_distance', 'shortest_route'])
+        find, shortest, count, failed = stats.calls
+        self.assertEqual(find.args, ('C', 'C', 3))
+        self.assertEqual(find.paths_materialised, len(routes))
+        self.assertGreater(find.max_stack_depth, 0)
+        self.assertLessEqual(find.max_stack_depth, 3)
+        for call in (find, shortest, count):
+            self.assertGreater(call.nodes_expanded, 0)
+            self.assertGreaterEqual(call.edges_relaxed, call.nodes_expanded)
+            self.assertGreater(call.elapsed, 0)
+        self.assertEqual(failed.nodes_expanded, 0)
+
+        self.assertEqual(stats.totals['shortest_route']['calls'], 2)
+        self.assertEqual(stats.totals['shortest_route']['nodes_expanded'], shortest.nodes_expanded)
+        self.assertEqual(stats.totals['find_routes_by_stops']['edges_relaxed'], find.edges_relaxed)
+        self.assertEqual(stats.slowest(1)[0].elapsed, max(call.elapsed for call in stats.calls))
+        json.dumps(stats.as_dict())
+
+    def test_generators_and_nesting(self):
+        with self.rail.instrumented() as stats:
+            routes = self.rail.iter_routes_by_distance('C', 'C', 30)
+            self.assertEqual(stats.calls[-1].paths_materialised, 0)
+            self.assertEqual(len(list(routes)), 7)
+            self.assertEqual(len(list(self.rail.k_shortest_routes('A', 'C', 3, simple=False))), 3)
+            self.rail.query_batch([('shortest_route', 'A', 'C'), ('find_routes_by_distance', 'C', 'C', 30)])
+
+        iter_call, k_call, batch_call = stats.calls
+        self.assertEqual(iter_call.paths_materialised, 7)
+        self.assertGreater(iter_call.nodes_expanded, 0)
+        self.assertEqual(k_call.paths_materialised, 3)
+        self.assertEqual(batch_call.name, 'query_batch')
+        self.assertEqual(batch_call.paths_materialised, 7)
+        self.assertEqual(len(stats.calls), 3)
+
+    def test_snapshots(self):
+        with self.rail.instrumented() as stats:
+            snapshot = self.rail.snapshot()
+            snapshot.shortest_route('A', 'C')
+        snapshot.shortest_route('B', 'D')
+        self.assertIsNone(snapshot.stats)
+        self.assertEqual(len(stats.calls), 0)
+
+        with snapshot.instrumented() as snapshot_stats:
+            snapshot.shortest_route('A', 'D')
+        self.assertEqual([call.name for call in snapshot_stats.calls], ['shortest_route'])
+
+    def test_max_calls(self):
+        with self.rail.instrumented(max_calls=2) as stats:
+            for stops in range(1, 6):
+                self.rail.count_routes_by_stops('A', 'C', stops)
+        self.assertEqual([call.args[2] for call in stats.calls], [4, 5])
+        self.assertEqual(stats.totals['count_routes_by_stops']['calls'], 5)
+
+    def test_sampling_profiler(self):
+        samples = []
+        with self.rail.instrumented(sample_interval=0.001, sample_hook=samples.append):
+            time.sleep(0.05)
+        self.assertTrue(samples)
+
+        stats = QueryStats()
+        stats.sample(sys._getframe())
+        (stack, count), = stats.samples.items()
+        self.assertTrue(stack.endswith('instrumentation_test:test_sampling_profiler'))
+        self.assertEqual(count, 1)
+
+    def test_main_stats(self):
+        with tempfile.TemporaryDirectory() as directory:
+            queries = os.path.join(directory, 'queries.csv')
+            with open(queries, 'w') as query_file:
+                query_file.write('stops,C,C,3\nshortest,A,C\nshortest,F,C\n')
+            output = os.path.join(directory, 'answers.jsonl')
+            stderr = io.StringIO()
+            with redirect_stderr(stderr):
+                main(['--queries', queries, '--output', output, '--stats', '-'])
+            with open(output) as answers:
+                self.assertEqual(len(answers.readlines()), 3)
+
+        stats = json.loads(stderr.getvalue())
+        self.assertEqual(stats['totals']['find_routes_by_stops']['paths_materialised'], 2)
+        self.assertEqual(stats['totals']['shortest_path']['calls'], 2)
+        self.assertEqual(len(stats['slowest']), 3)
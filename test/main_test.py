@@ -0,0 +1,64 @@
+import io
+import json
+import unittest
+
+from main import read_queries, run_batch
+from railway import Railway
+
+
+class BatchModeTest(unittest.TestCase):
+    def setUp(self):
+        self.rail = Railway('AB5, BC4, CD8, DC8, DE6, AD5, CE2, EB3, AE7')
+
+    def run_queries(self, text, format, count_only=False, chunk_size=10000):
+        output = io.StringIO()
+        count = run_batch(self.rail, read_queries(io.StringIO(text), format), output, count_only, chunk_size)
+        responses = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual(count, len(responses))
+        return {response['id']: response for response in responses}
+
+    def test_jsonl(self):
+        text = '\n'.join([
+            '{"id": "a", "type": "distance", "args": ["A", "B", "C"]}',
+            '{"type": "distance", "args": ["A", "E", "D"]}',
+            '{"type": "stops", "args": ["C", "C", 3]}',
+            '{"type": "stops", "args": ["A", "C", "4", "exact"]}',
+            '',
+            '{"type": "shortest", "args": ["B", "B"]}',
+            '{"type": "by-distance", "args": ["C", "C", 30]}',
+        ])
+        for chunk_size in (1, 3, 10000):
+            responses = self.run_queries(text, 'jsonl', chunk_size=chunk_size)
+            self.assertEqual(responses['a']['result'], 9)
+            self.assertEqual(responses[2]['result'], None)
+            self.assertEqual(responses[3]['result'], [[['C', 'D', 'C'], 16], [['C', 'E', 'B', 'C'], 9]])
+            self.assertEqual(len(responses[4]['result']), 3)
+            self.assertEqual(responses[6]['result'], [['B', 'C', 'E', 'B'], 9])
+            self.assertEqual(len(responses[7]['result']), 7)
+
+        responses = self.run_queries(text, 'jsonl', count_only=True)
+        self.assertEqual({query_id: response['result'] for query_id, response in responses.items()},
+                         {'a': 9, 2: None, 3: 2, 4: 3, 6: 9, 7: 7})
+
+    def test_csv(self):
+        text = 'distance,A,D,C\nstops,A,C,4,exact\nshortest,A,C\nby-distance,C,C,30\n'
+        responses = self.run_queries(text, 'csv', count_only=True)
+        self.assertEqual({query_id: response['result'] for query_id, response in responses.items()},
+                         {1: 13, 2: 3, 3: 9, 4: 7})
+
+    def test_errors(self):
+        text = '\n'.join([
+            'not json',
+            '["stops", "C", "C", 3]',
+            '{"type": "fastest", "args": ["A", "C"]}',
+            '{"type": "stops", "args": ["A", "C", "Z"]}',
+            '{"type": "stops", "args": ["A", "C", 3, "most"]}',
+            '{"type": "stops", "args": ["A", ["C"], 3]}',
+            '{"type": "shortest", "args": ["F", "C"]}',
+            '{"type": "shortest", "args": ["A", "F"]}',
+        ])
+        responses = self.run_queries(text, 'jsonl')
+        self.assertEqual([responses[i]['error']['type'] for i in range(1, 8)],
+                         ['JSONDecodeError', 'ValueError', 'ValueError', 'ValueError', 'ValueError', 'ValueError',
+                          'KeyError'])
+        self.assertEqual(responses[8]['result'], None)
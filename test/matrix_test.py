@@ -0,0 +1,46 @@
+import unittest
+
+import matrix
+
+
+class MatrixTest(unittest.TestCase):
+    def setUp(self):
+        self.matrix = [{1: 1}, {0: 1, 2: 1}, {0: 1}]
+
+    def test_multiply_and_add(self):
+        self.assertEqual(matrix.multiply(self.matrix, matrix.identity(3)), self.matrix)
+        self.assertEqual(matrix.multiply(self.matrix, self.matrix), [{0: 1, 2: 1}, {0: 1, 1: 1}, {1: 1}])
+        self.assertEqual(matrix.add(self.matrix, self.matrix), [{1: 2}, {0: 2, 2: 2}, {0: 2}])
+        self.assertEqual(matrix.add(self.matrix, self.matrix, 2), [{}, {}, {}])
+
+    def test_power(self):
+        self.assertEqual(matrix.power(self.matrix, 0), matrix.identity(3))
+        expected = matrix.identity(3)
+        for exponent in range(1, 12):
+            expected = matrix.multiply(expected, self.matrix)
+            self.assertEqual(matrix.power(self.matrix, exponent), expected)
+        self.assertEqual(matrix.power(self.matrix, 11, 3),
+                         [{j: value % 3 for j, value in row.items() if value % 3} for row in expected])
+
+    def test_power_sum(self):
+        self.assertEqual(matrix.power_sum(self.matrix, 0), [{}, {}, {}])
+        expected = [{}, {}, {}]
+        for exponent in range(1, 12):
+            expected = matrix.add(expected, matrix.power(self.matrix, exponent))
+            self.assertEqual(matrix.power_sum(self.matrix, exponent), expected)
+
+    def test_large_exponents(self):
+        # Exponents this large compared with the size are raised by repeated squaring rather than row by row
+        expected_power, expected_sum = matrix.identity(3), [{}, {}, {}]
+        for _ in range(500):
+            expected_power = matrix.multiply(expected_power, self.matrix, 7)
+            expected_sum = matrix.add(expected_sum, expected_power, 7)
+        self.assertEqual(matrix.power(self.matrix, 500, 7), expected_power)
+        self.assertEqual(matrix.power_sum(self.matrix, 500, 7), expected_sum)
+
+    @unittest.skipIf(matrix.numpy is None, 'NumPy is not installed')
+    def test_dense_power(self):
+        for exponent, modulus in [(1, None), (11, None), (11, 3), (500, 7)]:
+            for cumulative in (False, True):
+                self.assertEqual(matrix._dense_power(self.matrix, exponent, modulus, cumulative),
+                                 matrix._row_powers(self.matrix, exponent, modulus, cumulative))
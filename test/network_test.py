@@ -0,0 +1,86 @@
+import io
+import pickle
+import unittest
+
+from network import Network, read_edges
+
+
+class NetworkTest(unittest.TestCase):
+    def test_from_edges(self):
+        network = Network.from_edges([('A', 'B', 5), ('B', 'C', 4), ('A', 'D', 5)])
+        self.assertEqual(network.stations, ('A', 'B', 'C', 'D'))
+        self.assertEqual(list(network.offsets), [0, 2, 3, 3, 3])
+        self.assertEqual(list(network.targets), [1, 3, 2])
+        self.assertEqual(list(network.weights), [5, 5, 4])
+        self.assertEqual(list(network.next_stops(0)), [(1, 5), (3, 5)])
+        self.assertEqual(network.distance(1, 2), 4)
+        self.assertEqual(network.distance(2, 1), None)
+
+    def test_from_edges_builds_on_network(self):
+        network = Network.from_edges([('A', 'B', 5), ('A', 'C', 4)])
+        updated = Network.from_edges([('A', 'B', 2), ('C', 'E', 1)], network)
+        self.assertEqual(list(network.next_stops(0)), [(1, 5), (2, 4)])
+        self.assertEqual(updated.stations, ('A', 'B', 'C', 'E'))
+        self.assertEqual(list(updated.next_stops(0)), [(1, 2), (2, 4)])
+        self.assertEqual(updated.distance(2, 3), 1)
+
+    def test_without_edges(self):
+        network = Network.from_edges([('A', 'B', 5), ('A', 'C', 4), ('C', 'A', 1)])
+        updated = network.without_edges([('A', 'B')])
+        self.assertEqual(updated.stations, ('A', 'B', 'C'))
+        self.assertEqual(list(updated.next_stops(0)), [(2, 4)])
+        self.assertEqual(updated.version, network.version + 1)
+        self.assertRaises(KeyError, updated.without_edges, [('A', 'B')])
+        self.assertRaises(KeyError, updated.without_edges, [('A', 'D')])
+
+    def test_reverse(self):
+        network = Network.from_edges([('A', 'B', 1), ('A', 'C', 2), ('C', 'B', 3)])
+        reverse = network.reverse()
+        self.assertEqual(reverse.stations, network.stations)
+        self.assertEqual({origin: dict(next_stops) for origin, next_stops in reverse.routes.items()},
+                         {'A': {}, 'B': {'A': 1, 'C': 3}, 'C': {'A': 2}})
+        self.assertIs(network.reverse(), reverse)
+
+    def test_reaches(self):
+        network = Network.from_edges([('A', 'B', 1), ('B', 'C', 1), ('C', 'B', 1), ('C', 'D', 1), ('E', 'E', 1)])
+        reaches = {(network.stations[origin], network.stations[destination])
+                   for origin in range(len(network)) for destination in range(len(network))
+                   if network.reaches(origin, destination)}
+        self.assertEqual(reaches, {('A', 'B'), ('A', 'C'), ('A', 'D'), ('B', 'B'), ('B', 'C'), ('B', 'D'),
+                                   ('C', 'B'), ('C', 'C'), ('C', 'D'), ('E', 'E')})
+
+    def test_pickle(self):
+        network = Network.from_edges([('A', 'B', 5), ('A', 'C', 4)])
+        copy = pickle.loads(pickle.dumps(network))
+        self.assertEqual(copy.stations, network.stations)
+        self.assertEqual(copy.index, network.index)
+        self.assertEqual(copy.version, network.version)
+        self.assertEqual(dict(copy.routes['A']), {'B': 5, 'C': 4})
+
+    def test_routes_view(self):
+        network = Network.from_edges([('A', 'B', 5), ('A', 'C', 4)])
+        self.assertEqual({origin: dict(next_stops) for origin, next_stops in network.routes.items()},
+                         {'A': {'B': 5, 'C': 4}, 'B': {}, 'C': {}})
+        self.assertIn('C', network.routes['A'])
+        self.assertNotIn('D', network.routes['A'])
+        self.assertRaises(KeyError, network.routes['A'].__getitem__, 'D')
+        self.assertRaises(KeyError, network.routes.__getitem__, 'D')
+
+    def test_read_edges(self):
+        stream = io.StringIO('origin,destination,distance\nAuckland,Hamilton,126\n\nHamilton, Taupo ,153\n')
+        self.assertEqual(read_edges(stream, 'csv'), [('Auckland', 'Hamilton', 126), ('Hamilton', 'Taupo', 153)])
+
+        stream = io.StringIO('Auckland\tHamilton\t126\n')
+        self.assertEqual(read_edges(stream, 'tsv'), [('Auckland', 'Hamilton', 126)])
+
+        stream = io.StringIO('[["Auckland", "Hamilton", 126], '
+                             '{"origin": "Hamilton", "destination": "Taupo", "distance": 153}]')
+        self.assertEqual(read_edges(stream, 'json'), [('Auckland', 'Hamilton', 126), ('Hamilton', 'Taupo', 153)])
+
+    def test_read_edges_errors(self):
+        self.assertRaises(ValueError, read_edges, io.StringIO(''))
+        self.assertRaises(ValueError, read_edges, io.StringIO(''), 'xml')
+        self.assertRaises(ValueError, read_edges, io.StringIO('A,B,C,1\n'), 'csv')
+        self.assertRaises(ValueError, read_edges, io.StringIO('A,B,1\nA,C,x\n'), 'csv')
+        self.assertRaises(ValueError, read_edges, io.StringIO('A,,1\n'), 'csv')
+        self.assertRaises(ValueError, read_edges, io.StringIO('[["A", "B"]]'), 'json')
@@ -25,3 +25,27 @@ class RailwaySampleDataTest(unittest.TestCase):
 
     def test_find_routes_by_distance(self):
         self.assertEqual(len(self.rail.find_routes_by_distance('C', 'C', 30)), 7)
+
+    def test_count_routes(self):
+        self.assertEqual(self.rail.count_routes_by_stops('C', 'C', 3), 2)
+        self.assertEqual(self.rail.count_routes_by_stops('A', 'C', 4, Railway.FindModes.exact), 3)
+        self.assertEqual(self.rail.count_routes_by_distance('C', 'C', 30), 7)
+
+    def test_count_all_routes_by_stops(self):
+        counts = self.rail.count_all_routes_by_stops(4)
+        for origin in self.rail.routes:
+            for destination in self.rail.routes:
+                self.assertEqual(counts[origin].get(destination, 0),
+                                 self.rail.count_routes_by_stops(origin, destination, 4, Railway.FindModes.exact))
+        self.assertEqual(self.rail.count_all_routes_by_stops(3, Railway.FindModes.max)['C']['C'], 2)
+        self.assertEqual(self.rail.count_all_routes_by_stops(40, modulus=1000)['A']['C'], 829)
+
+    def test_parallel_report(self):
+        pairs = [(origin, destination) for origin in self.rail.routes for destination in self.rail.routes]
+        report = self.rail.parallel_report(pairs, 'shortest_route', workers=2)
+        self.assertEqual(list(report), pairs)
+        for (origin, destination), distance in report.items():
+            self.assertEqual(distance, self.rail.shortest_route(origin, destination))
+
+        report = self.rail.parallel_report([('C', 'C'), ('A', 'C')], 'count_routes_by_distance', 30, workers=2)
+        self.assertEqual(report, {('C', 'C'): 7, ('A', 'C'): self.rail.count_routes_by_distance('A', 'C', 30)})
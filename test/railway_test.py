@@ -1,5 +1,11 @@
+import io
+import os
+import tempfile
+import threading
 import unittest
+from array import array
 
+import benchmark
 from railway import Railway
 
 
@@ -44,6 +50,52 @@ class RailwayTest(unittest.TestCase):
         self.assertEqual(rail.routes['F']['D'], 7)
         self.assertEqual(rail.routes['A']['G'], 2)
 
+    def test_from_edge_list(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'network.csv')
+            with open(path, 'w') as stream:
+                stream.write('Auckland,Hamilton,126\nHamilton,Taupo,153\nTaupo,Auckland,278\n')
+            rail = Railway.from_edge_list(path)
+        self.assertEqual(rail.get_route_distance('Auckland', 'Hamilton', 'Taupo'), 279)
+        self.assertEqual(rail.shortest_path('Taupo', 'Hamilton'), (['Taupo', 'Auckland', 'Hamilton'], 404))
+        self.assertEqual(rail.count_routes_by_stops('Auckland', 'Auckland', 3), 1)
+
+        rail.load_routes(io.StringIO('[["Hamilton", "Auckland", 125]]'), 'json')
+        self.assertEqual(rail.shortest_route('Hamilton', 'Auckland'), 125)
+
+    def test_save_and_load_snapshot(self):
+        routes = ['AB1', 'AC2', 'CA4', 'CD1', 'DA1', 'BE7', 'DE1', 'EB2']
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'network.snapshot')
+            Railway(routes, precompute=True, landmarks=2).save_snapshot(path)
+            for mmap in (True, False):
+                rail = Railway.load_snapshot(path, mmap)
+                self.assertTrue(rail.precompute)
+                self.assertEqual(rail.landmarks, 2)
+                self.assertEqual(rail.get_route_distance('A', 'C', 'D'), 3)
+                self.assertEqual(rail.shortest_path('A', 'E'), (['A', 'C', 'D', 'E'], 4))
+                self.assertEqual(rail.shortest_path('A', 'E', Railway.SearchModes.landmarks), (['A', 'C', 'D', 'E'], 4))
+                self.assertEqual(rail.count_routes_by_stops('C', 'C', 3), 2)
+
+                rail.add_routes(['AE1'])
+                self.assertEqual(rail.shortest_path('C', 'E'), (['C', 'D', 'E'], 2))
+                self.assertEqual(rail.shortest_path('D', 'E'), (['D', 'E'], 1))
+                self.assertEqual(rail.shortest_path('C', 'B'), (['C', 'D', 'A', 'B'], 3))
+
+            Railway(routes).save_snapshot(path)
+            rail = Railway.load_snapshot(path)
+            self.assertFalse(rail.precompute)
+            self.assertEqual(rail.shortest_route('A', 'A'), 4)
+
+    def test_routes_are_per_instance_and_read_only(self):
+        rail = Railway(['AB1', 'BC2'])
+        other_rail = Railway(['BA3'])
+        self.assertEqual(dict(rail.routes['B']), {'C': 2})
+        self.assertEqual(dict(other_rail.routes['B']), {'A': 3})
+        self.assertNotIn('C', other_rail.routes)
+        with self.assertRaises(TypeError):
+            rail.routes['A']['C'] = 4
+
     def test_get_route_distance(self):
         routes = ['AB1', 'AC2', 'CA4']
         rail = Railway(routes)
@@ -54,6 +106,32 @@ class RailwayTest(unittest.TestCase):
         self.assertEqual(rail.get_route_distance('C', 'A'), 4)
         self.assertEqual(rail.get_route_distance('A', 'C', 'A'), 6)
         self.assertEqual(rail.get_route_distance('B', 'C'), None)
+        self.assertEqual(rail.get_route_distance('A', 'C', 'B'), None)
+        self.assertRaises(ValueError, rail.get_route_distance, 'A')
+        self.assertRaises(ValueError, rail.get_route_distance, 'A', 'C', '')
+
+        rail.add_routes(['BC0'])
+        self.assertEqual(rail.get_route_distance('B', 'C'), 0)
+        self.assertEqual(rail.get_route_distance('A', 'B', 'C'), 1)
+        self.assertEqual(rail.get_route_distance('A', 'B', 'C', 'A'), 5)
+
+    def test_get_route_distances(self):
+        rail = Railway(['AB1', 'AC2', 'CA4', 'BC0'])
+        itineraries = [['A', 'B'], ['A', 'C', 'A'], ['B', 'C', 'A'], ['B', 'A'], ['A'], [], ['A', 'D'], ['D', 'A'],
+                       ['B', 'C']]
+        distances, valid = rail.get_route_distances(itineraries)
+        self.assertEqual(list(distances), [1, 6, 4, 0, 0, 0, 0, 0, 0])
+        self.assertEqual(list(valid), [1, 1, 1, 0, 0, 0, 0, 0, 1])
+        for itinerary, distance, exists in zip(itineraries, distances, valid):
+            if len(itinerary) > 1 and itinerary[0] in rail.routes:
+                self.assertEqual(rail.get_route_distance(*itinerary), distance if exists else None)
+
+        ids = rail.station_ids(['A', 'C', 'A', 'B', 'D', 'B', 'C'])
+        self.assertEqual(list(ids), [0, 2, 0, 1, -1, 1, 2])
+        distances, valid = rail.get_route_distances(ids, [0, 3, 5, 7])
+        self.assertEqual(list(distances), [6, 0, 0])
+        self.assertEqual(list(valid), [1, 0, 1])
+        self.assertEqual(rail.get_route_distances([], [0]), (array('q'), bytearray()))
 
     def test_find_routes_by_stops(self):
         routes = ['AB1', 'AC2', 'CA4']
@@ -89,6 +167,75 @@ class RailwayTest(unittest.TestCase):
         )
         self.assertEqual(len(rail.find_routes_by_distance('A', 'C', 1000)), 167)
 
+    def test_iter_routes(self):
+        routes = ['AB1', 'AC2', 'CA4']
+        rail = Railway(routes)
+        self.assertRaises(ValueError, rail.iter_routes_by_stops, None, 'A', 5)
+        self.assertRaises(KeyError, rail.iter_routes_by_stops, 'D', 'A', 5)
+        self.assertRaises(ValueError, rail.iter_routes_by_distance, 'A', 'B', 'Z')
+        self.assertRaises(KeyError, rail.iter_routes_by_distance, 'D', 'A', 5)
+        self.assertEqual(next(rail.iter_routes_by_stops('A', 'C', 5, Railway.FindModes.exact)),
+                         (['A', 'C', 'A', 'C', 'A', 'C'], 14))
+        routes = rail.iter_routes_by_distance('A', 'C', 10 ** 9)
+        self.assertEqual([next(routes) for _ in range(3)],
+                         [['A', 'C', 2], ['A', 'C', 'A', 'C', 8], ['A', 'C', 'A', 'C', 'A', 'C', 14]])
+        self.assertEqual(len(next(rail.iter_routes_by_stops('A', 'C', 5001, Railway.FindModes.exact))[0]), 5002)
+
+    def test_count_routes_by_stops(self):
+        routes = ['AB1', 'AC2', 'CA4']
+        rail = Railway(routes)
+        self.assertRaises(ValueError, rail.count_routes_by_stops, None, 'A', 5)
+        self.assertRaises(ValueError, rail.count_routes_by_stops, 'A', 'B', 'Z')
+        self.assertRaises(KeyError, rail.count_routes_by_stops, 'D', 'A', 5)
+        self.assertEqual(rail.count_routes_by_stops('A', 'A', 3), 1)
+        self.assertEqual(rail.count_routes_by_stops('A', 'A', '3'), 1)
+        self.assertEqual(rail.count_routes_by_stops('A', 'C', 3), 1)
+        self.assertEqual(rail.count_routes_by_stops('A', 'C', 0), 0)
+        self.assertEqual(rail.count_routes_by_stops('A', 'C', 4, Railway.FindModes.exact), 0)
+        self.assertEqual(rail.count_routes_by_stops('A', 'C', 5, Railway.FindModes.exact), 1)
+        self.assertEqual(rail.count_routes_by_stops('A', 'C', 41, Railway.FindModes.exact), 1)
+
+    def test_count_all_routes_by_stops(self):
+        rail = Railway([], cache_size=0)
+        rail.add_edges(benchmark.random_network(40))
+        pairs = [(origin, destination) for origin in rail.routes for destination in rail.routes]
+        # Few stops are counted one stop at a time from each origin, and many by repeated squaring
+        for stops, modulus in [(12, None), (300, 1000003)]:
+            expected = rail.query_batch([('count_routes_by_stops', origin, destination, stops, Railway.FindModes.exact)
+                                         for origin, destination in pairs])
+            counts = rail.count_all_routes_by_stops(stops, modulus=modulus)
+            self.assertEqual([counts[origin].get(destination, 0) for origin, destination in pairs],
+                             [count % modulus if modulus else count for count in expected])
+
+        totals = rail.count_all_routes_by_stops(12, Railway.FindModes.max)
+        exact_counts = [rail.count_all_routes_by_stops(stops) for stops in range(1, 13)]
+        self.assertEqual([totals[origin].get(destination, 0) for origin, destination in pairs],
+                         [sum(counts[origin].get(destination, 0) for counts in exact_counts)
+                          for origin, destination in pairs])
+
+    def test_count_routes_by_distance(self):
+        routes = ['AB1', 'AC2', 'CA4']
+        rail = Railway(routes)
+        self.assertRaises(ValueError, rail.count_routes_by_distance, None, 'A', 5)
+        self.assertRaises(ValueError, rail.count_routes_by_distance, 'A', 'B', 'Z')
+        self.assertRaises(KeyError, rail.count_routes_by_distance, 'D', 'A', 5)
+        self.assertEqual(rail.count_routes_by_distance('A', 'B', -1), 0)
+        self.assertEqual(rail.count_routes_by_distance('A', 'B', 0), 0)
+        self.assertEqual(rail.count_routes_by_distance('A', 'B', 2), 1)
+        self.assertEqual(rail.count_routes_by_distance('A', 'C', 15), 3)
+        self.assertEqual(rail.count_routes_by_distance('A', 'C', 1000), 167)
+        self.assertEqual(rail.count_routes_by_distance('A', 'C', 6000), 1000)
+
+        # Routes of zero distance are counted, unless they form a loop that makes the count infinite
+        rail = Railway(['AB5', 'BC0', 'CA3', 'CD0', 'DB2'])
+        for origin, destination, max_distance in [('A', 'C', 10), ('A', 'C', 30), ('C', 'B', 12), ('B', 'B', 20)]:
+            self.assertEqual(rail.count_routes_by_distance(origin, destination, max_distance),
+                             len(rail.find_routes_by_distance(origin, destination, max_distance)))
+        self.assertEqual(rail.count_routes_by_distance('A', 'C', 10), 3)
+        rail.add_routes(['DC0'])
+        self.assertEqual(rail.count_routes_by_distance('A', 'B', 6), 1)
+        self.assertRaises(ValueError, rail.count_routes_by_distance, 'A', 'D', 6)
+
     def test_shortest_route(self):
         routes = ['AB1', 'AC2', 'CA4', 'CD1', 'DA1']
         rail = Railway(routes)
@@ -96,3 +243,200 @@ class RailwayTest(unittest.TestCase):
         self.assertEqual(rail.shortest_route('A', 'B'), 1)
         self.assertEqual(rail.shortest_route('B', 'C'), float('inf'))
         self.assertEqual(rail.shortest_route('C', 'A'), 2)
+
+    def test_shortest_path(self):
+        routes = ['AB1', 'AC2', 'CA4', 'CD1', 'DA1']
+        rail = Railway(routes)
+        self.assertRaises(ValueError, rail.shortest_path, None, 'A')
+        self.assertEqual(rail.shortest_path('A', 'B'), (['A', 'B'], 1))
+        self.assertEqual(rail.shortest_path('C', 'A'), (['C', 'D', 'A'], 2))
+        self.assertEqual(rail.shortest_path('A', 'A'), (['A', 'C', 'D', 'A'], 4))
+        self.assertEqual(rail.shortest_path('B', 'C'), None)
+
+    def test_shortest_route_search_modes(self):
+        routes = ['AB1', 'AC2', 'CA4', 'CD1', 'DA1', 'BE7', 'DE1', 'EB2']
+        for landmarks in (0, 2):
+            rail = Railway(routes, landmarks=landmarks)
+            for mode in Railway.SearchModes:
+                self.assertEqual(rail.shortest_route('A', 'E', mode), 4)
+                self.assertEqual(rail.shortest_path('A', 'E', mode), (['A', 'C', 'D', 'E'], 4))
+                self.assertEqual(rail.shortest_path('E', 'A', mode), None)
+                self.assertEqual(rail.shortest_path('C', 'B', mode), (['C', 'D', 'A', 'B'], 3))
+                self.assertEqual(rail.shortest_path('A', 'A', mode), (['A', 'C', 'D', 'A'], 4))
+        self.assertEqual(len(rail._state.landmarks[0]), 2)
+
+    def test_k_shortest_routes(self):
+        routes = ['AB1', 'AC2', 'CA4', 'CD1', 'DA1', 'BE7', 'DE1', 'EB2']
+        rail = Railway(routes)
+        self.assertRaises(ValueError, rail.k_shortest_routes, None, 'A', 1)
+        self.assertRaises(ValueError, rail.k_shortest_routes, 'A', 'B', 'x')
+        self.assertRaises(KeyError, rail.k_shortest_routes, 'F', 'A', 1)
+        self.assertEqual(list(rail.k_shortest_routes('A', 'E', 5)), [(['A', 'C', 'D', 'E'], 4), (['A', 'B', 'E'], 8)])
+        self.assertEqual(list(rail.k_shortest_routes('A', 'E', 1)), [(['A', 'C', 'D', 'E'], 4)])
+        self.assertEqual(list(rail.k_shortest_routes('A', 'A', 3)), [(['A', 'C', 'D', 'A'], 4), (['A', 'C', 'A'], 6)])
+        self.assertEqual(list(rail.k_shortest_routes('E', 'A', 3)), [])
+        self.assertEqual(list(rail.k_shortest_routes('A', 'E', 0)), [])
+
+        walks = list(rail.k_shortest_routes('A', 'E', 4, simple=False))
+        self.assertEqual([distance for _, distance in walks], [4, 8, 8, 10])
+        self.assertIn((['A', 'C', 'D', 'A', 'C', 'D', 'E'], 8), walks)
+        self.assertEqual(walks[-1], (['A', 'C', 'A', 'C', 'D', 'E'], 10))
+        for path, distance in walks:
+            self.assertEqual(rail.get_route_distance(*path), distance)
+
+    def test_precompute_shortest_routes(self):
+        routes = ['AB1', 'AC2', 'CA4', 'CD1', 'DA1']
+        rail = Railway(routes, precompute=True)
+        self.assertEqual(rail.shortest_route('A', 'B'), 1)
+        self.assertEqual(rail.shortest_route('C', 'A'), 2)
+        self.assertEqual(rail.shortest_route('A', 'A'), 4)
+        self.assertEqual(rail.shortest_path('C', 'A'), (['C', 'D', 'A'], 2))
+        rail.add_routes(['CB1'])
+        self.assertEqual(rail.shortest_route('A', 'B'), 1)
+        self.assertEqual(rail.shortest_path('C', 'B'), (['C', 'B'], 1))
+
+    def test_has_route(self):
+        rail = Railway(['AB1', 'AC2', 'CA4', 'CD1', 'DA1', 'EA1'])
+        self.assertRaises(ValueError, rail.has_route, None, 'A')
+        self.assertRaises(KeyError, rail.has_route, 'F', 'A')
+        self.assertTrue(rail.has_route('A', 'B'))
+        self.assertTrue(rail.has_route('D', 'C'))
+        self.assertTrue(rail.has_route('A', 'A'))
+        self.assertTrue(rail.has_route('E', 'D'))
+        self.assertFalse(rail.has_route('B', 'A'))
+        self.assertFalse(rail.has_route('B', 'B'))
+        self.assertFalse(rail.has_route('E', 'E'))
+        self.assertFalse(rail.has_route('A', 'E'))
+        self.assertFalse(rail.has_route('A', 'F'))
+        self.assertEqual(rail.find_routes_by_distance('A', 'E', 1000), [])
+        self.assertEqual(rail.count_routes_by_stops('A', 'E', 1000), 0)
+        rail.add_routes(['BE1'])
+        self.assertTrue(rail.has_route('A', 'E'))
+        self.assertTrue(rail.has_route('E', 'E'))
+
+    def test_update_and_remove_route(self):
+        rail = Railway(['AB1', 'AC2', 'CA4', 'CD1', 'DA1'], precompute=True)
+        self.assertRaises(KeyError, rail.update_route, 'B', 'A', 1)
+        self.assertRaises(KeyError, rail.remove_route, 'B', 'A')
+        self.assertRaises(KeyError, rail.remove_route, 'E', 'A')
+
+        rail.update_route('C', 'A', 1)
+        self.assertEqual(rail.shortest_path('A', 'A'), (['A', 'C', 'A'], 3))
+        rail.update_route('C', 'A', 5)
+        self.assertEqual(rail.shortest_path('A', 'A'), (['A', 'C', 'D', 'A'], 4))
+        rail.remove_route('C', 'D')
+        self.assertEqual(rail.shortest_path('A', 'A'), (['A', 'C', 'A'], 7))
+        self.assertEqual(rail.shortest_route('C', 'D'), float('inf'))
+        self.assertIn('D', rail.routes)
+        rail.add_routes(['BE1', 'ED1'])
+        self.assertEqual(rail.shortest_path('A', 'D'), (['A', 'B', 'E', 'D'], 3))
+        self.assertEqual(rail.shortest_path('C', 'A'), (['C', 'A'], 5))
+
+    def test_snapshot(self):
+        rail = Railway(['AB1', 'AC2', 'CA4', 'CD1', 'DA1'], precompute=True, landmarks=2)
+        snapshot = rail.snapshot()
+        self.assertEqual(snapshot.version, rail.version)
+        self.assertEqual(snapshot.shortest_path('A', 'A'), (['A', 'C', 'D', 'A'], 4))
+
+        rail.update_route('C', 'A', 1)
+        rail.add_routes(['BE1', 'ED1'])
+        self.assertEqual(rail.version, snapshot.version + 2)
+        self.assertEqual(rail.shortest_path('A', 'A'), (['A', 'C', 'A'], 3))
+        self.assertEqual(rail.shortest_path('B', 'D'), (['B', 'E', 'D'], 2))
+        self.assertEqual(snapshot.shortest_path('A', 'A'), (['A', 'C', 'D', 'A'], 4))
+        self.assertEqual(snapshot.shortest_path('A', 'D', Railway.SearchModes.landmarks), (['A', 'C', 'D'], 3))
+        self.assertNotIn('E', snapshot.routes)
+        self.assertRaises(KeyError, snapshot.shortest_route, 'E', 'D')
+        queries = [('count_routes_by_stops', 'A', 'D', 3), ('find_routes_by_stops', 'A', 'E', 3)]
+        self.assertEqual(snapshot.query_batch(queries), [1, []])
+
+        snapshot.remove_route('A', 'B')
+        self.assertEqual(snapshot.shortest_route('A', 'B'), float('inf'))
+        self.assertEqual(rail.shortest_route('A', 'B'), 1)
+
+    def test_concurrent_updates(self):
+        rail = Railway(['AB1', 'BC1', 'CA1'], precompute=True)
+        version = rail.version
+        failures = []
+
+        def query():
+            for _ in range(200):
+                snapshot = rail.snapshot()
+                distance = snapshot.shortest_route('A', 'C')
+                if distance != 2 + snapshot.version - version or snapshot.shortest_path('A', 'C')[1] != distance:
+                    failures.append((snapshot.version, distance))
+
+        threads = [threading.Thread(target=query) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for distance in range(2, 52):
+            rail.update_route('B', 'C', distance)
+        for thread in threads:
+            thread.join()
+        self.assertEqual(failures, [])
+        self.assertEqual(rail.shortest_route('A', 'C'), 52)
+
+    def test_query_batch(self):
+        rail = Railway(['AB1', 'AC2', 'CA4', 'CD1', 'DA1'])
+        queries = [
+            ('shortest_route', 'A', 'D'),
+            ('shortest_path', 'A', 'D'),
+            ('shortest_route', 'A', 'A'),
+            ('shortest_route', 'B', 'C'),
+            ('get_route_distance', 'A', 'C', 'D'),
+            ('count_routes_by_stops', 'A', 'A', 3),
+            ('count_routes_by_stops', 'C', 'A', 5, Railway.FindModes.exact),
+            ('count_routes_by_distance', 'C', 'A', 20),
+            ('count_routes_by_distance', 'A', 'A', 10),
+            ('find_routes_by_stops', 'A', 'A', 3),
+            ('shortest_route', 'A', 'D'),
+        ]
+        expected = [getattr(rail, query[0])(*query[1:]) for query in queries]
+        rail = Railway(['AB1', 'AC2', 'CA4', 'CD1', 'DA1'], cache_size=0)
+        self.assertEqual(rail.query_batch(queries), expected)
+
+        # Counts from one origin to many destinations are built up from the origin
+        queries = [(name, 'A', destination, limit) + mode for destination in 'ABCD' for limit in (0, 3, 12)
+                   for name, mode in (('count_routes_by_stops', (Railway.FindModes.exact,)),
+                                      ('count_routes_by_stops', ()), ('count_routes_by_distance', ()))]
+        self.assertEqual(rail.query_batch(queries), [getattr(rail, query[0])(*query[1:]) for query in queries])
+
+        # A loop of zero distance only makes the counts of the routes that can reach it infinite
+        zero_distance_rail = Railway(['AB5', 'BC0', 'CA3', 'BD0', 'DE0', 'ED0'], cache_size=0)
+        for queries in ([('count_routes_by_distance', 'A', destination, 12) for destination in 'ABCDE'],
+                        [('count_routes_by_distance', origin, 'B', 12) for origin in 'ABCDE']
+                        + [('count_routes_by_distance', 'A', 'D', 12)]):
+            for query, result in zip(queries, zero_distance_rail.query_batch(queries)):
+                if query[2] in 'DE':
+                    self.assertIsInstance(result, ValueError)
+                else:
+                    self.assertEqual(result, len(zero_distance_rail.find_routes_by_distance(*query[1:])))
+
+        results = rail.query_batch([('shortest_route', 'A', 'C'), ('find_routes_by_stops', 'A', ['C'], 3)])
+        self.assertEqual(results[0], 2)
+        self.assertIsInstance(results[1], ValueError)
+
+        results = rail.query_batch([('shortest_route', 'E', 'A'), ('shortest_route', 'A', 'E'), ('add_routes', 'AE1')])
+        self.assertIsInstance(results[0], KeyError)
+        self.assertEqual(results[1], float('inf'))
+        self.assertIsInstance(results[2], ValueError)
+
+    def test_query_cache(self):
+        rail = Railway(['AB1', 'AC2', 'CA4', 'CD1', 'DA1'], cache_size=2)
+        self.assertEqual(rail.shortest_route('A', 'D'), 3)
+        self.assertEqual(rail.query_batch([('shortest_route', 'A', 'D'), ('count_routes_by_stops', 'A', 'A', 3)]),
+                         [3, 1])
+        self.assertEqual(len(rail._cache), 2)
+        rail.get_route_distance('A', 'B')
+        self.assertEqual(len(rail._cache), 2)
+        rail.add_routes(['AD1'])
+        self.assertEqual(len(rail._cache), 0)
+        self.assertEqual(rail.shortest_route('A', 'D'), 1)
+        self.assertEqual(rail.count_routes_by_stops('A', 'A', 3), 2)
+
+        rail = Railway(['AB1', 'AC2', 'CA4', 'CD1', 'DA1'])
+        self.assertEqual(rail.shortest_route('A', 'C'), 2)
+        self.assertIn(('shortest_route', ('A', 'C'), (), rail.version), rail._cache)
+        counts = rail.count_all_routes_by_stops(2)
+        counts['A'].clear()
+        self.assertEqual(rail.count_all_routes_by_stops(2)['A'], {'A': 1, 'D': 1})
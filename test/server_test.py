@@ -0,0 +1,128 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+
+import benchmark
+from railway import Railway
+from server import LINE_LIMIT, QueryServer
+
+
+class QueryServerTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.query_server = QueryServer(Railway('AB5, BC4, CD8, DC8, DE6, AD5, CE2, EB3, AE7'), workers=0,
+                                        max_pending=2)
+        self.server = await self.query_server.start(port=0)
+        self.reader, self.writer = await asyncio.open_connection(*self.server.sockets[0].getsockname()[:2])
+
+    async def asyncTearDown(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+        self.server.close()
+        await self.server.wait_closed()
+        self.query_server.close()
+
+    async def request(self, *requests):
+        for request in requests:
+            self.writer.write((request if isinstance(request, str) else json.dumps(request)).encode() + b'\n')
+        await self.writer.drain()
+        responses = [json.loads(await self.reader.readline()) for _ in requests]
+        return {response['id']: response for response in responses}
+
+    async def test_queries(self):
+        responses = await self.request(
+            {'id': 1, 'query': 'get_route_distance', 'args': ['A', 'B', 'C']},
+            {'id': 2, 'query': 'get_route_distance', 'args': ['A', 'E', 'D']},
+            {'id': 3, 'query': 'count_routes_by_stops', 'args': ['A', 'C', 4, 'exact']},
+            {'id': 4, 'query': 'shortest_route', 'args': ['B', 'B']},
+            {'id': 5, 'query': 'shortest_route', 'args': ['A', 'A']},
+            {'id': 6, 'query': 'find_routes_by_stops', 'args': ['C', 'C', 3]},
+            {'id': 7, 'query': 'shortest_path', 'args': ['A', 'C', 'landmarks']},
+            {'id': 8, 'query': 'k_shortest_routes', 'args': ['A', 'C', 2]},
+            {'id': 9, 'query': 'count_routes_by_distance', 'args': ['C', 'C', 30]},
+            {'id': 10, 'query': 'has_route', 'args': ['A', 'A']},
+            {'id': 11, 'query': 'count_all_routes_by_stops', 'args': [3, 'max']},
+            {'id': 12, 'query': 'get_route_distances', 'args': [[['A', 'B', 'C'], ['A', 'E', 'D']]]},
+        )
+        self.assertEqual(responses[1]['result'], 9)
+        self.assertEqual(responses[2]['result'], None)
+        self.assertEqual(responses[3]['result'], 3)
+        self.assertEqual(responses[4]['result'], 9)
+        self.assertEqual(responses[5]['result'], None)
+        self.assertEqual(responses[6]['result'], [[['C', 'D', 'C'], 16], [['C', 'E', 'B', 'C'], 9]])
+        self.assertEqual(responses[7]['result'], [['A', 'B', 'C'], 9])
+        self.assertEqual(responses[8]['result'], [[['A', 'B', 'C'], 9], [['A', 'D', 'C'], 13]])
+        self.assertEqual(responses[9]['result'], 7)
+        self.assertEqual(responses[10]['result'], False)
+        self.assertEqual(responses[11]['result'],
+                         self.query_server.railway.count_all_routes_by_stops(3, Railway.FindModes.max))
+        self.assertEqual(responses[11]['result']['C']['C'], 2)
+        self.assertEqual(responses[12]['result'], [[9, 0], [1, 0]])
+
+    async def test_errors(self):
+        responses = await self.request(
+            {'id': 1, 'query': 'get_route_distance', 'args': ['F', 'A']},
+            {'id': 2, 'query': 'add_routes', 'args': [['AF1']]},
+            {'id': 3, 'query': 'find_routes_by_stops', 'args': ['A', 'C', 'Z']},
+            {'id': 4, 'query': 'shortest_route', 'args': ['A', 'C', 'fastest']},
+            'not json',
+        )
+        self.assertEqual(responses[1]['error'], {'type': 'KeyError', 'message': 'Origin station not found'})
+        self.assertEqual(responses[2]['error']['type'], 'ValueError')
+        self.assertEqual(responses[3]['error'], {'type': 'ValueError', 'message': 'Argument `stops` is not a number'})
+        self.assertEqual(responses[4]['error']['type'], 'ValueError')
+        self.assertEqual(responses[None]['error']['type'], 'JSONDecodeError')
+        self.assertNotIn('F', self.query_server.railway.routes)
+
+    async def test_pipelining(self):
+        requests = [{'id': i, 'query': 'count_routes_by_stops', 'args': ['A', 'C', i % 8]} for i in range(50)]
+        responses = await self.request(*requests)
+        railway = self.query_server.railway
+        self.assertEqual({i: response['result'] for i, response in responses.items()},
+                         {i: railway.count_routes_by_stops('A', 'C', i % 8) for i in range(50)})
+
+
+class QueryServerProcessTest(unittest.IsolatedAsyncioTestCase):
+    async def test_unix_socket_and_worker_processes(self):
+        query_server = QueryServer(Railway('AB5, BC4, CD8, DC8, DE6, AD5, CE2, EB3, AE7'), workers=1)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'railway.sock')
+            server = await query_server.start(path=path)
+            try:
+                reader, writer = await asyncio.open_unix_connection(path)
+                writer.write(b'{"id": "a", "query": "find_routes_by_distance", "args": ["C", "C", 17]}\n')
+                writer.write(b'{"id": "b", "query": "count_routes_by_stops", "args": ["F", "C", 3]}\n')
+                await writer.drain()
+                responses = [json.loads(await reader.readline()) for _ in range(2)]
+                writer.close()
+                await writer.wait_closed()
+            finally:
+                server.close()
+                await server.wait_closed()
+                query_server.close()
+
+        responses = {response['id']: response for response in responses}
+        self.assertEqual(responses['a']['result'], [['C', 'D', 'C', 16], ['C', 'E', 'B', 'C', 9]])
+        self.assertEqual(responses['b']['error'], {'type': 'KeyError', 'message': 'Origin station not found'})
+
+    async def test_slow_query_does_not_delay_others(self):
+        railway = Railway([])
+        railway.add_edges(benchmark.grid_network(2500))
+        query_server = QueryServer(railway, workers=1)
+        server = await query_server.start(port=0)
+        try:
+            reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname()[:2], limit=LINE_LIMIT)
+            writer.write(b'{"id": "slow", "query": "k_shortest_routes", "args": ["S0", "S2499", 200]}\n')
+            writer.write(b'{"id": "fast", "query": "get_route_distance", "args": ["S0", "S1"]}\n')
+            await writer.drain()
+            responses = [json.loads(await reader.readline()) for _ in range(2)]
+            writer.close()
+            await writer.wait_closed()
+        finally:
+            server.close()
+            await server.wait_closed()
+            query_server.close()
+
+        self.assertEqual([response['id'] for response in responses], ['fast', 'slow'])
+        self.assertEqual(len(responses[1]['result']), 200)
@@ -0,0 +1,70 @@
+import os
+import pickle
+import tempfile
+import unittest
+
+from network import Network
+from snapshot import FORMAT_VERSION, HEADER, read_snapshot, write_snapshot
+
+
+class SnapshotTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'network.snapshot')
+        network = Network.from_edges([('Auckland', 'Hamilton', 126), ('Hamilton', 'Taupō', 153)])
+        self.network = Network.from_edges([('Taupō', 'Auckland', 278)], network)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_round_trip(self):
+        write_snapshot(self.path, self.network)
+        for mmap in (True, False):
+            network, shortest_routes, landmarks = read_snapshot(self.path, mmap)
+            self.assertEqual(network.stations, ('Auckland', 'Hamilton', 'Taupō'))
+            self.assertEqual(network.version, self.network.version)
+            self.assertEqual(list(network.offsets), list(self.network.offsets))
+            self.assertEqual(list(network.targets), list(self.network.targets))
+            self.assertEqual(list(network.weights), list(self.network.weights))
+            self.assertEqual(dict(network.routes['Taupō']), {'Auckland': 278})
+            self.assertTrue(network.reaches(0, 0))
+            self.assertIsNone(shortest_routes)
+            self.assertIsNone(landmarks)
+
+            copy = pickle.loads(pickle.dumps(network))
+            self.assertEqual(dict(copy.routes['Hamilton']), {'Taupō': 153})
+
+    def test_round_trip_tables(self):
+        shortest_routes = [([557, 126, 279], [2, 0, 1]), ([431, 557, 153], [2, 0, 1]), ([278, 404, None], [2, 0, None])]
+        landmarks = ([1], [[None, 0, 153]], [[126, 0, 557]])
+        write_snapshot(self.path, self.network, shortest_routes, landmarks)
+        _, loaded_shortest_routes, loaded_landmarks = read_snapshot(self.path)
+        self.assertEqual([(list(distances), list(previous)) for distances, previous in loaded_shortest_routes],
+                         shortest_routes)
+        self.assertEqual(loaded_shortest_routes[2][0][2], None)
+        self.assertEqual(loaded_landmarks[0], [1])
+        self.assertEqual([list(row) for row in loaded_landmarks[1]], landmarks[1])
+        self.assertEqual([list(row) for row in loaded_landmarks[2]], landmarks[2])
+
+    def test_errors(self):
+        with open(self.path, 'wb') as stream:
+            stream.write(b'AB5, BC4')
+        self.assertRaises(ValueError, read_snapshot, self.path)
+
+        with open(self.path, 'wb'):
+            pass
+        self.assertRaises(ValueError, read_snapshot, self.path)
+        self.assertRaises(ValueError, read_snapshot, self.path, False)
+
+        write_snapshot(self.path, self.network)
+        with open(self.path, 'rb') as stream:
+            data = stream.read()
+        with open(self.path, 'wb') as stream:
+            stream.write(data[:-8])
+        self.assertRaises(ValueError, read_snapshot, self.path)
+
+        header = list(HEADER.unpack_from(data))
+        header[1] = FORMAT_VERSION + 1
+        with open(self.path, 'wb') as stream:
+            stream.write(HEADER.pack(*header) + data[HEADER.size:])
+        self.assertRaises(ValueError, read_snapshot, self.path)
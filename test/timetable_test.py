@@ -0,0 +1,109 @@
+import io
+import unittest
+
+from railway import Railway
+from timetable import Timetable, format_time, parse_time, read_trips
+
+
+class TimetableTest(unittest.TestCase):
+    def setUp(self):
+        self.rail = Railway('AB5, BC4, CD8, DC8, DE6, AD5, CE2, EB3, AE7')
+        self.timetable = Timetable(self.rail, [
+            ('slow', [('A', None, '08:00'), ('B', '08:20', '08:21'), ('C', '08:40', '08:41'), ('D', '09:30', None)]),
+            ('fast', [('A', None, '08:15'), ('D', '08:45', None)]),
+            ('late', [('A', None, '09:00'), ('D', '09:30', None)]),
+            ('link', [('C', None, '08:42'), ('E', '08:50', None)]),
+        ])
+
+    def test_parse_and_format_time(self):
+        self.assertEqual(parse_time('08:10'), 29400)
+        self.assertEqual(parse_time('25:00:30'), 90030)
+        self.assertEqual(parse_time(600), 600)
+        self.assertEqual(parse_time(' '), None)
+        for value in ('8.10', '08:60', -1, '1:2:3:4'):
+            self.assertRaises(ValueError, parse_time, value)
+        self.assertEqual(format_time(90030), '25:00:30')
+
+    def test_add_trips(self):
+        self.assertEqual(self.timetable.trips, ('slow', 'fast', 'late', 'link'))
+        self.assertEqual(len(self.timetable), 6)
+        invalid_trips = [
+            ('fast', [('A', None, '10:00'), ('D', '10:30', None)]),
+            ('short', [('A', None, '10:00')]),
+            ('backwards', [('A', None, '10:00'), ('D', '09:30', None)]),
+            ('waiting', [('A', None, '10:00'), ('B', '10:20', '10:10'), ('C', '10:40', None)]),
+            ('untimed', [('A', None, '10:00'), ('B', None, None), ('C', '10:40', None)]),
+            ('off-route', [('A', None, '10:00'), ('C', '10:30', None)]),
+            ('unknown', [('A', None, '10:00'), ('F', '10:30', None)]),
+        ]
+        for trip in invalid_trips:
+            trips = [('valid', [('B', None, 0), ('C', 60, None)]), trip]
+            self.assertRaises(ValueError, self.timetable.add_trips, trips)
+        self.assertEqual(len(self.timetable.trips), 4)
+        self.assertEqual(len(self.timetable), 6)
+
+    def test_earliest_arrival(self):
+        self.assertEqual(self.timetable.earliest_arrival('A', 'D', '08:00'), parse_time('08:45'))
+        self.assertEqual(self.timetable.earliest_arrival('A', 'D', '08:16'), parse_time('09:30'))
+        self.assertEqual(self.timetable.earliest_arrival('A', 'E', '07:00'), parse_time('08:50'))
+        self.assertEqual(self.timetable.earliest_arrival('A', 'E', '08:01'), None)
+        self.assertEqual(self.timetable.earliest_arrival('D', 'A', '07:00'), None)
+        self.assertEqual(self.timetable.earliest_arrival('A', 'F', '07:00'), None)
+        self.assertRaises(KeyError, self.timetable.earliest_arrival, 'F', 'A', '07:00')
+        self.assertRaises(ValueError, self.timetable.earliest_arrival, 'A', 'A', '07:00')
+        self.assertRaises(ValueError, self.timetable.earliest_arrival, 'A', 'D', '7am')
+
+    def test_earliest_journey(self):
+        self.assertEqual(self.timetable.earliest_journey('A', 'E', '07:00'), [
+            ('slow', 'A', parse_time('08:00'), 'C', parse_time('08:40')),
+            ('link', 'C', parse_time('08:42'), 'E', parse_time('08:50')),
+        ])
+        self.assertEqual(self.timetable.earliest_journey('B', 'D', '08:00'),
+                         [('slow', 'B', parse_time('08:21'), 'D', parse_time('09:30'))])
+        self.assertEqual(self.timetable.earliest_journey('D', 'A', '07:00'), None)
+
+    def test_profile(self):
+        self.assertEqual(self.timetable.profile('A', 'D'), [
+            (parse_time('08:15'), parse_time('08:45')), (parse_time('09:00'), parse_time('09:30')),
+        ])
+        self.assertEqual(self.timetable.profile('A', 'D', '08:20', '10:00'),
+                         [(parse_time('09:00'), parse_time('09:30'))])
+        self.assertEqual(self.timetable.profile('A', 'D', end='08:30'), [(parse_time('08:15'), parse_time('08:45'))])
+        self.assertEqual(self.timetable.profile('A', 'E'), [(parse_time('08:00'), parse_time('08:50'))])
+        self.assertEqual(self.timetable.profile('D', 'A'), [])
+
+    def test_connections_at_the_same_instant(self):
+        # Each connection leads on to one added before it, and the last leads back to the first
+        timetable = Timetable(self.rail, [
+            ('onward', [('E', None, '10:00'), ('B', '10:00', None)]),
+            ('feeder', [('C', None, '10:00'), ('E', '10:00', None)]),
+            ('back', [('B', None, '10:00'), ('C', '10:00', '10:05'), ('D', '10:13', None)]),
+        ])
+        instant = parse_time('10:00')
+        self.assertEqual(timetable.earliest_arrival('C', 'B', '10:00'), instant)
+        self.assertEqual(timetable.earliest_arrival('E', 'C', '09:00'), instant)
+        self.assertEqual(timetable.earliest_arrival('E', 'D', '09:00'), parse_time('10:13'))
+        self.assertEqual(timetable.earliest_journey('C', 'B', '10:00'),
+                         [('feeder', 'C', instant, 'E', instant), ('onward', 'E', instant, 'B', instant)])
+        self.assertEqual(timetable.earliest_journey('E', 'D', '10:00'),
+                         [('onward', 'E', instant, 'B', instant), ('back', 'B', instant, 'D', parse_time('10:13'))])
+        self.assertEqual(timetable.profile('C', 'B'), [(instant, instant)])
+        self.assertEqual(timetable.profile('E', 'D'), [(instant, parse_time('10:13'))])
+        self.assertEqual(timetable.profile('E', 'C'), [(instant, instant)])
+
+    def test_read_trips(self):
+        text = 'trip,station,arrival,departure\nT1,A,,08:00\nT2,A,,09:00\nT1,B,08:20,08:21\nT2,D,09:30,\nT1,C,08:40,\n'
+        trips = read_trips(io.StringIO(text), 'csv')
+        self.assertEqual(trips, [
+            ('T1', [('A', None, 28800), ('B', 30000, 30060), ('C', 31200, None)]),
+            ('T2', [('A', None, 32400), ('D', 34200, None)]),
+        ])
+        text_json = '[["T1", "A", null, "08:00"], {"trip": "T1", "station": "D", "arrival": 30000}]'
+        trips = read_trips(io.StringIO(text_json), 'json')
+        self.assertEqual(trips, [('T1', [('A', None, 28800), ('D', 30000, None)])])
+
+        timetable = Timetable(self.rail)
+        timetable.load_trips(io.StringIO(text), 'csv')
+        self.assertEqual(timetable.earliest_arrival('A', 'D', '08:30'), 34200)
+        self.assertRaises(ValueError, read_trips, io.StringIO('T1,A,8am,\n'), 'csv')
+        self.assertRaises(ValueError, read_trips, io.StringIO(text), 'xml')
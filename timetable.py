@@ -0,0 +1,554 @@
+"""
+Timetabled trips over the route map of a Railway, answering earliest arrival queries with the Connection Scan Algorithm.
+
+A trip is a train running along a sequence of stations, each consecutive pair of which must be a route of the railway.
+Each stop of a trip between two stations is a connection, and the timetable keeps every connection in parallel arrays
+sorted by departure time, so that an earliest arrival query is a single scan forwards from the first connection leaving
+after the departure time, and a profile query is a single scan backwards.
+
+Times are whole seconds after midnight, and may be given as 'HH:MM' or 'HH:MM:SS' strings instead. Hours may run past
+24 for trips that run after midnight.
+"""
+import csv
+import json
+import os
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import deque
+from itertools import count, islice
+
+TRIP_FILE_FORMATS = {'.csv': 'csv', '.tsv': 'tsv', '.json': 'json'}
+
+
+class Timetable:
+    """
+    The trips running on a railway
+
+    Attributes
+    ----------
+    railway : Railway
+        The railway whose stations and routes the trips run on
+
+    trips : tuple
+        The trip identifiers, in the order they were added
+
+    Connections are kept in five parallel arrays in order of departure time, then arrival time: the station ids they
+    leave from and arrive at, as given by Railway.station_ids, their departure and arrival times, and the position of
+    their trip in trips. Connections that take no time and leave at the same instant can lead on to one another in any
+    order, so each run of two or more of them is scanned again until no arrival improves.
+
+    Methods
+    -------
+    add_trips(trips)
+        Adds a collection of trips to the timetable
+
+    load_trips(source, format=None)
+        Adds the trips in a CSV, TSV or JSON stop time list to the timetable
+
+    earliest_arrival(origin, destination, departure_time)
+        Finds the earliest time the destination can be reached leaving the origin at or after a given time
+
+    earliest_journey(origin, destination, departure_time)
+        Finds the trips taken to reach the destination at the earliest time
+
+    profile(origin, destination, start=0, end=None)
+        Finds the earliest arrival for every departure from the origin in a period, leaving out departures that arrive
+        no earlier than a later one
+    """
+
+    def __init__(self, railway, trips=()):
+        """
+        Parameters
+        ----------
+        railway : Railway
+            As for the attribute
+
+        trips : iterable
+            Trips to add, as for add_trips
+        """
+        self.railway = railway
+        self.trips = ()
+        self._departure_stations = array('q')
+        self._arrival_stations = array('q')
+        self._departure_times = array('q')
+        self._arrival_times = array('q')
+        self._trip_positions = array('q')
+        self._instants = {}
+        self.add_trips(trips)
+
+    def __len__(self):
+        return len(self._departure_times)
+
+    def add_trips(self, trips):
+        """
+        Adds trips in bulk. Either every trip is added or, if one is invalid, none are.
+
+        Parameters
+        ----------
+        trips : iterable
+            The trips, each provided as a trip identifier and the (station, arrival time, departure time) of each of its
+            stops in order, e.g. [('T1', [('A', None, '08:10'), ('B', '08:15', '08:16'), ('C', '08:30', None)])].
+            The arrival time at the first stop and the departure time from the last are not used, and either time at
+            another stop may be None if the train does not wait there.
+
+        Raises
+        ------
+        ValueError
+            If a trip identifier is repeated, a trip has fewer than two stops, a time is malformatted, a trip goes back
+            in time, or a trip runs between two stations that are not a route of the railway
+        """
+        network = self.railway._network
+        index, trip_ids = network.index, dict.fromkeys(self.trips)
+        connections = []
+        for trip, stops in trips:
+            if trip in trip_ids:
+                raise ValueError('Trip `{}` is already in the timetable'.format(trip))
+            position = len(trip_ids)
+            trip_ids[trip] = None
+
+            times = []
+            for station, arrival, departure in stops:
+                arrival, departure = parse_time(arrival), parse_time(departure)
+                if arrival is None and departure is None:
+                    raise ValueError('Trip `{}` has no time at {}'.format(trip, station))
+                times.append((station, arrival if arrival is not None else departure,
+                              departure if departure is not None else arrival))
+            if len(times) < 2:
+                raise ValueError('Trip `{}` must have at least two stops'.format(trip))
+
+            for stop in range(len(times) - 1):
+                (origin, origin_arrival, departure), (destination, arrival, _) = times[stop], times[stop + 1]
+                if arrival < departure or stop > 0 and departure < origin_arrival:
+                    raise ValueError('Trip `{}` goes back in time at {}'.format(trip, origin))
+                if origin not in index or destination not in index \
+                        or network.distance(index[origin], index[destination]) is None:
+                    raise ValueError('Trip `{}` runs from {} to {}, which is not a route'.format(
+                        trip, origin, destination
+                    ))
+                connections.append((departure, arrival, index[origin], index[destination], position))
+
+        # The sort is stable and connections were added in the order of their trips' stops, so a train that takes no
+        # time between stops is still followed in order
+        if self:
+            connections = list(zip(self._departure_times, self._arrival_times, self._departure_stations,
+                                   self._arrival_stations, self._trip_positions)) + connections
+        connections.sort(key=lambda connection: (connection[0], connection[1]))
+
+        self.trips = tuple(trip_ids)
+        self._departure_times = array('q', (connection[0] for connection in connections))
+        self._arrival_times = array('q', (connection[1] for connection in connections))
+        self._departure_stations = array('q', (connection[2] for connection in connections))
+        self._arrival_stations = array('q', (connection[3] for connection in connections))
+        self._trip_positions = array('q', (connection[4] for connection in connections))
+
+        # The runs of connections that take no time and leave at the same instant, as {first position: end position}.
+        # They come first among the connections leaving at that instant, as connections are sorted by arrival next.
+        self._instants = {}
+        first = None
+        for position, (departure, arrival) in enumerate(zip(self._departure_times, self._arrival_times)):
+            if first is not None and (arrival != departure or departure != self._departure_times[first]):
+                if position - first > 1:
+                    self._instants[first] = position
+                first = None
+            if first is None and arrival == departure:
+                first = position
+        if first is not None and len(self) - first > 1:
+            self._instants[first] = len(self)
+
+    def load_trips(self, source, format=None):
+        """
+        Parameters
+        ----------
+        source : str, os.PathLike or file
+            The path of a CSV, TSV or JSON stop time list, or an open text stream, as accepted by read_trips
+
+        format : str
+            One of 'csv', 'tsv' or 'json'. If not supplied, it is taken from the file extension of the source.
+
+        Raises
+        ------
+        ValueError
+            If the format cannot be determined, or if a stop time or trip is invalid
+        """
+        self.add_trips(read_trips(source, format))
+
+    def earliest_arrival(self, origin, destination, departure_time):
+        """
+        Parameters
+        ----------
+        origin : str
+            The origin station, provided as a string, e.g. 'A'
+
+        destination : str
+            The destination station, provided as a string, e.g. 'D'
+
+        departure_time : int or str
+            The time from which the rider is at the origin, e.g. '08:10'
+
+        Returns
+        -------
+        arrival_time : int
+            The earliest time the destination can be reached, in seconds after midnight, or None if it cannot be reached
+            that day
+
+        Raises
+        ------
+        ValueError
+            If one of the stations is not supplied as an argument, they are the same station, or the time is
+            malformatted
+
+        KeyError
+            If the origin station is not in the route matrix
+        """
+        return self._scan(origin, destination, departure_time)[0]
+
+    def earliest_journey(self, origin, destination, departure_time):
+        """
+        Parameters
+        ----------
+        origin, destination, departure_time
+            As for earliest_arrival
+
+        Returns
+        -------
+        legs : list
+            The (trip, boarding station, departure time, alighting station, arrival time) of each trip taken on a
+            journey reaching the destination at the earliest time, e.g. [('T1', 'A', 29400, 'C', 30600)], or None if
+            it cannot be reached that day
+
+        Raises
+        ------
+        As for earliest_arrival
+        """
+        arrival_time, reached_by, origin = self._scan(origin, destination, departure_time)
+        if arrival_time is None:
+            return None
+
+        network = self.railway._network
+        stations = network.stations
+        legs = []
+        station = network.index[destination]
+        while station != origin:
+            boarding, alighting = reached_by[station]
+            legs.append((self.trips[self._trip_positions[boarding]], stations[self._departure_stations[boarding]],
+                         self._departure_times[boarding], stations[station], self._arrival_times[alighting]))
+            station = self._departure_stations[boarding]
+        legs.reverse()
+        return legs
+
+    def _scan(self, origin, destination, departure_time):
+        """
+        Scans the connections leaving at or after the departure time in order, keeping the earliest arrival at each
+        station. A connection can be taken if the train is already being ridden or its station has been reached by the
+        time it leaves, and the scan stops at the first connection leaving after the destination has been reached.
+
+        Returns
+        -------
+        arrival_time : int
+            The earliest arrival at the destination, or None
+
+        reached_by : dict
+            For each station id reached, the positions of the connections at which the trip it was reached by was
+            boarded and left
+
+        origin : int
+            The origin station id
+        """
+        network = self._validate(origin, destination)
+        departure_time = parse_time(departure_time)
+        if departure_time is None:
+            raise ValueError('Argument not supplied')
+        origin = network.index[origin]
+        destination = network.index.get(destination)
+        if destination is None:
+            return None, {}, origin
+
+        never = float('inf')
+        earliest = [never] * len(network)
+        earliest[origin] = departure_time
+        boarded = {}
+        reached_by = {}
+        start = bisect_left(self._departure_times, departure_time)
+        connections = zip(
+            count(start), islice(self._departure_times, start, None), islice(self._arrival_times, start, None),
+            islice(self._departure_stations, start, None), islice(self._arrival_stations, start, None),
+            islice(self._trip_positions, start, None)
+        )
+        for position, departure, arrival, from_station, to_station, trip in connections:
+            if departure >= earliest[destination]:
+                break
+            if arrival == departure and position in self._instants:
+                end = self._instants[position]
+                self._scan_instant(position, end, earliest, boarded, reached_by)
+                deque(islice(connections, end - position - 1), maxlen=0)
+                continue
+            if trip in boarded or earliest[from_station] <= departure:
+                boarding = boarded.setdefault(trip, position)
+                if arrival < earliest[to_station]:
+                    earliest[to_station] = arrival
+                    reached_by[to_station] = (boarding, position)
+
+        arrival_time = earliest[destination]
+        return (arrival_time if arrival_time != never else None), reached_by, origin
+
+    def _scan_instant(self, first, end, earliest, boarded, reached_by):
+        """
+        Scans the connections at positions first to end, which all take no time and leave at the same instant, until no
+        arrival improves. Changing trains takes no time either, so a connection can be taken once its station has been
+        reached, and a trip is only counted as boarded earlier if that was at an earlier position.
+        """
+        improved = True
+        while improved:
+            improved = False
+            for position in range(first, end):
+                time = self._departure_times[position]
+                if earliest[self._departure_stations[position]] <= time:
+                    trip = self._trip_positions[position]
+                    boarding = boarded.setdefault(trip, position)
+                    if boarding > position:
+                        boarding = boarded[trip] = position
+                    to_station = self._arrival_stations[position]
+                    if time < earliest[to_station]:
+                        earliest[to_station] = time
+                        reached_by[to_station] = (boarding, position)
+                        improved = True
+
+    def profile(self, origin, destination, start=0, end=None):
+        """
+        Parameters
+        ----------
+        origin : str
+            The origin station, provided as a string, e.g. 'A'
+
+        destination : str
+            The destination station, provided as a string, e.g. 'D'
+
+        start, end : int or str
+            The period of departures from the origin to consider, e.g. '06:00' and '10:00'. By default, the whole day.
+
+        Returns
+        -------
+        profile : list
+            The (departure time, arrival time) of each way of leaving the origin in the period, in order of departure,
+            that reaches the destination earlier than leaving any later would. The earliest arrival when leaving at any
+            time in the period is the arrival of the first pair departing at or after it, if that is in the period.
+
+        Raises
+        ------
+        As for earliest_arrival
+        """
+        network = self._validate(origin, destination)
+        start, end = parse_time(start) or 0, parse_time(end)
+        origin = network.index[origin]
+        destination = network.index.get(destination)
+        if destination is None:
+            return []
+
+        # Connections are scanned latest first. Each station's profile holds its Pareto-optimal departures and the
+        # earliest arrivals they lead to, as negated departures in ascending order so that they can be bisected, and
+        # each trip holds the earliest arrival reachable by staying on it
+        never = float('inf')
+        profiles = {}
+        trip_arrivals = {}
+        first = bisect_left(self._departure_times, start)
+        instants = {last - 1: instant_first for instant_first, last in self._instants.items() if last > first}
+        connections = zip(
+            count(len(self) - 1, -1), self._departure_times[first:][::-1], self._arrival_times[first:][::-1],
+            self._departure_stations[first:][::-1], self._arrival_stations[first:][::-1],
+            self._trip_positions[first:][::-1]
+        )
+        for position, departure, arrival, from_station, to_station, trip in connections:
+            if arrival == departure and position in instants:
+                self._profile_instant(instants[position], position + 1, destination, profiles, trip_arrivals)
+                deque(islice(connections, position - instants[position]), maxlen=0)
+                continue
+            if to_station == destination:
+                best = arrival
+            else:
+                best = trip_arrivals.get(trip, never)
+                profile = profiles.get(to_station)
+                if profile is not None:
+                    entry = bisect_right(profile[0], -arrival) - 1
+                    if entry >= 0 and profile[1][entry] < best:
+                        best = profile[1][entry]
+                if best == never:
+                    continue
+            if best < trip_arrivals.get(trip, never):
+                trip_arrivals[trip] = best
+
+            if from_station == destination:
+                continue
+            profile = profiles.get(from_station)
+            if profile is None:
+                profiles[from_station] = ([-departure], [best])
+            elif best < profile[1][-1]:
+                if profile[0][-1] == -departure:
+                    profile[1][-1] = best
+                else:
+                    profile[0].append(-departure)
+                    profile[1].append(best)
+
+        departures, arrivals = profiles.get(origin, ([], []))
+        return [(-departure, arrival) for departure, arrival in zip(reversed(departures), reversed(arrivals))
+                if end is None or -departure <= end]
+
+    def _profile_instant(self, first, end, destination, profiles, trip_arrivals):
+        """
+        Adds the connections at positions first to end, which all take no time and leave at the same instant, to the
+        profiles until none improves. Changing trains takes no time either, so staying on a train is only better than
+        changing for the part of its trip after the instant.
+        """
+        never = float('inf')
+        staying = {trip: trip_arrivals.get(trip, never) for trip in self._trip_positions[first:end]}
+        improved = True
+        while improved:
+            improved = False
+            for position in range(end - 1, first - 1, -1):
+                time, trip = self._departure_times[position], self._trip_positions[position]
+                from_station, to_station = self._departure_stations[position], self._arrival_stations[position]
+                if to_station == destination:
+                    best = time
+                else:
+                    best = staying[trip]
+                    profile = profiles.get(to_station)
+                    if profile is not None:
+                        entry = bisect_right(profile[0], -time) - 1
+                        if entry >= 0 and profile[1][entry] < best:
+                            best = profile[1][entry]
+                    if best == never:
+                        continue
+                if best < trip_arrivals.get(trip, never):
+                    trip_arrivals[trip] = best
+
+                if from_station == destination:
+                    continue
+                profile = profiles.get(from_station)
+                if profile is None:
+                    profiles[from_station] = ([-time], [best])
+                elif best < profile[1][-1]:
+                    if profile[0][-1] == -time:
+                        profile[1][-1] = best
+                    else:
+                        profile[0].append(-time)
+                        profile[1].append(best)
+                else:
+                    continue
+                improved = True
+
+    def _validate(self, origin, destination):
+        network = self.railway._network
+        if not origin or not destination:
+            raise ValueError('Argument not supplied')
+        if origin == destination:
+            raise ValueError('Origin and destination must be different stations')
+        if origin not in network.index:
+            raise KeyError('Origin station not found')
+        return network
+
+
+def parse_time(value):
+    """
+    Parameters
+    ----------
+    value : int or str
+        A time, as a number of seconds after midnight or as an 'HH:MM' or 'HH:MM:SS' string
+
+    Returns
+    -------
+    time : int
+        The number of seconds after midnight, or None if the value is None or an empty string
+
+    Raises
+    ------
+    ValueError
+        If the time is malformatted or negative
+    """
+    if value is None or isinstance(value, int) and not isinstance(value, bool) and value >= 0:
+        return value
+    if isinstance(value, str):
+        value = value.strip()
+        if not value:
+            return None
+        if value.isdigit():
+            return int(value)
+        parts = value.split(':')
+        if len(parts) in (2, 3) and all(part.isdigit() for part in parts) and all(int(part) < 60 for part in parts[1:]):
+            return sum(int(part) * 60 ** (2 - i) for i, part in enumerate(parts))
+    raise ValueError('Malformatted time `{}`: times must be seconds after midnight, HH:MM or HH:MM:SS'.format(value))
+
+
+def format_time(seconds):
+    """
+    Returns a time in seconds after midnight as an 'HH:MM:SS' string
+    """
+    return '{:02d}:{:02d}:{:02d}'.format(seconds // 3600, seconds // 60 % 60, seconds % 60)
+
+
+def read_trips(source, format=None):
+    """
+    Reads trips from a stop time list with one stop per row or element
+
+    Parameters
+    ----------
+    source : str, os.PathLike or file
+        The path of the stop time list, or an open text stream
+
+    format : str
+        One of 'csv', 'tsv' or 'json'. If not supplied, it is taken from the file extension of the source.
+        CSV and TSV rows are trip, station, arrival time, departure time, with an optional header row, and either time
+        may be left empty.
+        JSON must be a list of [trip, station, arrival, departure] lists or of
+        {"trip": ..., "station": ..., "arrival": ..., "departure": ...} objects, where either time may be null or left
+        out of an object.
+        The stops of each trip are listed in the order the train calls at them, though trips may be interleaved.
+
+    Returns
+    -------
+    trips : list
+        The trips, as (trip, [(station, arrival, departure), ...]) tuples, as accepted by Timetable.add_trips
+
+    Raises
+    ------
+    ValueError
+        If the format cannot be determined, or if a stop is malformatted
+    """
+    if format is None:
+        name = source if isinstance(source, (str, os.PathLike)) else getattr(source, 'name', '')
+        format = TRIP_FILE_FORMATS.get(os.path.splitext(str(name))[1].lower())
+        if format is None:
+            raise ValueError('Stop time list format not supplied and not recognised from the file name')
+
+    if format not in TRIP_FILE_FORMATS.values():
+        raise ValueError('Stop time list format must be one of {}'.format(', '.join(TRIP_FILE_FORMATS.values())))
+
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, newline='') as stream:
+            return read_trips(stream, format)
+
+    if format == 'json':
+        rows = [(row['trip'], row['station'], row.get('arrival'), row.get('departure')) if isinstance(row, dict)
+                else row for row in json.load(source)]
+    else:
+        rows = [row for row in csv.reader(source, delimiter='\t' if format == 'tsv' else ',') if row]
+        if rows and len(rows[0]) == 4 and all(value.strip() and not _is_time(value) for value in rows[0][2:]):
+            rows = rows[1:]
+
+    trips = {}
+    for row in rows:
+        try:
+            trip, station, arrival, departure = row
+            stop = (str(station).strip(), parse_time(arrival), parse_time(departure))
+        except (TypeError, ValueError):
+            raise ValueError('Malformatted stop: each stop must be a trip, station, arrival time and departure time')
+        if not stop[0]:
+            raise ValueError('Station name must not be empty')
+        trips.setdefault(trip.strip() if isinstance(trip, str) else trip, []).append(stop)
+
+    return list(trips.items())
+
+
+def _is_time(value):
+    try:
+        return parse_time(value) is not None
+    except ValueError:
+        return False